@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import json
-from .models import UserBadge, Submission, Assignment
+from .models import User, UserBadge, Submission, Assignment
+from .leaderboard_cache import leaderboard_cache
 
 BADGE_DEFINITIONS = {
     "First Step": {
@@ -26,16 +26,18 @@ BADGE_DEFINITIONS = {
     }
 }
 
-def get_score(submission: Submission) -> int:
-    try:
-        data = json.loads(submission.grading_result)
-        return int(data.get("grade", 0))
-    except:
-        return 0
+def get_score(submission) -> int:
+    # Typed column filled from grading_result (app/scores.py); NULL only before the backfill
+    return submission.grade or 0
 
-def check_badges(user_id: int, db: Session, current_submission_id: int = None):
-    # Fetch all submissions for user
-    submissions = db.query(Submission).filter(Submission.user_id == user_id).all()
+def check_badges(user_id: int, db: Session, current_submission_id: int = None, organization_id: int = None):
+    # Fetch the scores of all submissions for user (no code or JSON needed)
+    submissions = db.query(
+        Submission.assignment_id,
+        Submission.grade,
+        Submission.submitted_at,
+        Assignment.created_at.label("assignment_created_at"),
+    ).outerjoin(Assignment, Assignment.id == Submission.assignment_id).filter(Submission.user_id == user_id).all()
     
     # Fetch existing badges
     existing_badges = db.query(UserBadge).filter(UserBadge.user_id == user_id).all()
@@ -55,11 +57,11 @@ def check_badges(user_id: int, db: Session, current_submission_id: int = None):
         # We need assignment details.
         for sub in submissions:
             score = get_score(sub)
-            if score >= 80 and sub.assignment:
+            if score >= 80 and sub.assignment_id is not None:
                 # Check time diff
                 # created_at and submitted_at are datetime objects
-                if sub.assignment.created_at:
-                    time_diff = sub.submitted_at - sub.assignment.created_at
+                if sub.assignment_created_at:
+                    time_diff = sub.submitted_at - sub.assignment_created_at
                     if time_diff <= timedelta(hours=12):
                         new_badges.append("Fast & Furious")
                         break
@@ -98,11 +100,13 @@ def check_badges(user_id: int, db: Session, current_submission_id: int = None):
                  if "On Fire" not in new_badges: # Double check
                      new_badges.append("On Fire")
 
-    # Save new badges
+    # Save new badges (organization_id is denormalized from the user, like Submission.organization_id)
     result = []
+    if organization_id is None and new_badges:
+        organization_id = db.query(User.organization_id).filter(User.id == user_id).scalar()
     for badge_name in new_badges:
         if badge_name not in existing_names: # concurrency safety check
-            db_badge = UserBadge(user_id=user_id, badge_name=badge_name)
+            db_badge = UserBadge(user_id=user_id, organization_id=organization_id, badge_name=badge_name)
             db.add(db_badge)
             existing_names.add(badge_name) # Prevent duplicate add in loop
             
@@ -115,5 +119,6 @@ def check_badges(user_id: int, db: Session, current_submission_id: int = None):
     
     if result:
         db.commit()
+        leaderboard_cache.invalidate(organization_id)
 
     return result
@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,23 +11,115 @@ DB_PATH = os.path.join(BACKEND_DIR, "sql_app.db")
 # Allow overriding database path via environment variable
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}")
 
-connect_args = {}
-# Only use check_same_thread for SQLite
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    connect_args = {"check_same_thread": False}
+# SQLite: how long a writer waits for the lock before "database is locked", and page cache/mmap sizes
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))
+# PostgreSQL: connections per worker process and the server-side limits of every statement
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args=connect_args
-    # pool_pre_ping=True # Good practice for Postgres but optional
-)
+
+def sqlite_pragmas(in_memory: bool = False) -> dict:
+    """Applied to every new SQLite connection, in this order."""
+    pragmas = {
+        # WAL: readers keep reading the last committed state while one writer commits
+        "journal_mode": "MEMORY" if in_memory else "WAL",
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+        # Safe with WAL (only the last commits may be lost on power failure, never corrupted)
+        "synchronous": "NORMAL",
+        "cache_size": -SQLITE_CACHE_MB * 1024,  # negative = KiB
+        "temp_store": "MEMORY",
+    }
+    if not in_memory:
+        pragmas["mmap_size"] = SQLITE_MMAP_MB * 1024 * 1024
+    return pragmas
+
+
+def engine_options(url: str) -> dict:
+    """create_engine() keyword arguments for the database behind `url`."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # The pragma busy_timeout does the waiting; the driver's own timeout is kept in step
+        return {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    if backend == "postgresql":
+        settings = {
+            "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+            "idle_in_transaction_session_timeout": str(DB_IDLE_IN_TRANSACTION_TIMEOUT_MS),
+        }
+        if make_url(url).get_driver_name() == "asyncpg":
+            connect_args = {"server_settings": {**settings, "application_name": "codegrade-backend"}}
+        else:
+            connect_args = {
+                "options": " ".join(f"-c {name}={value}" for name, value in settings.items()),
+                "application_name": "codegrade-backend",
+            }
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+            "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+            # Connections dropped by the server or a proxy are replaced instead of failing a request
+            "pool_pre_ping": True,
+            "connect_args": connect_args,
+        }
+    return {"pool_pre_ping": True}
+
+
+def async_database_url(url: str) -> str:
+    """The same database behind an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _apply_sqlite_pragmas(engine, url: str):
+    pragmas = sqlite_pragmas(in_memory=make_url(url).database in (None, "", ":memory:"))
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    engine = create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine, url)
+    return engine
+
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    url = async_database_url(url)
+    engine = create_async_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine.sync_engine, url)
+    return engine
+
+
+# Sync engine: scripts, migrations and the grading pipeline's worker threads
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: the API routers, so queries do not block the event loop.
+# Objects stay usable after commit; relationships must be loaded explicitly (selectinload/joins).
+async_engine = make_async_engine(SQLALCHEMY_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
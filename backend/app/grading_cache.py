@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from cachetools import TTLCache
+from .database import SessionLocal
+from .models import GradingCacheEntry
+from .schemas import GradingResult, SubmissionRequest
+
+# Cache settings (all overridable from .env)
+CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+MEMORY_MAX_ITEMS = int(os.getenv("GRADING_CACHE_MEMORY_SIZE", "1024"))
+TTL_SECONDS = int(os.getenv("GRADING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DB_MAX_ROWS = int(os.getenv("GRADING_CACHE_MAX_ROWS", "50000"))
+# Pruning the persistent tier needs a COUNT(*), so only do it every N stores
+PRUNE_EVERY = int(os.getenv("GRADING_CACHE_PRUNE_EVERY", "100"))
+
+
+def make_cache_key(request: SubmissionRequest, model_name: str, prompt_version: str, extra: str = "") -> str:
+    """
+    Content address of a grading: identical inputs graded by the same model
+    and prompt always map to the same key. `extra` covers further inputs
+    such as the assignment's hidden tests.
+    """
+    payload = json.dumps([
+        request.studentCode,
+        request.assignmentDescription,
+        request.assignmentLanguage,
+        request.studentLevel,
+        model_name,
+        prompt_version,
+        extra,
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradingCache:
+    """
+    Two tier cache for grading results: an in-process LRU (with TTL) in front of
+    the `grading_cache` table, so hits survive restarts and are shared by workers.
+    """
+
+    def __init__(self, memory_size: int = MEMORY_MAX_ITEMS, ttl_seconds: int = TTL_SECONDS,
+                 max_rows: int = DB_MAX_ROWS, enabled: bool = CACHE_ENABLED):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self._memory = TTLCache(maxsize=memory_size, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        self._stores_since_prune = 0
+        self.counters = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get(self, key: str) -> Optional[GradingResult]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+            return GradingResult.model_validate_json(cached)
+
+        db = SessionLocal()
+        try:
+            entry = db.query(GradingCacheEntry).filter(GradingCacheEntry.cache_key == key).first()
+            if entry is None:
+                self._count("misses")
+                return None
+
+            if entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+                # Expired: drop it and treat as a miss
+                db.delete(entry)
+                db.commit()
+                self._count("evictions")
+                self._count("misses")
+                return None
+
+            entry.last_hit_at = datetime.utcnow()
+            entry.hit_count = (entry.hit_count or 0) + 1
+            db.commit()
+
+            with self._lock:
+                self._memory[key] = entry.result
+            self._count("db_hits")
+            return GradingResult.model_validate_json(entry.result)
+        except Exception as e:
+            print(f"Grading cache read warning: {e}")
+            db.rollback()
+            self._count("errors")
+            self._count("misses")
+            return None
+        finally:
+            db.close()
+
+    def set(self, key: str, result: GradingResult, model_name: str, prompt_version: str):
+        if not self.enabled:
+            return
+
+        data = result.model_dump_json()
+        with self._lock:
+            self._memory[key] = data
+
+        db = SessionLocal()
+        try:
+            entry = db.query(GradingCacheEntry).filter(GradingCacheEntry.cache_key == key).first()
+            if entry is None:
+                entry = GradingCacheEntry(cache_key=key)
+                db.add(entry)
+            entry.result = data
+            entry.model_name = model_name
+            entry.prompt_version = prompt_version
+            entry.created_at = datetime.utcnow()
+            entry.last_hit_at = datetime.utcnow()
+            db.commit()
+            self._count("stores")
+
+            with self._lock:
+                self._stores_since_prune += 1
+                should_prune = self._stores_since_prune >= PRUNE_EVERY
+                if should_prune:
+                    self._stores_since_prune = 0
+            if should_prune:
+                self.prune(db)
+        except Exception as e:
+            print(f"Grading cache write warning: {e}")
+            db.rollback()
+            self._count("errors")
+        finally:
+            db.close()
+
+    def prune(self, db=None):
+        """Removes expired rows, then the least recently hit rows above `max_rows`."""
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            removed = db.query(GradingCacheEntry).filter(
+                GradingCacheEntry.created_at < cutoff
+            ).delete(synchronize_session=False)
+
+            overflow = db.query(GradingCacheEntry).count() - self.max_rows
+            if overflow > 0:
+                stale_ids = [row.id for row in db.query(GradingCacheEntry.id)
+                             .order_by(GradingCacheEntry.last_hit_at.asc())
+                             .limit(overflow)]
+                removed += db.query(GradingCacheEntry).filter(
+                    GradingCacheEntry.id.in_(stale_ids)
+                ).delete(synchronize_session=False)
+
+            db.commit()
+            if removed:
+                self._count("evictions", removed)
+            return removed
+        finally:
+            if own_session:
+                db.close()
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            memory_items = len(self._memory)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["db_hits"]
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "memory_items": memory_items,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+grading_cache = GradingCache()
@@ -0,0 +1,176 @@
+import os
+import uuid
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from .schemas import SubmissionRequest
+from .services import grade_submission
+from .resilience import GradingUnavailable
+
+# Workers only await the grading pool, so a handful is enough to keep it saturated
+JOB_WORKERS = int(os.getenv("GRADING_JOB_WORKERS", os.getenv("GRADING_MAX_CONCURRENCY", "8")))
+JOB_QUEUE_MAX = int(os.getenv("GRADING_JOB_QUEUE_MAX", "1000"))
+# Finished jobs are kept this long so clients can still poll the result
+JOB_TTL_SECONDS = int(os.getenv("GRADING_JOB_TTL_SECONDS", "3600"))
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class GradingJob:
+    def __init__(self, request: SubmissionRequest, organization_id: Optional[int] = None, user_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.organization_id = organization_id
+        self.user_id = user_id  # Owner: only they can read the status and the events
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.retry_at = None
+        self.deferrals = 0
+        self.subscribers = []  # (event loop, asyncio.Queue) pairs of SSE listeners
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result.model_dump() if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "retry_at": self.retry_at.isoformat() if self.retry_at else None,
+        }
+
+
+class GradingJobManager:
+    """
+    In-process grading job queue. Jobs run on a private event loop thread, so
+    they are independent of the request that created them, and progress is
+    pushed to SSE subscribers living on any other loop.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_max: int = JOB_QUEUE_MAX,
+                 ttl_seconds: int = JOB_TTL_SECONDS):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self.counters = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "deferred": 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._run_loop, args=(ready,), name="grading-jobs", daemon=True).start()
+        ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        for _ in range(self.workers):
+            self._loop.create_task(self._worker())
+        ready.set()
+        self._loop.run_forever()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._update(job, "running", started_at=datetime.utcnow())
+            try:
+                result = await grade_submission(job.request, organization_id=job.organization_id)
+                self._update(job, "done", result=result, finished_at=datetime.utcnow())
+            except GradingUnavailable as e:
+                # Provider unhealthy: park the job instead of failing it, the breaker decides when to retry
+                with self._lock:
+                    job.deferrals += 1
+                    self.counters["deferred"] += 1
+                self._update(job, "queued", retry_at=datetime.utcnow() + timedelta(seconds=e.retry_after))
+                self._loop.call_later(e.retry_after, self._queue.put_nowait, job)
+            except Exception as e:
+                print(f"Grading job {job.id} failed: {e}")
+                self._update(job, "failed", error=str(e), finished_at=datetime.utcnow())
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job: GradingJob, status: str, **fields):
+        with self._lock:
+            job.status = status
+            for name, value in fields.items():
+                setattr(job, name, value)
+            if status in TERMINAL_STATUSES:
+                self.counters[status] += 1
+            event = job.snapshot()
+            subscribers = list(job.subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in TERMINAL_STATUSES and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, request: SubmissionRequest, organization_id: Optional[int] = None,
+               user_id: Optional[int] = None) -> GradingJob:
+        self._ensure_started()
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job.status == "queued")
+            if pending >= self.queue_max:
+                self.counters["rejected"] += 1
+                raise JobQueueFull()
+            job = GradingJob(request, organization_id, user_id)
+            self._jobs[job.id] = job
+            self.counters["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    def spawn(self, coro):
+        """Runs a long coroutine (e.g. a bulk regrade) on the grading loop, detached from the request."""
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def get(self, job_id: str) -> Optional[GradingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def subscribe(self, job: GradingJob) -> asyncio.Queue:
+        """Returns a queue on the caller's loop that first receives the current state, then every change."""
+        queue = asyncio.Queue()
+        with self._lock:
+            job.subscribers.append((asyncio.get_running_loop(), queue))
+            queue.put_nowait(job.snapshot())
+        return queue
+
+    def unsubscribe(self, job: GradingJob, queue: asyncio.Queue):
+        with self._lock:
+            job.subscribers = [s for s in job.subscribers if s[1] is not queue]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "retained": len(statuses),
+        }
+
+
+job_manager = GradingJobManager()
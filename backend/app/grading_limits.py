@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import func
+from .database import SessionLocal
+from .models import Organization, GradingUsageRollup
+from .rate_limit import create_bucket_store
+from .telemetry import grading_telemetry
+
+# Grading requests per minute and burst size, per user and per organization
+USER_RATE_PER_MINUTE = float(os.getenv("GRADING_USER_RATE_PER_MINUTE", "6"))
+USER_BURST = float(os.getenv("GRADING_USER_BURST", "3"))
+ORG_RATE_PER_MINUTE = float(os.getenv("GRADING_ORG_RATE_PER_MINUTE", "120"))
+ORG_BURST = float(os.getenv("GRADING_ORG_BURST", "60"))
+# Model tokens per organization and UTC day when Organization.daily_token_quota is empty (0 = unlimited)
+DEFAULT_DAILY_TOKEN_QUOTA = int(os.getenv("GRADING_DAILY_TOKEN_QUOTA", "0"))
+# How long the quota and today's flushed usage are reused before asking the database again
+QUOTA_CACHE_SECONDS = float(os.getenv("GRADING_QUOTA_CACHE_SECONDS", "10"))
+
+
+class GradingLimitExceeded(Exception):
+    def __init__(self, retry_after: float, message: str):
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+
+
+def _today() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class GradingLimiter:
+    """
+    Admission control for gradings: a token bucket per user and per
+    organization (in a pluggable store, see app/rate_limit.py) and a daily
+    model-token quota per organization, counted from the telemetry rollups.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or create_bucket_store()
+        self._quota_cache = {}  # organization -> (day, fetched_at, telemetry flushes, quota, stored usage)
+        self._lock = threading.Lock()
+        self.counters = {"allowed": 0, "user_limited": 0, "org_limited": 0, "quota_exceeded": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def check(self, user_id: int, organization_id: Optional[int]):
+        """
+        Raises GradingLimitExceeded when this user may not start a grading now.
+        Blocking (database, shared bucket store): call it from a thread, not the event loop.
+        """
+        # The quota costs no bucket tokens, so it is checked first
+        if organization_id is not None:
+            quota, used = self.quota_usage(organization_id)
+            if quota and used >= quota:
+                self._count("quota_exceeded")
+                reset_in = (_today() + timedelta(days=1) - datetime.utcnow()).total_seconds()
+                raise GradingLimitExceeded(reset_in, "Kurumunun günlük değerlendirme kotası doldu. Kota her gün 00:00 (UTC) yenilenir.")
+
+        user_key = f"user:{user_id}"
+        wait = self.store.take(user_key, USER_RATE_PER_MINUTE / 60, USER_BURST)
+        if wait > 0:
+            self._count("user_limited")
+            raise GradingLimitExceeded(wait, "Çok sık değerlendirme isteği gönderdin, lütfen biraz bekleyip tekrar dene.")
+
+        if organization_id is not None:
+            wait = self.store.take(f"org:{organization_id}", ORG_RATE_PER_MINUTE / 60, ORG_BURST)
+            if wait > 0:
+                # Not the user's fault: their burst stays intact
+                self.store.refund(user_key)
+                self._count("org_limited")
+                raise GradingLimitExceeded(wait, "Kurumunun değerlendirme istek sınırı aşıldı, lütfen biraz sonra tekrar dene.")
+
+        self._count("allowed")
+
+    def quota_usage(self, organization_id: int) -> Tuple[int, int]:
+        """(daily token quota or 0, tokens used today) of an organization."""
+        today = _today()
+        flushes = grading_telemetry.flushes
+        with self._lock:
+            cached = self._quota_cache.get(organization_id)
+        if (cached is None or cached[0] != today or cached[2] != flushes
+                or time.monotonic() - cached[1] > QUOTA_CACHE_SECONDS):
+            db = SessionLocal()
+            try:
+                org = db.query(Organization).filter(Organization.id == organization_id).first()
+                quota = org.daily_token_quota if org and org.daily_token_quota is not None else DEFAULT_DAILY_TOKEN_QUOTA
+                stored = db.query(
+                    func.coalesce(func.sum(GradingUsageRollup.prompt_tokens + GradingUsageRollup.output_tokens), 0)
+                ).filter(
+                    GradingUsageRollup.organization_id == organization_id,
+                    GradingUsageRollup.bucket_start >= today,
+                ).scalar()
+            finally:
+                db.close()
+            cached = (today, time.monotonic(), flushes, quota, int(stored or 0))
+            with self._lock:
+                self._quota_cache[organization_id] = cached
+        _, _, _, quota, stored = cached
+        # Gradings of this process that are not in the rollup table yet
+        return quota, stored + grading_telemetry.pending_tokens(organization_id, today)
+
+    def forget(self, organization_id: int):
+        """Drops the cached quota, e.g. after an admin changed it."""
+        with self._lock:
+            self._quota_cache.pop(organization_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "store": type(self.store).__name__,
+                "user_rate_per_minute": USER_RATE_PER_MINUTE,
+                "org_rate_per_minute": ORG_RATE_PER_MINUTE,
+                "default_daily_token_quota": DEFAULT_DAILY_TOKEN_QUOTA,
+            }
+
+
+grading_limiter = GradingLimiter()
@@ -0,0 +1,118 @@
+import os
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+from cachetools import TTLCache
+
+# Cache settings (all overridable from .env)
+LEADERBOARD_CACHE_ENABLED = os.getenv("LEADERBOARD_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+LEADERBOARD_CACHE_SIZE = int(os.getenv("LEADERBOARD_CACHE_SIZE", "1024"))
+# Upper bound on staleness for writes this process does not see (other workers, CLI scripts)
+LEADERBOARD_CACHE_TTL_SECONDS = int(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "300"))
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a serialized leaderboard: equal bytes, equal tag."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (a list of tags or *; W/ tags compare weakly, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class LeaderboardCache:
+    """
+    Serialized GET /leaderboard/ responses per (organization_id, class_code), kept
+    until a write in the organization (submission, badge, regrade, roster or
+    profile change) invalidates them, or the day changes (streaks depend on it).
+
+    Each organization has a version that invalidate() bumps. A response computed
+    while a write committed carries the old version and is not stored, so it
+    cannot outlive the invalidation.
+    """
+
+    def __init__(self, max_items: int = LEADERBOARD_CACHE_SIZE, ttl_seconds: int = LEADERBOARD_CACHE_TTL_SECONDS,
+                 enabled: bool = LEADERBOARD_CACHE_ENABLED):
+        self.enabled = enabled
+        self._entries = TTLCache(maxsize=max_items, ttl=ttl_seconds)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "stores": 0,
+            "stale_stores_skipped": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def version(self, organization_id: Optional[int]) -> int:
+        """Read before computing a response; pass it to set()."""
+        with self._lock:
+            return self._versions.get(organization_id, 0)
+
+    def get(self, organization_id: Optional[int], class_code: Optional[str]) -> Optional[tuple]:
+        """(etag, body) of the cached response, or None."""
+        if not self.enabled:
+            return None
+        today = datetime.utcnow().date()
+        with self._lock:
+            cached = self._entries.get((organization_id, class_code or None))
+            if cached is not None and cached[0] == self._versions.get(organization_id, 0) and cached[1] == today:
+                self.counters["hits"] += 1
+                return cached[2], cached[3]
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, organization_id: Optional[int], class_code: Optional[str], body: bytes, version: int) -> str:
+        """Stores a response computed at `version`; returns its ETag either way."""
+        etag = make_etag(body)
+        if not self.enabled:
+            return etag
+        with self._lock:
+            if version != self._versions.get(organization_id, 0):
+                self.counters["stale_stores_skipped"] += 1
+                return etag
+            self._entries[(organization_id, class_code or None)] = (version, datetime.utcnow().date(), etag, body)
+            self.counters["stores"] += 1
+        return etag
+
+    def not_modified(self):
+        """Counts a 304 answer (the client's copy was current)."""
+        self._count("not_modified")
+
+    def invalidate(self, organization_id: Optional[int]):
+        """Drops every cached board of the organization (all classes); call after the write commits."""
+        with self._lock:
+            self._versions[organization_id] = self._versions.get(organization_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == organization_id]:
+                self._entries.pop(key, None)
+            self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            items = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "items": items,
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+leaderboard_cache = LeaderboardCache()
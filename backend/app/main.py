@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from .schemas import SubmissionRequest, GradingResult
 from .services import grade_submission
+from .resilience import GradingUnavailable
 from .database import engine, Base
 from sqlalchemy import text
 from . import models
-from .routers import admin, auth, users, assignments, submissions, announcements, leaderboard
+from .routers import admin, auth, users, assignments, submissions, announcements, leaderboard, grading, metrics
+from .routers.grading import get_grading_user
 import os
+import math
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -42,7 +45,41 @@ try:
                  conn.execute(text("ALTER TABLE organizations ADD COLUMN is_active BOOLEAN DEFAULT 1"))
             conn.commit()
 
-        # 3. FORCE FIX: Unique Constraints for Tenant Isolation
+        # 3. Check assignments.hidden_tests
+        try:
+            conn.execute(text("SELECT hidden_tests FROM assignments LIMIT 1"))
+        except Exception:
+            conn.rollback() # Postgres aborts the transaction after the failed SELECT
+            print("Migrating: Adding 'hidden_tests' to assignments...")
+            conn.execute(text("ALTER TABLE assignments ADD COLUMN hidden_tests JSON"))
+            conn.commit()
+
+        # 4. Check organizations.daily_token_quota
+        try:
+            conn.execute(text("SELECT daily_token_quota FROM organizations LIMIT 1"))
+        except Exception:
+            conn.rollback()
+            print("Migrating: Adding 'daily_token_quota' to organizations...")
+            conn.execute(text("ALTER TABLE organizations ADD COLUMN daily_token_quota INTEGER"))
+            conn.commit()
+
+        # 5. Check submissions typed score columns (+ backfill from grading_result below)
+        try:
+            conn.execute(text("SELECT grade, code_quality, tests_passed, tests_total FROM submissions LIMIT 1"))
+        except Exception:
+            conn.rollback()
+            print("Migrating: Adding typed score columns to submissions...")
+            for column, column_type in (("grade", "INTEGER"), ("code_quality", "VARCHAR"),
+                                        ("tests_passed", "INTEGER"), ("tests_total", "INTEGER")):
+                try:
+                    conn.execute(text(f"ALTER TABLE submissions ADD COLUMN {column} {column_type}"))
+                    conn.commit()
+                except Exception:
+                    conn.rollback() # Already added by an interrupted earlier run
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_submissions_grade ON submissions (grade)"))
+            conn.commit()
+
+        # 6. FORCE FIX: Unique Constraints for Tenant Isolation
         print("Migrating: Fixing User Unique Constraints...")
         try:
              # 1. Drop old unique index on student_number (SQLite/Postgres common name)
@@ -65,9 +102,74 @@ try:
         except Exception as e:
              print(f"Constraint Fix Warning: {e}")
 
+        # 7. Composite indexes of the tenant-scoped hot queries (declared in models.py)
+        hot_query_indexes = (
+            "ix_users_org_role_class", "ix_assignments_org_id", "ix_submissions_user_submitted",
+            "ix_submissions_assignment_user", "ix_announcements_organization_id", "ix_user_badges_user_badge",
+        )
+        declared = {index.name: index for table in models.Base.metadata.tables.values() for index in table.indexes}
+        conn.execute(text("DROP INDEX IF EXISTS ix_assignments_org_created")) # Replaced by ix_assignments_org_id (list pages)
+        conn.commit()
+        for name in hot_query_indexes:
+            try:
+                declared[name].create(bind=conn, checkfirst=True)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Index Warning ({name}): {e}")
+
+        # 8. Denormalized organization_id on submissions and user_badges (copied from the owning user)
+        for table in ("submissions", "user_badges"):
+            try:
+                conn.execute(text(f"SELECT organization_id FROM {table} LIMIT 1"))
+            except Exception:
+                conn.rollback()
+                print(f"Migrating: Adding 'organization_id' to {table}...")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN organization_id INTEGER REFERENCES organizations(id)"))
+                conn.commit()
+            # Rows written before the column existed (no-op once done)
+            filled = conn.execute(text(
+                f"UPDATE {table} SET organization_id = "
+                f"(SELECT users.organization_id FROM users WHERE users.id = {table}.user_id) "
+                f"WHERE organization_id IS NULL AND user_id IN (SELECT id FROM users WHERE organization_id IS NOT NULL)"
+            )).rowcount
+            conn.commit()
+            if filled:
+                print(f"Migrating: Backfilled organization_id of {filled} {table} rows.")
+        for name in ("ix_submissions_org_submitted", "ix_user_badges_org_user"):
+            declared[name].create(bind=conn, checkfirst=True)
+            conn.commit()
+
 except Exception as e:
     print(f"Migration check warning: {e}")
 
+# Fill the typed score columns of submissions stored before they existed (no-op once done)
+try:
+    from .database import SessionLocal
+    from .scores import backfill_submission_scores
+    _db = SessionLocal()
+    try:
+        _backfilled = backfill_submission_scores(_db)
+        if _backfilled:
+            print(f"Migrating: Backfilled scores of {_backfilled} submissions.")
+    finally:
+        _db.close()
+except Exception as e:
+    print(f"Score backfill warning: {e}")
+
+# Build the leaderboard standings of databases upgraded from before they existed (no-op once done)
+try:
+    from .database import SessionLocal
+    from .standings import rebuild_standings
+    _db = SessionLocal()
+    try:
+        if _db.query(models.StudentStanding.id).first() is None and _db.query(models.Submission.id).first() is not None:
+            print(f"Migrating: Built the leaderboard standings of {rebuild_standings(_db)} students.")
+    finally:
+        _db.close()
+except Exception as e:
+    print(f"Standings backfill warning: {e}")
+
 
 
 app = FastAPI(
@@ -83,6 +185,8 @@ app.include_router(assignments.router)
 app.include_router(submissions.router)
 app.include_router(announcements.router)
 app.include_router(leaderboard.router)
+app.include_router(grading.router)
+app.include_router(metrics.router)
 
 
 
@@ -105,13 +209,20 @@ async def root():
     return {"message": "CodeGradeAI Backend is running", "status": "active"}
 
 @app.post("/api/grade", response_model=GradingResult)
-async def grade_code(request: SubmissionRequest):
+async def grade_code(request: SubmissionRequest, current_user: models.User = Depends(get_grading_user)):
     """
     Analyzes and grades the submitted code using Google Gemini AI.
+    Requires a logged-in user; per-user/organization limits answer 429.
     """
     try:
-        result = await grade_submission(request)
+        result = await grade_submission(request, organization_id=current_user.organization_id)
         return result
+    except GradingUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Değerlendirme servisi şu anda yoğun, lütfen biraz sonra tekrar deneyin.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
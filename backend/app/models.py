@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, UniqueConstraint
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Date, DateTime, JSON, UniqueConstraint, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -10,6 +10,7 @@ class Organization(Base):
     name = Column(String, unique=True, index=True) # Teacher's Workspace Name
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True) # Subscription Status (Active/Passive)
+    daily_token_quota = Column(Integer, nullable=True) # Model tokens per UTC day, NULL = GRADING_DAILY_TOKEN_QUOTA
 
     users = relationship("User", back_populates="organization")
     assignments = relationship("Assignment", back_populates="organization")
@@ -19,6 +20,8 @@ class User(Base):
     __table_args__ = (
         UniqueConstraint('student_number', 'organization_id', name='_student_org_uc'),
         UniqueConstraint('email', 'organization_id', name='_email_org_uc'),
+        # Student lists, leaderboard and "the teacher of this org": organization_id + role (+ class_code)
+        Index('ix_users_org_role_class', 'organization_id', 'role', 'class_code'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -38,6 +41,10 @@ class User(Base):
 
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        # Assignment list pages, newest (highest id) first
+        Index('ix_assignments_org_id', 'organization_id', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
@@ -51,25 +58,59 @@ class Assignment(Base):
     target_type = Column(String, default="all")
     target_class = Column(String, nullable=True)
     target_students = Column(JSON, nullable=True)
+    hidden_tests = Column(JSON, nullable=True) # Teacher-defined test cases run in the sandbox
 
     organization = relationship("Organization", back_populates="assignments")
     submissions = relationship("Submission", back_populates="assignment")
 
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        # A student's submissions in time order (lists, badges, leaderboard)
+        Index('ix_submissions_user_submitted', 'user_id', 'submitted_at'),
+        # Per-assignment work: regrade runs, latest submission per student
+        Index('ix_submissions_assignment_user', 'assignment_id', 'user_id'),
+        # Tenant-wide lists without joining users
+        Index('ix_submissions_org_submitted', 'organization_id', 'submitted_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True) # Copy of owner.organization_id
     assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=True)
     code_content = Column(Text)
     grading_result = Column(JSON)
     submitted_at = Column(DateTime, default=datetime.utcnow)
+    # Typed copies of grading_result (app/scores.py keeps them in step); NULL = not backfilled yet
+    grade = Column(Integer, nullable=True, index=True)
+    code_quality = Column(String, nullable=True)
+    tests_passed = Column(Integer, nullable=True)
+    tests_total = Column(Integer, nullable=True)
 
     owner = relationship("User", back_populates="submissions")
     assignment = relationship("Assignment", back_populates="submissions")
+    test_results = relationship("SubmissionTestResult", back_populates="submission",
+                                cascade="all, delete-orphan",
+                                order_by="SubmissionTestResult.position")
+
+class SubmissionTestResult(Base):
+    """One entry of a submission's grading_result["unitTests"]."""
+    __tablename__ = "submission_test_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), index=True)
+    position = Column(Integer, default=0)
+    test_name = Column(String)
+    passed = Column(Boolean, default=False)
+    message = Column(Text, nullable=True)
+
+    submission = relationship("Submission", back_populates="test_results")
 
 class Announcement(Base):
     __tablename__ = "announcements"
+    __table_args__ = (
+        Index('ix_announcements_organization_id', 'organization_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
@@ -80,10 +121,99 @@ class Announcement(Base):
 
 class UserBadge(Base):
     __tablename__ = "user_badges"
+    __table_args__ = (
+        Index('ix_user_badges_user_badge', 'user_id', 'badge_name'),
+        Index('ix_user_badges_org_user', 'organization_id', 'user_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True) # Copy of user.organization_id
     badge_name = Column(String, index=True)
     earned_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="badges")
+
+class StudentAssignmentStanding(Base):
+    """Best attempt of a student on an assignment (app/standings.py keeps it in step with submissions)."""
+    __tablename__ = "student_assignment_standings"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'assignment_id', name='_student_assignment_standing_uc'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"))
+    best_score = Column(Integer, default=0)
+    xp = Column(Integer, default=0) # Most XP among the attempts with the best score
+
+class StudentStanding(Base):
+    """Leaderboard totals and streak state of a student (sums of their StudentAssignmentStanding rows)."""
+    __tablename__ = "student_standings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True, index=True)
+    total_xp = Column(Integer, default=0)
+    score_sum = Column(Integer, default=0)
+    assignments = Column(Integer, default=0)
+    completed_tasks = Column(Integer, default=0)
+    last_submission_date = Column(Date, nullable=True)
+    streak_days = Column(Integer, default=0) # Consecutive submission days ending on last_submission_date
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class GradingCacheEntry(Base):
+    __tablename__ = "grading_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, index=True) # sha256 of the grading inputs
+    result = Column(Text) # GradingResult as JSON
+    model_name = Column(String)
+    prompt_version = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = Column(DateTime, default=datetime.utcnow, index=True)
+    hit_count = Column(Integer, default=0)
+
+class RegradeRun(Base):
+    __tablename__ = "regrade_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    mode = Column(String, default="all") # 'all' or 'latest' (latest submission per student)
+    status = Column(String, default="pending") # 'pending', 'running', 'completed', 'failed'
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    failed_submission_ids = Column(JSON, nullable=True)
+    last_submission_id = Column(Integer, default=0) # Checkpoint: submissions are processed in id order
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class GradingUsageRollup(Base):
+    """Hourly grading usage per organization/assignment/model (capacity planning, billing)."""
+    __tablename__ = "grading_usage_rollups"
+    __table_args__ = (
+        UniqueConstraint('bucket_start', 'organization_id', 'assignment_id', 'model_name', name='_grading_usage_bucket_uc'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime, index=True) # Start of the hour (UTC)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=True)
+    model_name = Column(String)
+    requests = Column(Integer, default=0)
+    model_calls = Column(Integer, default=0)
+    cache_hits = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    retries = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    latency_ms_sum = Column(Float, default=0.0)
+    latency_ms_max = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
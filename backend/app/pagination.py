@@ -0,0 +1,49 @@
+import os
+import json
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# Rows per page of the list endpoints (?limit=), and the largest page a client may ask for
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+
+def encode_cursor(*values) -> str:
+    """Opaque cursor holding the sort key of the last row of a page."""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """Sort key of a cursor made by encode_cursor, one value per type in `types`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return [datetime.fromisoformat(value) if kind is datetime else kind(value) for kind, value in zip(types, values)]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+
+
+def after(column, value, tie_column=None, tie_value=None, descending: bool = False):
+    """
+    Keyset condition "row comes after the cursor" for ORDER BY column[, tie_column].
+    The tie-break is written as `column <= value AND (column < value OR tie < tie_value)`
+    instead of a row-value comparison, so SQLite and PostgreSQL both start the
+    index range on `column`.
+    """
+    if tie_column is None:
+        return column < value if descending else column > value
+    if descending:
+        return and_(column <= value, or_(column < value, tie_column < tie_value))
+    return and_(column >= value, or_(column > value, tie_column > tie_value))
+
+
+def page_of(rows: list, limit: int, key) -> tuple:
+    """Splits rows fetched with LIMIT limit + 1 into (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
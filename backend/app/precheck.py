@@ -0,0 +1,92 @@
+import re
+import threading
+from typing import Callable, Dict, Optional
+from .schemas import GradingResult, UnitTestResult
+
+# language -> function(code) returning a GradingResult when the code cannot be graded
+PRECHECKERS: Dict[str, Callable[[str], Optional[GradingResult]]] = {}
+
+_counters = {"checked": 0, "short_circuited": 0}
+_counters_lock = threading.Lock()
+
+
+def register_prechecker(language: str, checker: Callable[[str], Optional[GradingResult]]):
+    PRECHECKERS[language.lower()] = checker
+
+
+def normalize_language(language: str) -> str:
+    # "Python 3", "python3", "Python (3.11)" -> "python"
+    head = re.split(r"[\s/()\-_.,]+", (language or "").strip().lower())[0]
+    return head.rstrip("0123456789")
+
+
+def find_prechecker(language: str) -> Optional[Callable[[str], Optional[GradingResult]]]:
+    return PRECHECKERS.get(normalize_language(language))
+
+
+def syntax_error_result(language: str, line: int, column: int, message: str, source_line: str = "") -> GradingResult:
+    location = f"{line}. satır, {column}. sütun"
+    snippet = ""
+    if source_line:
+        snippet = f"\n\n{source_line.rstrip()}\n{' ' * max(column - 1, 0)}^"
+    return GradingResult(
+        grade=0,
+        feedback=(
+            f"Kodun çalıştırılamadı çünkü {language} yorumlayıcısı onu okuyamıyor: "
+            f"{location} konumunda sözdizimi hatası var ({message}).{snippet}\n\n"
+            "Bu hatayı düzeltip tekrar gönderdiğinde kodun detaylı olarak değerlendirilecek."
+        ),
+        codeQuality="Sözdizimi Hatası",
+        suggestions=[
+            f"{location} civarını kontrol et: eksik parantez, tırnak, iki nokta (:) veya hatalı girinti olabilir.",
+            "Kodunu göndermeden önce kendi bilgisayarında bir kez çalıştırmayı dene.",
+        ],
+        unitTests=[
+            UnitTestResult(testName="Sözdizimi Kontrolü", passed=False, message=f"{location}: {message}")
+        ],
+    )
+
+
+def check_python(code: str) -> Optional[GradingResult]:
+    try:
+        # compile() only parses and builds bytecode, it never executes the student's code
+        compile(code, "<öğrenci kodu>", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return syntax_error_result("Python", e.lineno or 1, e.offset or 1, e.msg, e.text or "")
+    except ValueError as e:
+        # e.g. source code containing null bytes
+        return syntax_error_result("Python", 1, 1, str(e))
+    except (RecursionError, MemoryError):
+        # Too deeply nested for the local compiler (e.g. '1+' * 200000): let the model grade it
+        return None
+    return None
+
+
+register_prechecker("python", check_python)
+register_prechecker("py", check_python)
+
+
+def precheck_submission(language: str, code: str) -> Optional[GradingResult]:
+    """
+    Runs the local parser for the language, if there is one. Returns a final
+    GradingResult for code that does not compile, so the model call can be skipped.
+    """
+    checker = find_prechecker(language)
+    if checker is None:
+        return None
+
+    result = checker(code)
+    with _counters_lock:
+        _counters["checked"] += 1
+        if result is not None:
+            _counters["short_circuited"] += 1
+    return result
+
+
+def get_precheck_stats() -> dict:
+    with _counters_lock:
+        return {
+            **_counters,
+            "model_calls_saved": _counters["short_circuited"],
+            "languages": sorted(PRECHECKERS),
+        }
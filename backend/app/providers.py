@@ -0,0 +1,352 @@
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from typing import Iterator, List, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from .schemas import GradingAnswer
+from .token_budget import estimate_tokens, MAX_OUTPUT_TOKENS
+
+# gemini (default) | fake | record (gemini + write cassette) | replay (cassette only, no network)
+GRADING_PROVIDER = os.getenv("GRADING_PROVIDER", "gemini").lower()
+GRADING_CASSETTE = os.getenv("GRADING_CASSETTE", "cassettes/grading.jsonl")
+
+
+class ProviderResponse:
+    """A provider neutral model answer, or one chunk of a streamed answer."""
+
+    def __init__(self, text: str, finish_reason: Optional[str] = None, prompt_tokens: Optional[int] = None,
+                 output_tokens: Optional[int] = None, total_tokens: Optional[int] = None):
+        self.text = text
+        # "STOP", "MAX_TOKENS", ...; only set on the last chunk of a stream
+        self.finish_reason = finish_reason
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = total_tokens
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class GradingProvider:
+    """
+    Interface of a grading model backend. Calls are blocking; services runs them
+    on the grading pool. Errors should be raised as google.api_core exceptions
+    (or TimeoutError/ConnectionError/ValueError) so app/resilience.py can classify them.
+    """
+    name = "base"
+    model_name = ""
+
+    def is_configured(self) -> bool:
+        return True
+
+    def generate(self, level: str, system_instruction: str, prompt: str, max_output_tokens: int) -> ProviderResponse:
+        raise NotImplementedError
+
+    def stream(self, level: str, system_instruction: str, prompt: str, max_output_tokens: int) -> Iterator[ProviderResponse]:
+        # Providers without native streaming send the whole answer as one chunk
+        yield self.generate(level, system_instruction, prompt, max_output_tokens)
+
+    def stats(self) -> dict:
+        return {"name": self.name, "model": self.model_name}
+
+
+class GeminiProvider(GradingProvider):
+    name = "gemini"
+
+    GENERATION_CONFIG = {
+        "temperature": 0.4,
+        "top_p": 1,
+        "top_k": 32,
+        # Upper bound only; every request sets its own limit (see app/token_budget.py)
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+        "response_mime_type": "application/json",
+        "response_schema": GradingAnswer,
+    }
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        # Check both GEMINI_API_KEY and GOOGLE_API_KEY for service compatibility
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        # Default to the most universal stable model if not specified
+        self.model_name = model_name or os.getenv("GEMINI_MODEL_NAME", "gemini-3-flash-preview")
+        # One GenerativeModel per level; they share the SDK's default client channel
+        self._models = {}
+        self._lock = threading.Lock()
+        if not self.api_key:
+            print("WARNING: API Key (GEMINI_API_KEY or GOOGLE_API_KEY) is not set in environment variables.")
+        else:
+            genai.configure(api_key=self.api_key)
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def get_model(self, level: str, system_instruction: str):
+        model = self._models.get(level)
+        if model is None:
+            with self._lock:
+                model = self._models.get(level)
+                if model is None:
+                    model = genai.GenerativeModel(
+                        model_name=self.model_name,
+                        generation_config=self.GENERATION_CONFIG,
+                        system_instruction=system_instruction,
+                    )
+                    self._models[level] = model
+        return model
+
+    @staticmethod
+    def _convert(response, last: bool = True) -> ProviderResponse:
+        try:
+            finish_reason = response.candidates[0].finish_reason.name
+        except Exception:
+            finish_reason = None
+        try:
+            text = response.text
+        except ValueError:
+            # No text parts, e.g. the output limit was spent before any JSON was written
+            if finish_reason in (None, "STOP") and last:
+                raise
+            text = ""
+        converted = ProviderResponse(text, finish_reason)
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            converted.prompt_tokens = metadata.prompt_token_count or None
+            converted.output_tokens = metadata.candidates_token_count or None
+            converted.total_tokens = metadata.total_token_count or None
+        return converted
+
+    def generate(self, level, system_instruction, prompt, max_output_tokens):
+        response = self.get_model(level, system_instruction).generate_content(
+            prompt, generation_config={"max_output_tokens": max_output_tokens}
+        )
+        return self._convert(response)
+
+    def stream(self, level, system_instruction, prompt, max_output_tokens):
+        for chunk in self.get_model(level, system_instruction).generate_content(
+            prompt, stream=True, generation_config={"max_output_tokens": max_output_tokens}
+        ):
+            yield self._convert(chunk, last=False)
+
+
+class FakeProvider(GradingProvider):
+    """
+    Deterministic local provider for benchmarks and load tests: no network, a
+    lognormal latency (median/sigma), an error rate and canned answers chosen
+    by prompt hash. Seeded, so two runs with the same inputs behave the same.
+    """
+    name = "fake"
+
+    ERRORS = {
+        "server_error": lambda: google_exceptions.ServiceUnavailable("Sahte sağlayıcı: servis kullanılamıyor"),
+        "rate_limit": lambda: google_exceptions.TooManyRequests("Sahte sağlayıcı: istek sınırı aşıldı"),
+        "timeout": lambda: google_exceptions.DeadlineExceeded("Sahte sağlayıcı: zaman aşımı"),
+    }
+
+    def __init__(self, latency_ms: float = 0, latency_sigma: float = 0.5, error_rate: float = 0.0,
+                 error_kind: str = "server_error", responses: Optional[List[str]] = None, seed: int = 0,
+                 stream_chunk_chars: int = 40, model_name: str = "fake"):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.responses = responses or []
+        self.stream_chunk_chars = stream_chunk_chars
+        self.model_name = model_name
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "injected_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "FakeProvider":
+        responses = None
+        path = os.getenv("FAKE_PROVIDER_RESPONSES")
+        if path:
+            # Either a JSON list of answers or a cassette (JSON lines with a "text" field)
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+            try:
+                responses = [r if isinstance(r, str) else json.dumps(r, ensure_ascii=False) for r in json.loads(content)]
+            except ValueError:
+                responses = [json.loads(line)["text"] for line in content.splitlines() if line.strip()]
+        return cls(
+            latency_ms=float(os.getenv("FAKE_PROVIDER_LATENCY_MS", "0")),
+            latency_sigma=float(os.getenv("FAKE_PROVIDER_LATENCY_SIGMA", "0.5")),
+            error_rate=float(os.getenv("FAKE_PROVIDER_ERROR_RATE", "0")),
+            error_kind=os.getenv("FAKE_PROVIDER_ERROR_KIND", "server_error"),
+            responses=responses,
+            seed=int(os.getenv("FAKE_PROVIDER_SEED", "0")),
+        )
+
+    def _draw(self):
+        with self._lock:
+            self.counters["calls"] += 1
+            latency = 0.0
+            if self.latency_ms > 0:
+                latency = self._random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.counters["injected_errors"] += 1
+        return latency, failed
+
+    def _answer(self, prompt: str) -> str:
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        if self.responses:
+            return self.responses[digest % len(self.responses)]
+        return json.dumps({
+            "grade": 60 + digest % 41,
+            "feedback": "Sahte sağlayıcı tarafından üretilen değerlendirme.",
+            "codeQuality": "İyi",
+            "suggestions": ["Kodunu küçük fonksiyonlara bölmeyi dene."],
+            "unitTests": [{"testName": "Örnek Test", "passed": True, "message": "Geçti"}],
+        }, ensure_ascii=False)
+
+    def generate(self, level, system_instruction, prompt, max_output_tokens):
+        latency, failed = self._draw()
+        time.sleep(latency)
+        if failed:
+            if self.error_kind == "invalid_json":
+                return ProviderResponse("{bozuk yanıt", "STOP")
+            raise self.ERRORS.get(self.error_kind, self.ERRORS["server_error"])()
+        text = self._answer(prompt)
+        prompt_tokens = estimate_tokens(system_instruction) + estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        return ProviderResponse(text, "STOP", prompt_tokens, output_tokens, prompt_tokens + output_tokens)
+
+    def stream(self, level, system_instruction, prompt, max_output_tokens):
+        response = self.generate(level, system_instruction, prompt, max_output_tokens)
+        text = response.text
+        size = max(1, self.stream_chunk_chars)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for piece in pieces[:-1]:
+            yield ProviderResponse(piece)
+        yield ProviderResponse(pieces[-1], response.finish_reason, response.prompt_tokens,
+                               response.output_tokens, response.total_tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**super().stats(), **counters, "latency_ms": self.latency_ms, "error_rate": self.error_rate}
+
+
+def cassette_key(model_name: str, level: str, prompt: str) -> str:
+    return hashlib.sha256(json.dumps([model_name, level, prompt], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RecordingProvider(GradingProvider):
+    """Passes calls through to a real provider and appends every answer to a cassette (JSON lines)."""
+    name = "record"
+
+    def __init__(self, inner: GradingProvider, path: str):
+        self.inner = inner
+        self.path = path
+        self.model_name = inner.model_name
+        self._lock = threading.Lock()
+        self.recorded = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def is_configured(self) -> bool:
+        return self.inner.is_configured()
+
+    def _record(self, level: str, prompt: str, response: ProviderResponse, latency: float):
+        entry = {
+            "key": cassette_key(self.model_name, level, prompt),
+            "model": self.model_name,
+            "level": level,
+            "latency_ms": round(latency * 1000, 1),
+            **response.to_dict(),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def generate(self, level, system_instruction, prompt, max_output_tokens):
+        start = time.perf_counter()
+        response = self.inner.generate(level, system_instruction, prompt, max_output_tokens)
+        self._record(level, prompt, response, time.perf_counter() - start)
+        return response
+
+    def stream(self, level, system_instruction, prompt, max_output_tokens):
+        start = time.perf_counter()
+        texts = []
+        last = None
+        for chunk in self.inner.stream(level, system_instruction, prompt, max_output_tokens):
+            texts.append(chunk.text)
+            last = chunk
+            yield chunk
+        if last is not None:
+            whole = ProviderResponse("".join(texts), last.finish_reason, last.prompt_tokens,
+                                     last.output_tokens, last.total_tokens)
+            self._record(level, prompt, whole, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "name": self.name, "cassette": self.path, "recorded": self.recorded}
+
+
+class ReplayProvider(GradingProvider):
+    """
+    Answers from a recorded cassette, without network. Exact prompts replay their
+    own answer; other prompts get the recorded answers in turn (on_miss="cycle")
+    or fail (on_miss="error"). The recorded latency is reproduced if asked to.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, on_miss: str = "cycle", replay_latency: bool = True):
+        with open(path, encoding="utf-8") as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+        if not self.entries:
+            raise ValueError(f"Cassette {path} is empty")
+        self.path = path
+        self.on_miss = on_miss
+        self.replay_latency = replay_latency
+        self.model_name = f"replay:{self.entries[0].get('model', 'unknown')}"
+        self._recorded_model = self.entries[0].get("model", "")
+        self._by_key = {entry["key"]: entry for entry in self.entries}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    def _lookup(self, level: str, prompt: str) -> dict:
+        entry = self._by_key.get(cassette_key(self._recorded_model, level, prompt))
+        with self._lock:
+            if entry is not None:
+                self.counters["hits"] += 1
+                return entry
+            self.counters["misses"] += 1
+            if self.on_miss == "error":
+                raise LookupError("Kasette bu istem için kayıt yok")
+            entry = self.entries[self._next % len(self.entries)]
+            self._next += 1
+            return entry
+
+    def generate(self, level, system_instruction, prompt, max_output_tokens):
+        entry = self._lookup(level, prompt)
+        if self.replay_latency:
+            time.sleep(entry.get("latency_ms", 0) / 1000)
+        return ProviderResponse(entry["text"], entry.get("finish_reason"), entry.get("prompt_tokens"),
+                                entry.get("output_tokens"), entry.get("total_tokens"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**super().stats(), **counters, "cassette": self.path, "entries": len(self.entries)}
+
+
+def create_provider(name: str = GRADING_PROVIDER) -> GradingProvider:
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "fake":
+        return FakeProvider.from_env()
+    if name == "record":
+        return RecordingProvider(GeminiProvider(), GRADING_CASSETTE)
+    if name == "replay":
+        return ReplayProvider(
+            GRADING_CASSETTE,
+            on_miss=os.getenv("GRADING_CASSETTE_MISS", "cycle"),
+            replay_latency=os.getenv("GRADING_CASSETTE_LATENCY", "true").lower() not in ("0", "false", "no"),
+        )
+    raise ValueError(f"Unknown GRADING_PROVIDER: {name}")
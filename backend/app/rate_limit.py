@@ -0,0 +1,128 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `capacity` tokens, refilled at `rate` tokens per second.
+    Thread-safe, so one bucket can be shared by the event loop and pool threads.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Takes `tokens` if available and returns 0, otherwise returns the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def refund(self, tokens: float = 1):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    async def acquire(self, tokens: float = 1):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class MemoryBucketStore:
+    """Token buckets in this process; the default for a single worker."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        """Takes `tokens` from bucket `key` and returns 0, or the seconds until they are available."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or (bucket.rate, bucket.capacity) != (rate, capacity):
+                bucket = self._buckets[key] = TokenBucket(rate=rate, capacity=capacity)
+        return bucket.try_acquire(tokens)
+
+    def refund(self, key: str, tokens: float = 1):
+        """Gives back tokens taken for a request that was rejected later on."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.refund(tokens)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, shared by all worker processes of one node
+    (uvicorn --workers N). Each take is one short IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        conn = self._connection()
+        # Wall clock, since the buckets are shared between processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            available = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0
+            if available >= tokens:
+                available -= tokens
+            else:
+                wait = (tokens - available) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, available, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, key: str, tokens: float = 1):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Refill on the next take caps the bucket at its capacity again
+            conn.execute("UPDATE buckets SET tokens = tokens + ? WHERE key = ?", (tokens, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def create_bucket_store(spec: str = None):
+    """RATE_LIMIT_STORE: "memory" (default) or "sqlite:/path/to/limits.db"."""
+    spec = spec or os.getenv("RATE_LIMIT_STORE", "memory")
+    if spec.startswith("sqlite:"):
+        return SQLiteBucketStore(spec[len("sqlite:"):])
+    return MemoryBucketStore()
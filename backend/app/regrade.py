@@ -0,0 +1,233 @@
+import os
+import asyncio
+import threading
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import Assignment, Submission, RegradeRun
+from .rate_limit import TokenBucket
+from .scores import set_grading_result
+from .standings import refresh_standings
+from .leaderboard_cache import leaderboard_cache
+from .services import grade_submission, build_grading_request, GradingFailed
+from .schemas import SubmissionRequest
+from .resilience import GradingUnavailable
+
+# Match these to the Gemini quota left over after live student traffic
+REGRADE_RATE_PER_MINUTE = float(os.getenv("REGRADE_RATE_PER_MINUTE", "60"))
+REGRADE_BURST = int(os.getenv("REGRADE_BURST", "5"))
+REGRADE_CONCURRENCY = int(os.getenv("REGRADE_CONCURRENCY", "4"))
+# Results and the checkpoint are committed together once per batch
+REGRADE_BATCH_SIZE = int(os.getenv("REGRADE_BATCH_SIZE", "20"))
+
+# Shared by all runs so concurrent regrades together stay inside the quota
+regrade_limiter = TokenBucket(rate=REGRADE_RATE_PER_MINUTE / 60, capacity=REGRADE_BURST)
+
+_active_runs = set()
+_active_lock = threading.Lock()
+
+
+class RegradeAlreadyRunning(Exception):
+    pass
+
+
+def _target_query(db: Session, run: RegradeRun):
+    query = db.query(Submission).filter(Submission.assignment_id == run.assignment_id)
+    if run.mode == "latest":
+        latest_ids = (
+            select(func.max(Submission.id))
+            .where(Submission.assignment_id == run.assignment_id)
+            .group_by(Submission.user_id)
+        )
+        query = query.filter(Submission.id.in_(latest_ids))
+    return query
+
+
+def create_regrade_run(db: Session, assignment: Assignment, mode: str = "all", created_by: int = None) -> RegradeRun:
+    run = RegradeRun(
+        assignment_id=assignment.id,
+        organization_id=assignment.organization_id,
+        created_by=created_by,
+        mode=mode,
+        status="pending",
+    )
+    run.total = _target_query(db, run).count()
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+
+def is_run_active(run_id: int) -> bool:
+    with _active_lock:
+        return run_id in _active_runs
+
+
+def run_progress(run: RegradeRun) -> dict:
+    return {
+        "id": run.id,
+        "assignment_id": run.assignment_id,
+        "mode": run.mode,
+        "status": run.status,
+        "total": run.total,
+        "processed": run.processed,
+        "failed": run.failed,
+        "failed_submission_ids": run.failed_submission_ids or [],
+        "percent": round(100 * run.processed / run.total, 1) if run.total else 100.0,
+        "last_submission_id": run.last_submission_id,
+        "active": is_run_active(run.id),
+        "error": run.error,
+        "created_at": run.created_at,
+        "updated_at": run.updated_at,
+        "finished_at": run.finished_at,
+    }
+
+
+async def _regrade_one(template: SubmissionRequest, organization_id: Optional[int], submission_id: int,
+                       code_content: str, semaphore: asyncio.Semaphore):
+    request = template.model_copy(update={"studentCode": code_content})
+    async with semaphore:
+        while True:
+            await regrade_limiter.acquire()
+            try:
+                return await grade_submission(request, raise_on_error=True, organization_id=organization_id)
+            except GradingUnavailable as e:
+                # Provider unhealthy: wait for the circuit breaker rather than giving up on the submission
+                print(f"Regrade of submission {submission_id} deferred for {e.retry_after:.0f}s: {e}")
+                await asyncio.sleep(e.retry_after)
+            except GradingFailed as e:
+                # The old grade stays in place; the id is reported for a later retry
+                print(f"Regrade of submission {submission_id} failed: {e}")
+                return None
+
+
+# The helpers below run in a worker thread with their own short session each, so no
+# transaction (and no pooled connection) stays open while a batch waits on the model,
+# and the blocking DB calls never run on the event loop.
+
+def _start_run(run_id: int) -> tuple:
+    """Marks the run as running; returns (grading request template, organization_id)."""
+    db = SessionLocal()
+    try:
+        run = db.query(RegradeRun).filter(RegradeRun.id == run_id).first()
+        if run is None:
+            raise ValueError(f"Regrade run {run_id} not found")
+        assignment = db.query(Assignment).filter(Assignment.id == run.assignment_id).first()
+        if assignment is None:
+            raise ValueError(f"Assignment {run.assignment_id} not found")
+
+        remaining = _target_query(db, run).filter(Submission.id > run.last_submission_id).count()
+        run.total = run.processed + remaining
+        run.status = "running"
+        run.error = None
+        run.updated_at = datetime.utcnow()
+        template = build_grading_request(assignment, "")
+        organization_id = assignment.organization_id
+        db.commit()
+        return template, organization_id
+    finally:
+        db.close()
+
+
+def _load_batch(run_id: int) -> List[tuple]:
+    """(id, user_id, code_content) of the next submissions after the checkpoint."""
+    db = SessionLocal()
+    try:
+        run = db.query(RegradeRun).filter(RegradeRun.id == run_id).first()
+        return [
+            (sub.id, sub.user_id, sub.code_content)
+            for sub in _target_query(db, run)
+            .filter(Submission.id > run.last_submission_id)
+            .order_by(Submission.id.asc())
+            .limit(REGRADE_BATCH_SIZE)
+        ]
+    finally:
+        db.close()
+
+
+def _save_batch(run_id: int, batch: List[tuple], results: list) -> dict:
+    """Writes the new grades, the students' standings and the checkpoint in one transaction."""
+    db = SessionLocal()
+    try:
+        run = db.query(RegradeRun).filter(RegradeRun.id == run_id).first()
+        graded = {sub_id: result for (sub_id, _, _), result in zip(batch, results) if result is not None}
+        submissions = db.query(Submission).filter(Submission.id.in_(graded)).all() if graded else []
+        for sub in submissions:
+            set_grading_result(sub, graded[sub.id].model_dump())
+        # New grades move the leaderboard: committed together with them
+        for user_id in sorted({sub.user_id for sub in submissions}):
+            refresh_standings(db, user_id, [run.assignment_id])
+
+        failed_ids = list(run.failed_submission_ids or []) + [
+            sub_id for (sub_id, _, _), result in zip(batch, results) if result is None
+        ]
+        run.processed += len(batch)
+        run.failed = len(failed_ids)
+        run.failed_submission_ids = failed_ids
+        run.last_submission_id = batch[-1][0]
+        run.updated_at = datetime.utcnow()
+        db.commit()
+        return run_progress(run)
+    finally:
+        db.close()
+
+
+def _finish_run(run_id: int, error: Optional[str] = None) -> dict:
+    db = SessionLocal()
+    try:
+        run = db.query(RegradeRun).filter(RegradeRun.id == run_id).first()
+        if run is None:
+            return {}
+        run.updated_at = datetime.utcnow()
+        if error is None:
+            run.status = "completed"
+            run.finished_at = run.updated_at
+        else:
+            run.status = "failed"
+            run.error = error
+        db.commit()
+        return run_progress(run)
+    finally:
+        db.close()
+
+
+async def run_regrade(run_id: int, on_progress=None) -> dict:
+    """
+    Regrades the submissions of a run, resuming after its checkpoint
+    (`last_submission_id`) so an interrupted run continues where it stopped.
+    """
+    with _active_lock:
+        if run_id in _active_runs:
+            raise RegradeAlreadyRunning()
+        _active_runs.add(run_id)
+
+    try:
+        template, organization_id = await asyncio.to_thread(_start_run, run_id)
+        semaphore = asyncio.Semaphore(REGRADE_CONCURRENCY)
+
+        while True:
+            batch = await asyncio.to_thread(_load_batch, run_id)
+            if not batch:
+                break
+
+            results = await asyncio.gather(*[
+                _regrade_one(template, organization_id, sub_id, code_content, semaphore)
+                for sub_id, _, code_content in batch
+            ])
+            progress = await asyncio.to_thread(_save_batch, run_id, batch, results)
+            leaderboard_cache.invalidate(organization_id)
+
+            if on_progress:
+                on_progress(progress)
+
+        return await asyncio.to_thread(_finish_run, run_id)
+
+    except Exception as e:
+        print(f"Regrade run {run_id} failed: {e}")
+        await asyncio.to_thread(_finish_run, run_id, str(e))
+        raise
+    finally:
+        with _active_lock:
+            _active_runs.discard(run_id)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Awaitable, Callable, Optional
+from google.api_core import exceptions as google_exceptions
+from pydantic import ValidationError
+
+# Total attempts per grading (1 = no retries)
+RETRY_ATTEMPTS = int(os.getenv("GRADING_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("GRADING_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("GRADING_RETRY_MAX_SECONDS", "10"))
+# Consecutive provider failures that open the breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GRADING_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("GRADING_BREAKER_RESET_SECONDS", "30"))
+
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+INVALID_JSON = "invalid_json"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+UNKNOWN = "unknown"
+
+RETRYABLE = {RATE_LIMIT, TIMEOUT, SERVER_ERROR, INVALID_JSON}
+# Errors that say the provider is unhealthy; a malformed answer or a bad request does not
+PROVIDER_FAILURES = {RATE_LIMIT, TIMEOUT, SERVER_ERROR}
+
+_retry_counters = {"calls": 0, "attempts": 0, "retries": 0, "succeeded_after_retry": 0, "gave_up": 0}
+_error_counters = {kind: 0 for kind in (RATE_LIMIT, TIMEOUT, INVALID_JSON, SERVER_ERROR, CLIENT_ERROR, UNKNOWN)}
+_counters_lock = threading.Lock()
+
+
+class GradingUnavailable(Exception):
+    """The provider is unhealthy (breaker open or transient errors exhausted the retries)."""
+
+    def __init__(self, retry_after: float, message: str = "Değerlendirme servisi geçici olarak kullanılamıyor"):
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+
+
+def classify_error(error: BaseException) -> str:
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return RATE_LIMIT
+    if isinstance(error, (google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout,
+                          TimeoutError, asyncio.TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, (google_exceptions.ServerError, ConnectionError)):
+        return SERVER_ERROR
+    if isinstance(error, google_exceptions.ClientError):
+        return CLIENT_ERROR
+    # json.JSONDecodeError is a ValueError, as is response.text on an empty/blocked answer
+    if isinstance(error, (ValidationError, json.JSONDecodeError, ValueError)):
+        return INVALID_JSON
+    return UNKNOWN
+
+
+def backoff_delay(attempt: int, kind: str) -> float:
+    """Exponential backoff with full jitter; rate limits back off harder."""
+    base = RETRY_BASE_SECONDS * (4 if kind == RATE_LIMIT else 1)
+    return random.uniform(0, min(RETRY_MAX_SECONDS, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive provider failures; while
+    open calls fail fast. After `reset_seconds` one probe call is let through
+    (half_open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "short_circuited": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            # A probe that never reported back (e.g. cancelled) must not block forever
+            if self.state == "half_open" and (self._probe_started_at is None
+                                              or now - self._probe_started_at >= self.reset_seconds):
+                self._probe_started_at = now
+                return True
+            self.counters["short_circuited"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+                self.counters["opened"] += 1
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def is_open(self) -> bool:
+        return self.state == "open" and self.retry_after() > 0
+
+    def stats(self) -> dict:
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                **self.counters,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_after": round(retry_after, 1),
+            }
+
+
+grading_breaker = CircuitBreaker()
+
+
+def _count(counters: dict, name: str, amount: int = 1):
+    with _counters_lock:
+        counters[name] += amount
+
+
+def record_error(breaker: CircuitBreaker, error: BaseException) -> str:
+    """Counts a failed provider call and feeds it to the breaker; returns its class."""
+    kind = classify_error(error)
+    _count(_error_counters, kind)
+    if kind in PROVIDER_FAILURES:
+        breaker.record_failure()
+    else:
+        # The provider answered, just not usefully
+        breaker.record_success()
+    return kind
+
+
+async def call_with_retries(call: Callable[[], Awaitable], breaker: CircuitBreaker, attempts: Optional[int] = None,
+                            failures: Optional[list] = None):
+    """
+    Awaits `call()` behind the breaker, retrying retryable errors with backoff.
+    Raises GradingUnavailable when the provider is unhealthy; other errors
+    (bad request, unusable answers after the last attempt) are re-raised.
+    The class of every failed attempt is appended to `failures`, if given.
+    """
+    attempts = attempts or RETRY_ATTEMPTS
+    _count(_retry_counters, "calls")
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise GradingUnavailable(breaker.retry_after())
+        attempt += 1
+        _count(_retry_counters, "attempts")
+        try:
+            result = await call()
+        except Exception as e:
+            kind = record_error(breaker, e)
+            if failures is not None:
+                failures.append(kind)
+            if kind not in RETRYABLE or attempt >= attempts:
+                _count(_retry_counters, "gave_up")
+                if kind in PROVIDER_FAILURES:
+                    raise GradingUnavailable(max(breaker.retry_after(), backoff_delay(attempt, kind))) from e
+                raise
+            delay = backoff_delay(attempt, kind)
+            _count(_retry_counters, "retries")
+            print(f"Grading attempt {attempt} failed ({kind}: {e}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            if attempt > 1:
+                _count(_retry_counters, "succeeded_after_retry")
+            return result
+
+
+def get_resilience_stats() -> dict:
+    with _counters_lock:
+        retries = dict(_retry_counters)
+        errors = dict(_error_counters)
+    return {
+        "breaker": grading_breaker.stats(),
+        "retries": {**retries, "max_attempts": RETRY_ATTEMPTS},
+        "errors": errors,
+    }
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Optional
 from ..database import get_db
-from ..services import process_excel_upload
-from ..schemas import TenantCreate
-from ..models import User, Organization
+from .. import services
+from ..services import process_excel_upload, get_concurrency_stats, PROMPT_VERSION
+from ..schemas import TenantCreate, StudentOut, Page
+from ..pagination import LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE, after, decode_cursor, page_of
+from ..models import User, Organization, Assignment, RegradeRun, GradingUsageRollup, StudentAssignmentStanding, StudentStanding
 from ..auth import get_password_hash
+from ..grading_cache import grading_cache
+from ..leaderboard_cache import leaderboard_cache
+from ..grading_jobs import job_manager
+from ..precheck import get_precheck_stats
+from ..sandbox import sandbox_pool
+from ..token_budget import get_token_stats
+from ..resilience import get_resilience_stats
+from ..telemetry import grading_telemetry
+from ..scheduler import grading_scheduler
+from ..grading_limits import grading_limiter
+from sqlalchemy import func
+from ..regrade import create_regrade_run, run_regrade, run_progress, is_run_active
 from .users import get_current_user
 
 router = APIRouter(
@@ -17,7 +33,7 @@ router = APIRouter(
 @router.post("/upload-students")
 async def upload_students(
     file: UploadFile = File(...), 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["teacher", "superadmin"]:
@@ -37,45 +53,59 @@ async def upload_students(
     try:
         content = await file.read()
         # Pass current_user to associate students with this org
-        results = process_excel_upload(content, db, admin_user=current_user)
+        results = await db.run_sync(lambda session: process_excel_upload(content, session, admin_user=current_user))
+        leaderboard_cache.invalidate(current_user.organization_id)
         return {"message": "İşlem tamamlandı", "details": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/students")
+@router.get("/students", response_model=Page[StudentOut])
 async def get_students(
-    db: Session = Depends(get_db),
+    class_code: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["teacher", "superadmin"]:
         raise HTTPException(status_code=403, detail="Yetkisiz işlem")
-        
-    students = db.query(User).filter(User.role == "student", User.organization_id == current_user.organization_id).all()
-    return students
+
+    # Public profile columns only (never password hashes), in student number order
+    query = select(
+        User.id, User.student_number, User.full_name, User.email, User.class_code, User.avatar_url
+    ).filter(User.role == "student", User.organization_id == current_user.organization_id)
+    if class_code:
+        query = query.filter(User.class_code == class_code)
+    if cursor:
+        (last_number,) = decode_cursor(cursor, str)
+        query = query.filter(after(User.student_number, last_number))
+    rows = (await db.execute(query.order_by(User.student_number).limit(limit + 1))).all()
+    rows, next_cursor = page_of(rows, limit, lambda row: (row.student_number,))
+    return Page(items=[StudentOut.model_validate(row) for row in rows], next_cursor=next_cursor)
 
 @router.post("/reset-password/{student_number}")
 async def reset_student_password(
     student_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["teacher", "superadmin"]:
         raise HTTPException(status_code=403, detail="Yetkisiz işlem")
     
-    student = db.query(User).filter(User.student_number == student_number, User.role == "student", User.organization_id == current_user.organization_id).first()
+    student = (await db.execute(select(User).filter(User.student_number == student_number, User.role == "student", User.organization_id == current_user.organization_id))).scalars().first()
     if not student:
         raise HTTPException(status_code=404, detail="Öğrenci bulunamadı.")
     
     # Reset password to student_number
     student.password_hash = get_password_hash(student_number)
-    db.commit()
+    await db.commit()
     
     return {"message": f"{student_number} numaralı öğrencinin şifresi başarıyla sıfırlandı."}
 
 @router.post("/create-tenant")
 async def create_new_tenant_api(
     tenant_data: TenantCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -85,30 +115,30 @@ async def create_new_tenant_api(
     if current_user.role != "superadmin":
          raise HTTPException(status_code=403, detail="Sadece Sistem Yöneticisi yeni öğretmen hesabı açabilir.")
     # 1. Create Organization
-    existing_org = db.query(Organization).filter(Organization.name == tenant_data.org_name).first()
+    existing_org = (await db.execute(select(Organization).filter(Organization.name == tenant_data.org_name))).scalars().first()
     if existing_org:
         raise HTTPException(status_code=400, detail=f"'{tenant_data.org_name}' adında bir kurum zaten var.")
 
     new_org = Organization(name=tenant_data.org_name)
     db.add(new_org)
-    db.commit()
-    db.refresh(new_org)
+    await db.commit()
+    await db.refresh(new_org)
 
     # 2. Create Teacher
     # Check username
-    existing_user = db.query(User).filter(User.student_number == tenant_data.teacher_username).first()
+    existing_user = (await db.execute(select(User).filter(User.student_number == tenant_data.teacher_username))).scalars().first()
     if existing_user:
         # Cleanup
-        db.delete(new_org)
-        db.commit()
+        await db.delete(new_org)
+        await db.commit()
         raise HTTPException(status_code=400, detail=f"'{tenant_data.teacher_username}' kullanıcı adı zaten kullanılıyor.")
 
     # Check email
-    existing_email = db.query(User).filter(User.email == tenant_data.teacher_email).first()
+    existing_email = (await db.execute(select(User).filter(User.email == tenant_data.teacher_email))).scalars().first()
     if existing_email:
         # Cleanup
-        db.delete(new_org)
-        db.commit()
+        await db.delete(new_org)
+        await db.commit()
         raise HTTPException(status_code=400, detail=f"'{tenant_data.teacher_email}' e-posta adresi zaten kullanımda.")
 
     hashed_pwd = get_password_hash(tenant_data.teacher_password)
@@ -123,7 +153,7 @@ async def create_new_tenant_api(
         organization_id=new_org.id
     )
     db.add(new_teacher)
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Yeni Öğretmen (SaaS Müşterisi) başarıyla oluşturuldu.",
@@ -136,7 +166,7 @@ async def create_new_tenant_api(
 async def update_tenant_status(
     org_id: int, 
     is_active: bool,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -145,19 +175,45 @@ async def update_tenant_status(
     if current_user.role != "superadmin":
          raise HTTPException(status_code=403, detail="Yetkiniz yok.")
          
-    org = db.query(Organization).filter(Organization.id == org_id).first()
+    org = await db.get(Organization, org_id)
     if not org:
         raise HTTPException(status_code=404, detail="Organizasyon bulunamadı")
         
     org.is_active = is_active
-    db.commit()
+    await db.commit()
     
     status_str = "Aktif" if is_active else "Pasif"
     return {"message": f"Organizasyon '{org.name}' başarıyla {status_str} durumuna getirildi."}
 
+@router.put("/tenant/{org_id}/quota")
+async def update_tenant_quota(
+    org_id: int,
+    daily_token_quota: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Sets the tenant's daily model-token quota (empty = GRADING_DAILY_TOKEN_QUOTA, 0 = unlimited).
+    """
+    if current_user.role != "superadmin":
+         raise HTTPException(status_code=403, detail="Yetkiniz yok.")
+    if daily_token_quota is not None and daily_token_quota < 0:
+        raise HTTPException(status_code=400, detail="Kota negatif olamaz.")
+
+    org = await db.get(Organization, org_id)
+    if not org:
+        raise HTTPException(status_code=404, detail="Organizasyon bulunamadı")
+
+    org.daily_token_quota = daily_token_quota
+    await db.commit()
+    grading_limiter.forget(org_id)
+
+    quota, used = await asyncio.to_thread(grading_limiter.quota_usage, org_id)
+    return {"message": f"Organizasyon '{org.name}' kotası güncellendi.", "daily_token_quota": quota, "used_today": used}
+
 @router.get("/stats")
 async def get_system_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -166,15 +222,15 @@ async def get_system_stats(
     if current_user.role != "superadmin":
          raise HTTPException(status_code=403, detail="Yetkiniz yok.")
     
-    total_tenants = db.query(Organization).count()
-    active_tenants = db.query(Organization).filter(Organization.is_active == True).count()
-    total_students = db.query(User).filter(User.role == "student").count()
+    total_tenants = await db.scalar(select(func.count(Organization.id)))
+    active_tenants = await db.scalar(select(func.count(Organization.id)).filter(Organization.is_active == True))
+    total_students = await db.scalar(select(func.count(User.id)).filter(User.role == "student"))
     
     # Calculate last 24h stats
     yesterday = datetime.utcnow() - timedelta(days=1)
-    new_tenants_24h = db.query(Organization).filter(Organization.created_at >= yesterday).count()
+    new_tenants_24h = await db.scalar(select(func.count(Organization.id)).filter(Organization.created_at >= yesterday))
 
-    total_teachers = db.query(User).filter(User.role == "teacher").count()
+    total_teachers = await db.scalar(select(func.count(User.id)).filter(User.role == "teacher"))
 
     return {
         "total_tenants": total_tenants,
@@ -185,9 +241,155 @@ async def get_system_stats(
         "system_health": "Operational"
     }
 
+@router.get("/grading/stats")
+async def get_grading_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Returns runtime counters of the grading pipeline (cache hit/miss etc.).
+    """
+    if current_user.role != "superadmin":
+         raise HTTPException(status_code=403, detail="Yetkiniz yok.")
+
+    return {
+        "model": services.provider.model_name,
+        "provider": services.provider.stats(),
+        "prompt_version": PROMPT_VERSION,
+        "cache": grading_cache.stats(),
+        "leaderboard_cache": leaderboard_cache.stats(),
+        "precheck": get_precheck_stats(),
+        "sandbox": sandbox_pool.stats(),
+        "tokens": get_token_stats(),
+        "resilience": get_resilience_stats(),
+        "concurrency": get_concurrency_stats(),
+        "scheduler": grading_scheduler.stats(),
+        "limits": grading_limiter.stats(),
+        "jobs": job_manager.stats()
+    }
+
+@router.get("/grading/usage")
+async def get_grading_usage(
+    days: int = 30,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Model usage and estimated cost per organization over the last `days` days,
+    from the hourly rollups written by the grading telemetry.
+    """
+    if current_user.role != "superadmin":
+         raise HTTPException(status_code=403, detail="Yetkiniz yok.")
+
+    # Include the numbers not yet written by the background flush (sync database write)
+    await asyncio.to_thread(grading_telemetry.flush)
+
+    since = datetime.utcnow() - timedelta(days=max(1, min(days, 366)))
+    rows = (await db.execute(select(
+        GradingUsageRollup.organization_id,
+        Organization.name,
+        func.sum(GradingUsageRollup.requests),
+        func.sum(GradingUsageRollup.model_calls),
+        func.sum(GradingUsageRollup.cache_hits),
+        func.sum(GradingUsageRollup.errors),
+        func.sum(GradingUsageRollup.retries),
+        func.sum(GradingUsageRollup.prompt_tokens),
+        func.sum(GradingUsageRollup.output_tokens),
+        func.sum(GradingUsageRollup.cost_usd),
+        func.sum(GradingUsageRollup.latency_ms_sum),
+        func.max(GradingUsageRollup.latency_ms_max),
+    ).outerjoin(Organization, Organization.id == GradingUsageRollup.organization_id)\
+     .filter(GradingUsageRollup.bucket_start >= since)\
+     .group_by(GradingUsageRollup.organization_id, Organization.name)
+    )).all()
+
+    usage = []
+    for (org_id, org_name, requests, model_calls, cache_hits, errors, retries,
+         prompt_tokens, output_tokens, cost_usd, latency_sum, latency_max) in rows:
+        usage.append({
+            "organization_id": org_id,
+            "organization_name": org_name,
+            "requests": requests or 0,
+            "model_calls": model_calls or 0,
+            "cache_hits": cache_hits or 0,
+            "errors": errors or 0,
+            "retries": retries or 0,
+            "prompt_tokens": prompt_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "cost_usd": round(cost_usd or 0.0, 4),
+            "avg_latency_ms": round((latency_sum or 0.0) / requests, 1) if requests else 0,
+            "max_latency_ms": round(latency_max or 0.0, 1),
+        })
+    usage.sort(key=lambda item: item["cost_usd"], reverse=True)
+    return {"days": days, "organizations": usage, "total_cost_usd": round(sum(item["cost_usd"] for item in usage), 4)}
+
+@router.post("/assignments/{assignment_id}/regrade", status_code=202)
+async def start_regrade(
+    assignment_id: int,
+    mode: str = "all",
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Regrades every submission (mode=all) or the latest submission per student
+    (mode=latest) of an assignment in the background. Progress: GET /admin/regrade/{run_id}
+    """
+    if current_user.role not in ["teacher", "superadmin"]:
+        raise HTTPException(status_code=403, detail="Yetkisiz işlem")
+    if mode not in ("all", "latest"):
+        raise HTTPException(status_code=400, detail="mode 'all' veya 'latest' olmalıdır.")
+
+    assignment_query = select(Assignment).filter(Assignment.id == assignment_id)
+    if current_user.role != "superadmin":
+        assignment_query = assignment_query.filter(Assignment.organization_id == current_user.organization_id)
+    assignment = (await db.execute(assignment_query)).scalars().first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Ödev bulunamadı")
+
+    run = await db.run_sync(lambda session: create_regrade_run(session, assignment, mode=mode, created_by=current_user.id))
+    job_manager.spawn(run_regrade(run.id))
+    return run_progress(run)
+
+async def _get_regrade_run(run_id: int, db: AsyncSession, current_user: User) -> RegradeRun:
+    if current_user.role not in ["teacher", "superadmin"]:
+        raise HTTPException(status_code=403, detail="Yetkisiz işlem")
+
+    run_query = select(RegradeRun).filter(RegradeRun.id == run_id)
+    if current_user.role != "superadmin":
+        run_query = run_query.filter(RegradeRun.organization_id == current_user.organization_id)
+    run = (await db.execute(run_query)).scalars().first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Yeniden değerlendirme bulunamadı")
+    return run
+
+@router.get("/regrade/{run_id}")
+async def get_regrade_progress(
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return run_progress(await _get_regrade_run(run_id, db, current_user))
+
+@router.post("/regrade/{run_id}/resume", status_code=202)
+async def resume_regrade(
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Continues an interrupted run from its last checkpoint.
+    """
+    run = await _get_regrade_run(run_id, db, current_user)
+    if run.status == "completed":
+        raise HTTPException(status_code=400, detail="Bu yeniden değerlendirme zaten tamamlandı.")
+    if is_run_active(run.id):
+        raise HTTPException(status_code=409, detail="Bu yeniden değerlendirme zaten çalışıyor.")
+
+    job_manager.spawn(run_regrade(run.id))
+    return run_progress(run)
+
 @router.get("/tenants")
 async def get_all_tenants(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -200,7 +402,7 @@ async def get_all_tenants(
     # Assuming one teacher per org for now as per 'teacher_username' in creation, 
     # but there could be multiple. We'll fetch the first teacher found for the org as the 'owner'.
     
-    orgs = db.query(Organization).all()
+    orgs = (await db.execute(select(Organization))).scalars().all()
     results = []
     
     for org in orgs:
@@ -209,8 +411,8 @@ async def get_all_tenants(
             continue
 
         # Find the 'owner' teacher (first teacher created usually, or check role='teacher' and org_id)
-        owner = db.query(User).filter(User.organization_id == org.id, User.role == "teacher").first()
-        student_count = db.query(User).filter(User.organization_id == org.id, User.role == "student").count()
+        owner = (await db.execute(select(User).filter(User.organization_id == org.id, User.role == "teacher"))).scalars().first()
+        student_count = await db.scalar(select(func.count(User.id)).filter(User.organization_id == org.id, User.role == "student"))
         
         # If no owner found (rare, maybe SA created org but deleted user), handle gracefully
         owner_name = owner.full_name if owner else "---"
@@ -220,6 +422,7 @@ async def get_all_tenants(
             "id": org.id,
             "name": org.name,
             "is_active": org.is_active,
+            "daily_token_quota": org.daily_token_quota,
             "created_at": org.created_at,
             "owner_name": owner_name,
             "owner_email": owner_email,
@@ -231,7 +434,7 @@ async def get_all_tenants(
 @router.delete("/tenant/{org_id}")
 async def delete_tenant(
     org_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -240,7 +443,7 @@ async def delete_tenant(
     if current_user.role != "superadmin":
          raise HTTPException(status_code=403, detail="Yetkiniz yok.")
     
-    org = db.query(Organization).filter(Organization.id == org_id).first()
+    org = await db.get(Organization, org_id)
     if not org:
         raise HTTPException(status_code=404, detail="Organizasyon bulunamadı")
     
@@ -248,8 +451,11 @@ async def delete_tenant(
     # or rely on ON DELETE CASCADE.
     # For this simplified app, we might need to manually delete users to ensure clean slate if cascade isn't set in DB
     
-    db.query(User).filter(User.organization_id == org_id).delete()
-    db.delete(org)
-    db.commit()
+    await db.execute(delete(StudentAssignmentStanding).where(StudentAssignmentStanding.organization_id == org_id))
+    await db.execute(delete(StudentStanding).where(StudentStanding.organization_id == org_id))
+    await db.execute(delete(User).where(User.organization_id == org_id))
+    await db.delete(org)
+    await db.commit()
+    leaderboard_cache.invalidate(org_id)
     
     return {"message": f"Tenant '{org.name}' ve bağlı tüm kullanıcılar silindi."}
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from ..database import get_db
 from ..models import Announcement, User
-from ..schemas import AnnouncementCreate, AnnouncementOut
+from ..schemas import AnnouncementCreate, AnnouncementOut, Page
+from ..pagination import LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE, after, decode_cursor, page_of
 from .users import get_current_user
 
 router = APIRouter(prefix="/announcements", tags=["Announcements"])
@@ -11,7 +13,7 @@ router = APIRouter(prefix="/announcements", tags=["Announcements"])
 @router.post("/", response_model=AnnouncementOut)
 async def create_announcement(
     announcement: AnnouncementCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["teacher", "superadmin"]:
@@ -22,45 +24,48 @@ async def create_announcement(
     
     db_announcement = Announcement(**announcement.dict(), organization_id=org_id)
     db.add(db_announcement)
-    db.commit()
-    db.refresh(db_announcement)
+    await db.commit()
+    await db.refresh(db_announcement)
     return db_announcement
 
-@router.get("/", response_model=List[AnnouncementOut])
+@router.get("/", response_model=Page[AnnouncementOut])
 async def get_announcements(
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    print(f"DEBUG: Current user role: {current_user.role}")
-    
-    if current_user.role == "superadmin":
-        # Superadmin sees everything (or maybe just global + their own if they had one, but pure SA sees all?)
-        # Let's say SuperAdmin sees ALL for management, but for 'viewing' context usually they see what they created.
-        # Actually, let's keep it simple: SuperAdmin sees ALL.
-        # WAIT, user request: "Süper Admin panelinden 'Global Duyuru' yapabilme..."
-        # So SA should see Global ones and filtered ones? Let's show ALL to SA.
-        return db.query(Announcement).all()
-        
-    # Teacher/Student sees Global (None) AND their Org's announcements
-    return db.query(Announcement).filter(
-        (Announcement.organization_id == current_user.organization_id) | 
-        (Announcement.organization_id == None)
-    ).all()
+    query = select(Announcement)
+    if current_user.role != "superadmin":
+        # Superadmin sees ALL for management (incl. 'Global Duyuru');
+        # Teacher/Student sees Global (None) AND their Org's announcements
+        query = query.filter(
+            (Announcement.organization_id == current_user.organization_id) | 
+            (Announcement.organization_id == None)
+        )
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(after(Announcement.id, last_id, descending=True))
+
+    # Newest first
+    rows = (await db.execute(query.order_by(Announcement.id.desc()).limit(limit + 1))).scalars().all()
+    rows, next_cursor = page_of(rows, limit, lambda row: (row.id,))
+    return Page(items=[AnnouncementOut.model_validate(row) for row in rows], next_cursor=next_cursor)
 
 @router.delete("/{announcement_id}")
 async def delete_announcement(
     announcement_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["teacher", "superadmin"]:
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
-    db_announcement = db.query(Announcement).filter(Announcement.id == announcement_id).first()
+    db_announcement = await db.get(Announcement, announcement_id)
     if not db_announcement:
         raise HTTPException(status_code=404, detail="Duyuru bulunamadı")
     
-    db.delete(db_announcement)
-    db.commit()
+    await db.delete(db_announcement)
+    await db.commit()
     return {"message": "Duyuru silindi"}
 
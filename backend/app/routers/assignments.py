@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from ..database import get_db
-from ..models import Assignment, User
-from ..schemas import AssignmentCreate, AssignmentOut
+from ..models import Assignment, User, Submission
+from ..schemas import AssignmentCreate, AssignmentOut, AssignmentSummary, HiddenTestCase, Page
+from ..pagination import LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE, after, decode_cursor, page_of
+from ..standings import refresh_standings
+from ..leaderboard_cache import leaderboard_cache
 from .users import get_current_user
 
 router = APIRouter(prefix="/assignments", tags=["Assignments"])
 
+# Characters of the description shown in the list; GET /assignments/{id} returns all of it
+DESCRIPTION_PREVIEW_CHARS = int(os.getenv("ASSIGNMENT_PREVIEW_CHARS", "200"))
+
 @router.post("/", response_model=AssignmentOut)
 async def create_assignment(
     assignment: AssignmentCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "teacher":
@@ -20,76 +28,130 @@ async def create_assignment(
     db_assignment = Assignment(**assignment.dict())
     db_assignment.organization_id = current_user.organization_id
     db.add(db_assignment)
-    db.commit()
-    db.refresh(db_assignment)
+    await db.commit()
+    await db.refresh(db_assignment)
     return db_assignment
 
-@router.get("/", response_model=List[AssignmentOut])
+@router.get("/", response_model=Page[AssignmentSummary])
 async def get_assignments(
-    db: Session = Depends(get_db),
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Teachers see all, students might have filtering logic here or on frontend
-    # Filter by Organization
-    assignments = db.query(Assignment).filter(Assignment.organization_id == current_user.organization_id).all()
-    
+    # Filter by Organization; newest first, description cut to a preview
+    query = select(
+        Assignment.id,
+        Assignment.title,
+        func.substr(Assignment.description, 1, DESCRIPTION_PREVIEW_CHARS).label("description_preview"),
+        Assignment.due_date,
+        Assignment.language,
+        Assignment.student_level,
+        Assignment.status,
+        Assignment.target_type,
+        Assignment.target_class,
+        Assignment.target_students,
+        Assignment.created_at,
+    ).filter(Assignment.organization_id == current_user.organization_id)
+    if status:
+        query = query.filter(Assignment.status == status)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(after(Assignment.id, last_id, descending=True))
+    rows = (await db.execute(query.order_by(Assignment.id.desc()).limit(limit + 1))).all()
+    rows, next_cursor = page_of(rows, limit, lambda row: (row.id,))
+
+    teacher_name = await _teacher_name(db, current_user.organization_id)
+    items = [AssignmentSummary(**row._mapping, teacher_name=teacher_name) for row in rows]
+    return Page(items=items, next_cursor=next_cursor)
+
+@router.get("/{assignment_id}", response_model=AssignmentOut)
+async def get_assignment(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_assignment = (await db.execute(select(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id))).scalars().first()
+    if not db_assignment:
+        raise HTTPException(status_code=404, detail="Ödev bulunamadı")
+
+    response = AssignmentOut.model_validate(db_assignment)
+    response.teacher_name = await _teacher_name(db, current_user.organization_id)
+    return response
+
+async def _teacher_name(db: AsyncSession, organization_id: int) -> str:
     # Fetch Teacher Name for this Organization
-    teacher = db.query(User).filter(
-        User.organization_id == current_user.organization_id, 
+    teacher_name = await db.scalar(select(User.full_name).filter(
+        User.organization_id == organization_id,
         User.role == 'teacher'
-    ).first()
-    teacher_name = teacher.full_name if teacher else "Eğitmen"
-
-    # Convert to schema and inject teacher_name
-    results = []
-    for a in assignments:
-        # Pydantic's from_orm (v1) or model_validate (v2) or constructor
-        # Using from_attributes=True in Config allowing direct dict conversion or constructor
-        # easiest is to construct it or use validation.
-        # Let's use simple manual construction or Pydantic copy.
-        # Actually since response_model is List[AssignmentOut], FastAPI handles the conversion usually.
-        # But we need to inject a field that is NOT in the ORM model (teacher_name).
-        
-        # We can create a partial dict from ORM and add our field
-        a_data = AssignmentOut.from_orm(a)
-        a_data.teacher_name = teacher_name
-        results.append(a_data)
-        
-    return results
+    ).limit(1))
+    return teacher_name or "Eğitmen"
 
 @router.delete("/{assignment_id}")
 async def delete_assignment(
     assignment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
-    db_assignment = db.query(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id).first()
+    db_assignment = (await db.execute(select(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id))).scalars().first()
     if not db_assignment:
         raise HTTPException(status_code=404, detail="Ödev bulunamadı")
     
-    db.delete(db_assignment)
-    db.commit()
+    # Its submissions stay but lose the Early Bird bonus (no created_at to compare with)
+    student_ids = (await db.execute(
+        select(Submission.user_id).filter(Submission.assignment_id == assignment_id).distinct()
+    )).scalars().all()
+    await db.delete(db_assignment)
+
+    def refresh(session):
+        for user_id in student_ids:
+            refresh_standings(session, user_id, [assignment_id])
+
+    await db.run_sync(refresh)
+    await db.commit()
+    leaderboard_cache.invalidate(current_user.organization_id)
     return {"message": "Ödev silindi"}
 @router.put("/{assignment_id}", response_model=AssignmentOut)
 async def update_assignment(
     assignment_id: int,
     assignment: AssignmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
-    db_assignment = db.query(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id).first()
+    db_assignment = (await db.execute(select(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id))).scalars().first()
     if not db_assignment:
         raise HTTPException(status_code=404, detail="Ödev bulunamadı")
     
     for key, value in assignment.dict().items():
+        if key == "hidden_tests" and "hidden_tests" not in assignment.model_fields_set:
+            # Editing the assignment text must not wipe the tests
+            continue
         setattr(db_assignment, key, value)
     
-    db.commit()
-    db.refresh(db_assignment)
+    await db.commit()
+    await db.refresh(db_assignment)
     return db_assignment
+
+@router.get("/{assignment_id}/tests", response_model=List[HiddenTestCase])
+async def get_assignment_tests(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Hidden tests are only visible to teachers
+    if current_user.role != "teacher":
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+
+    db_assignment = (await db.execute(select(Assignment).filter(Assignment.id == assignment_id, Assignment.organization_id == current_user.organization_id))).scalars().first()
+    if not db_assignment:
+        raise HTTPException(status_code=404, detail="Ödev bulunamadı")
+
+    return db_assignment.hidden_tests or []
@@ -2,7 +2,8 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models import User, Organization
 from ..auth import verify_password
@@ -15,17 +16,17 @@ router = APIRouter(tags=["Authentication"])
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     organization_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     from sqlalchemy import or_
 
     # 1. Find all users with this student number OR email
-    users = db.query(User).filter(
+    users = (await db.execute(select(User).filter(
         or_(
             User.student_number == form_data.username,
             User.email == form_data.username
         )
-    ).all()
+    ))).scalars().all()
     
     # 2. Filter users by password verification locally to avoid timing attacks (though hash check is slow anyway)
     # We verify password for ALL matches.
@@ -62,13 +63,13 @@ async def login_for_access_token(
             # Case B2: Ambiguity exists and no selection made -> Return 409 with options
             organizations_list = []
             for user in valid_users:
-                org = db.query(Organization).filter(Organization.id == user.organization_id).first()
+                org = await db.get(Organization, user.organization_id) if user.organization_id else None
                 if org:
                     # Fetch Teacher Name for this org
-                    teacher = db.query(User).filter(
+                    teacher = (await db.execute(select(User).filter(
                         User.organization_id == org.id, 
                         User.role == 'teacher'
-                    ).first()
+                    ))).scalars().first()
                     teacher_name = teacher.full_name if teacher else "Eğitmen"
 
                     organizations_list.append({
@@ -104,7 +105,7 @@ async def login_for_access_token(
     # 5. Fetch org name for UI display
     org_name = ""
     if selected_user.organization_id:
-        org = db.query(Organization).filter(Organization.id == selected_user.organization_id).first()
+        org = await db.get(Organization, selected_user.organization_id)
         if org:
             org_name = org.name
 
@@ -126,7 +127,7 @@ async def login_for_access_token(
 async def switch_organization_token(
     organization_id: int,
     current_user: User = Depends(get_db), # Placeholder, actual dependency below
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(OAuth2PasswordBearer(tokenUrl="token"))
 ):
     from jose import jwt, JWTError
@@ -142,10 +143,10 @@ async def switch_organization_token(
         raise HTTPException(status_code=401, detail="Invalid token")
 
     # 2. Verify target user exists in target organization
-    target_user = db.query(User).filter(
+    target_user = (await db.execute(select(User).filter(
         User.student_number == student_number,
         User.organization_id == organization_id
-    ).first()
+    ))).scalars().first()
     
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found in target organization")
@@ -165,7 +166,7 @@ async def switch_organization_token(
     # 4. Get Org Name
     org_name = ""
     if target_user.organization_id:
-        org = db.query(Organization).filter(Organization.id == target_user.organization_id).first()
+        org = await db.get(Organization, target_user.organization_id)
         if org:
             org_name = org.name
 
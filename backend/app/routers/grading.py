@@ -0,0 +1,149 @@
+import json
+import math
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from ..schemas import SubmissionRequest
+from ..models import User
+from ..grading_jobs import job_manager, GradingJob, JobQueueFull, TERMINAL_STATUSES
+from ..grading_limits import grading_limiter, GradingLimitExceeded
+from ..services import stream_grading
+from ..resilience import grading_breaker
+from ..database import SessionLocal
+from .users import oauth2_scheme, user_from_token
+
+router = APIRouter(prefix="/api/grade", tags=["Grading"])
+
+# Comment frames keep idle SSE connections open through proxies
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def get_token_user(token: str = Depends(oauth2_scheme)) -> User:
+    """
+    Current user. A plain def, so FastAPI runs the lookup in its threadpool; the
+    session is closed right away, so no pooled connection is held for the
+    length of a model call or an event stream.
+    """
+    db = SessionLocal()
+    try:
+        return user_from_token(token, db)
+    finally:
+        db.close()
+
+
+def get_grading_user(token: str = Depends(oauth2_scheme)) -> User:
+    """
+    Current user, if the per-user/per-organization limits and the daily quota
+    allow a grading. Looks the user up itself rather than through get_token_user,
+    so a grading takes one threadpool hop, not two.
+    """
+    current_user = get_token_user(token)
+    try:
+        grading_limiter.check(current_user.id, current_user.organization_id)
+    except GradingLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    return current_user
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_grading_job(request: SubmissionRequest, current_user: User = Depends(get_grading_user)):
+    """
+    Queues a grading and returns immediately. Poll the status url or
+    subscribe to the events url (Server-Sent Events) for the result.
+    """
+    try:
+        job = job_manager.submit(request, organization_id=current_user.organization_id, user_id=current_user.id)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Değerlendirme kuyruğu dolu, lütfen biraz sonra tekrar deneyin.",
+            headers={"Retry-After": "30"},
+        )
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/grade/jobs/{job.id}",
+        "events_url": f"/api/grade/jobs/{job.id}/events",
+    }
+
+
+def get_own_job(job_id: str, current_user: User = Depends(get_token_user)) -> GradingJob:
+    """The job, if the current user created it; someone else's job is reported as missing."""
+    job = job_manager.get(job_id)
+    if not job or job.user_id != current_user.id or job.organization_id != current_user.organization_id:
+        raise HTTPException(status_code=404, detail="Değerlendirme işi bulunamadı")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_grading_job(job: GradingJob = Depends(get_own_job)):
+    return job.snapshot()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_grading_job(job: GradingJob = Depends(get_own_job)):
+
+    async def events():
+        queue = job_manager.subscribe(job)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event["status"], event)
+                if event["status"] in TERMINAL_STATUSES:
+                    break
+        finally:
+            job_manager.unsubscribe(job, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/stream")
+async def stream_grade(request: SubmissionRequest, current_user: User = Depends(get_grading_user)):
+    """
+    Grades the code and streams the result as Server-Sent Events: one `field`
+    event per completed GradingResult field (grade, feedback, ...) followed by
+    a `done` event carrying the full validated result. While the provider is
+    unhealthy the stream ends with an `error` event carrying `retry_after`.
+    """
+    if grading_breaker.is_open():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Değerlendirme servisi şu anda yoğun, lütfen biraz sonra tekrar deneyin.",
+            headers={"Retry-After": str(math.ceil(grading_breaker.retry_after()))},
+        )
+
+    async def events():
+        async for kind, payload in stream_grading(request, organization_id=current_user.organization_id):
+            if kind == "field":
+                name, value = payload
+                yield sse_event("field", {"name": name, "value": value})
+            elif kind == "unavailable":
+                yield sse_event("error", {
+                    "detail": "Değerlendirme servisi şu anda yoğun, lütfen biraz sonra tekrar deneyin.",
+                    "retry_after": math.ceil(payload),
+                })
+            else:
+                yield sse_event("done", payload.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
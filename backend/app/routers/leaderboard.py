@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
-from ..models import User, Submission, Assignment, UserBadge
+from ..models import User, UserBadge, StudentStanding
+from ..standings import has_streak
+from ..leaderboard_cache import leaderboard_cache, etag_matches
 from .users import get_current_user
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from ..schemas import Badge
 from ..badges import BADGE_DEFINITIONS
 
@@ -27,128 +29,127 @@ class LeaderboardEntry(BaseModel):
 
     badges: List[Badge]
 
+def _entry(row, rank: int, badges, today) -> LeaderboardEntry:
+    return LeaderboardEntry(
+        rank=rank,
+        username=row.student_number,
+        full_name=row.full_name,
+        avatar_url=row.avatar_url,
+        total_xp=row.total_xp,
+        average_score=round(row.score_sum / row.assignments) if row.assignments else 0,
+        completed_tasks=row.completed_tasks or 0,
+        streak=has_streak(row.last_submission_date, row.streak_days, today),
+        badges=badges,
+    )
+
+
+def _badges(earned_badges) -> dict:
+    user_badges_map = {}
+    for user_id, badge_name in earned_badges:
+        if badge_name in BADGE_DEFINITIONS:
+            def_ = BADGE_DEFINITIONS[badge_name]
+            user_badges_map.setdefault(user_id, []).append(Badge(
+                name=badge_name,
+                icon=def_["icon"],
+                description=def_["description"]
+            ))
+    return user_badges_map
+
+
+def _student_filter(current_user: User, class_code: Optional[str]) -> list:
+    # Students of the current org (and class)
+    student_filter = [User.role == "student", User.organization_id == current_user.organization_id]
+    if class_code:
+        student_filter.append(User.class_code == class_code)
+    return student_filter
+
+
+# Totals come from the materialized standings (app/standings.py); students without submissions have none
+_total_xp = func.coalesce(StudentStanding.total_xp, 0)
+_standing_columns = (
+    User.id,
+    User.student_number,
+    User.full_name,
+    User.avatar_url,
+    _total_xp.label("total_xp"),
+    StudentStanding.score_sum,
+    StudentStanding.assignments,
+    StudentStanding.completed_tasks,
+    StudentStanding.last_submission_date,
+    StudentStanding.streak_days,
+)
+
+
+async def _leaderboard_entries(db: AsyncSession, current_user: User, class_code: Optional[str]) -> List[LeaderboardEntry]:
+    student_filter = _student_filter(current_user, class_code)
+    badge_scope = [UserBadge.organization_id == current_user.organization_id]
+    if class_code:
+        badge_scope.append(UserBadge.user_id.in_(select(User.id).filter(*student_filter)))
+
+    # One row per student, ranked by Total XP (ties: earlier account first)
+    rows = (await db.execute(
+        select(
+            *_standing_columns,
+            func.row_number().over(order_by=(_total_xp.desc(), User.id)).label("rank"),
+        ).outerjoin(StudentStanding, StudentStanding.user_id == User.id).filter(*student_filter).order_by("rank")
+    )).all()
+
+    earned_badges = (await db.execute(select(UserBadge.user_id, UserBadge.badge_name).filter(*badge_scope))).all()
+    user_badges_map = _badges(earned_badges)
+    today = datetime.utcnow().date()
+    return [_entry(row, row.rank, user_badges_map.get(row.id, []), today) for row in rows]
+
+
+_entries_json = TypeAdapter(List[LeaderboardEntry])
+
+
 @router.get("/", response_model=List[LeaderboardEntry])
 async def get_leaderboard(
     class_code: Optional[str] = None, 
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Base query for students in current org
-    users_query = db.query(User).filter(User.role == "student", User.organization_id == current_user.organization_id)
-    if class_code:
-        users_query = users_query.filter(User.class_code == class_code)
-    
-    students = users_query.all()
-    student_ids = [s.id for s in students]
-    
-    # Fetch all relevant submissions
-    submissions = db.query(Submission).filter(Submission.user_id.in_(student_ids)).all()
-    
-    # Fetch all badges
-    earned_badges = db.query(UserBadge).filter(UserBadge.user_id.in_(student_ids)).all()
-    user_badges_map = {}
-    for b in earned_badges:
-        if b.user_id not in user_badges_map:
-            user_badges_map[b.user_id] = []
-        
-        if b.badge_name in BADGE_DEFINITIONS:
-            def_ = BADGE_DEFINITIONS[b.badge_name]
-            user_badges_map[b.user_id].append(Badge(
-                name=b.badge_name,
-                icon=def_["icon"],
-                description=def_["description"]
-            ))
-    
-    # Process data
-    leaderboard_data = []
-    
-    for student in students:
-        student_subs = [s for s in submissions if s.user_id == student.id]
-        
-        # Maps to store best attempt for each assignment
-        # key: assignment_id, value: {score: int, xp: int, submitted_at: datetime}
-        best_attempts = {}
-        
-        has_streak = False
-        
-        for sub in student_subs:
-            try:
-                result_json = json.loads(sub.grading_result)
-                score = int(result_json.get("grade", 0))
-            except:
-                score = 0
-                
-            # Bonus Calculations
-            bonus_xp = 0
-            
-            # Clean Code Bonus
-            if score > 95:
-                bonus_xp += 5
-            
-            # Early Bird Bonus
-            assignment = sub.assignment
-            if assignment and assignment.created_at:
-                if sub.submitted_at <= assignment.created_at + timedelta(hours=24):
-                    bonus_xp += 10
-            
-            total_attempt_xp = score + bonus_xp
-            
-            # Update best attempt logic (INSIDE LOOP)
-            aid = sub.assignment_id
-            if aid is not None:
-                if aid not in best_attempts:
-                    best_attempts[aid] = {"score": score, "xp": total_attempt_xp}
-                else:
-                    if score > best_attempts[aid]["score"]:
-                         best_attempts[aid] = {"score": score, "xp": total_attempt_xp}
-                    elif score == best_attempts[aid]["score"]:
-                         if total_attempt_xp > best_attempts[aid]["xp"]:
-                             best_attempts[aid]["xp"] = total_attempt_xp
-
-        # Calculate Streak (OUTSIDE LOOP)
-        submission_dates = sorted({s.submitted_at.date() for s in student_subs})
-        current_streak = 0
-        if submission_dates:
-            today = datetime.utcnow().date()
-            last_sub_date = submission_dates[-1]
-            if (today - last_sub_date).days <= 1:
-                current_streak = 1
-                for i in range(len(submission_dates) - 1, 0, -1):
-                    if (submission_dates[i] - submission_dates[i-1]).days == 1:
-                        current_streak += 1
-                    else:
-                        break
-        
-        has_streak = current_streak >= 3
-
-        # Aggregation
-        total_xp = sum(item["xp"] for item in best_attempts.values())
-        completed_tasks = sum(1 for item in best_attempts.values() if item["score"] >= 1)
-        
-        avg_score = 0
-        if best_attempts:
-            avg_score = sum(item["score"] for item in best_attempts.values()) / len(best_attempts)
-            
-        leaderboard_data.append({
-            "username": student.student_number,
-            "full_name": student.full_name,
-            "avatar_url": student.avatar_url,
-            "total_xp": total_xp,
-            "average_score": round(avg_score),
-            "completed_tasks": completed_tasks,
-            "streak": has_streak,
-            "badges": user_badges_map.get(student.id, [])
-        })
-    
-    # Sort by Total XP Descending
-    leaderboard_data.sort(key=lambda x: x["total_xp"], reverse=True)
-    
-    # Assign Ranks
-    result = []
-    for idx, entry in enumerate(leaderboard_data):
-        result.append(LeaderboardEntry(
-            rank=idx + 1,
-            **entry
-        ))
-        
-    return result
+    # The board is the same for everyone in the organization (and class): served from
+    # the cache until a write there invalidates it, and as 304 if the client has it
+    organization_id = current_user.organization_id
+    cached = leaderboard_cache.get(organization_id, class_code)
+    if cached:
+        etag, body = cached
+    else:
+        version = leaderboard_cache.version(organization_id)
+        body = _entries_json.dump_json(await _leaderboard_entries(db, current_user, class_code))
+        etag = leaderboard_cache.set(organization_id, class_code, body, version)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        leaderboard_cache.not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/me", response_model=LeaderboardEntry)
+async def get_my_rank(
+    class_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The current student's entry: rank = 1 + students ahead of them, counted without fetching the list."""
+    student_filter = _student_filter(current_user, class_code)
+    row = (await db.execute(
+        select(*_standing_columns).outerjoin(StudentStanding, StudentStanding.user_id == User.id)
+        .filter(*student_filter, User.id == current_user.id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Bu sıralamada yer almıyorsunuz")
+
+    ahead = (await db.execute(
+        select(func.count()).select_from(User).outerjoin(StudentStanding, StudentStanding.user_id == User.id).filter(
+            *student_filter,
+            or_(_total_xp > row.total_xp, and_(_total_xp == row.total_xp, User.id < row.id)),
+        )
+    )).scalar()
+    earned_badges = (await db.execute(
+        select(UserBadge.user_id, UserBadge.badge_name).filter(UserBadge.user_id == current_user.id)
+    )).all()
+    return _entry(row, ahead + 1, _badges(earned_badges).get(row.id, []), datetime.utcnow().date())
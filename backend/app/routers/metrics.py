@@ -0,0 +1,56 @@
+import os
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from ..database import SessionLocal
+from .users import oauth2_scheme, user_from_token
+from ..telemetry import grading_telemetry
+from ..grading_cache import grading_cache
+from ..leaderboard_cache import leaderboard_cache
+from ..grading_jobs import job_manager
+from ..resilience import grading_breaker
+from ..services import get_concurrency_stats
+
+router = APIRouter(tags=["Metrics"])
+
+# Scrapers send "Authorization: Bearer <token>"; without it only superadmins can read the metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+def require_metrics_reader(token: str = Depends(oauth2_scheme)):
+    """
+    The metrics carry per-organization usage and cost, so they are never
+    public: the scraper's METRICS_TOKEN or a superadmin login is required.
+    """
+    if METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    db = SessionLocal()
+    try:
+        user = user_from_token(token, db)
+    finally:
+        db.close()
+    if user.role != "superadmin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrikleri sadece süper yöneticiler görebilir")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_reader)])
+async def metrics():
+    """
+    Grading counters, token usage, cost and latency histograms in the
+    Prometheus text format.
+    """
+    concurrency = get_concurrency_stats()
+    jobs = job_manager.stats()
+    leaderboard = leaderboard_cache.stats()
+    gauges = {
+        "codegrade_grading_cache_hit_ratio": grading_cache.stats()["hit_ratio"],
+        "codegrade_leaderboard_cache_hit_ratio": leaderboard["hit_ratio"],
+        "codegrade_leaderboard_cache_not_modified": leaderboard["not_modified"],
+        "codegrade_leaderboard_cache_invalidations": leaderboard["invalidations"],
+        "codegrade_grading_breaker_open": int(grading_breaker.is_open()),
+        "codegrade_grading_in_flight": concurrency["in_flight"],
+        "codegrade_grading_waiting": concurrency["waiting"],
+        "codegrade_grading_jobs_queued": jobs["queued"],
+        "codegrade_telemetry_flush_errors": grading_telemetry.flush_errors,
+    }
+    return PlainTextResponse(grading_telemetry.render(gauges), media_type="text/plain; version=0.0.4")
@@ -1,23 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from datetime import datetime
 from ..database import get_db
 from ..models import Submission, User, Assignment
-from ..schemas import SubmissionCreate, SubmissionOut, Badge
+from ..schemas import SubmissionCreate, SubmissionOut, SubmissionSummary, Page, Badge
+from ..pagination import LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE, after, decode_cursor, page_of
 from .users import get_current_user
+from .grading import get_grading_user
 from ..badges import check_badges
+from ..scores import set_grading_result
+from ..standings import refresh_standings
+from ..leaderboard_cache import leaderboard_cache
+from ..services import grade_submission, build_grading_request, GradingFailed
+from ..resilience import GradingUnavailable
 
 router = APIRouter(prefix="/submissions", tags=["Submissions"])
 
 @router.post("/", response_model=SubmissionOut)
 async def create_submission(
     submission: SubmissionCreate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_grading_user)
 ):
     # Deadline Check
-    assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id, Assignment.organization_id == current_user.organization_id).first()
+    assignment = (await db.execute(select(Assignment).filter(Assignment.id == submission.assignment_id, Assignment.organization_id == current_user.organization_id))).scalars().first()
     if not assignment:
         raise HTTPException(status_code=404, detail="Ödev bulunamadı")
     
@@ -36,19 +45,38 @@ async def create_submission(
         except ValueError:
             pass # Invalid date format in DB, skipping check for safety
 
+    # The grade is computed here from the stored assignment, never taken from the client
+    request = build_grading_request(assignment, submission.code_content)
+    organization_id = current_user.organization_id
+    # End the read transaction so the connection is not held while the model works
+    await db.commit()
+    try:
+        result = await grade_submission(request, raise_on_error=True, organization_id=organization_id)
+    except GradingUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Değerlendirme servisi şu anda yoğun, lütfen biraz sonra tekrar deneyin.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except GradingFailed as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Değerlendirme başarısız: {e}")
+
     db_submission = Submission(
         user_id=current_user.id,
+        organization_id=current_user.organization_id,
         assignment_id=submission.assignment_id,
         code_content=submission.code_content,
-        grading_result=submission.grading_result
     )
+    set_grading_result(db_submission, result.model_dump())
     db.add(db_submission)
-    db.commit()
-    db.refresh(db_submission)
-    db.refresh(db_submission)
+    # The leaderboard standings change in the same transaction as the submission
+    await db.run_sync(lambda session: refresh_standings(session, current_user.id, [submission.assignment_id]))
+    await db.commit()
+    leaderboard_cache.invalidate(current_user.organization_id)
+    await db.refresh(db_submission)
     
-    # Check Badges
-    new_badges_data = check_badges(current_user.id, db, db_submission.id)
+    # Check Badges (sync rules; run_sync lets them lazy-load on this session's connection)
+    new_badges_data = await db.run_sync(lambda session: check_badges(current_user.id, session, db_submission.id, current_user.organization_id))
     
     # Convert to Pydantic model response
     response = SubmissionOut.model_validate(db_submission)
@@ -58,35 +86,92 @@ async def create_submission(
                       
     return response
 
-@router.get("/", response_model=List[SubmissionOut])
+@router.get("/", response_model=Page[SubmissionSummary])
 async def get_submissions(
-    db: Session = Depends(get_db),
+    assignment_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    class_code: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Submission).join(User).filter(User.organization_id == current_user.organization_id)
+    # Newest first, scores only (no code or grading JSON); the index range on
+    # (organization_id, submitted_at) drives the query, users only supply names
+    query = select(
+        Submission.id,
+        Submission.user_id,
+        User.full_name.label("student_name"),
+        Submission.assignment_id,
+        Submission.submitted_at,
+        Submission.grade,
+        Submission.code_quality,
+        Submission.tests_passed,
+        Submission.tests_total,
+    ).join(User, User.id == Submission.user_id).filter(Submission.organization_id == current_user.organization_id)
     if current_user.role != "teacher":
         query = query.filter(Submission.user_id == current_user.id)
-    
-    results = query.all()
-    # Manually attach full_name for now or use a join
-    for res in results:
-        res.student_name = res.owner.full_name
-    return results
+    elif student_id is not None:
+        query = query.filter(Submission.user_id == student_id)
+    if assignment_id is not None:
+        query = query.filter(Submission.assignment_id == assignment_id)
+    if class_code:
+        query = query.filter(User.class_code == class_code)
+    if submitted_from:
+        query = query.filter(Submission.submitted_at >= submitted_from)
+    if submitted_to:
+        query = query.filter(Submission.submitted_at < submitted_to)
+    if cursor:
+        submitted_at, last_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(after(Submission.submitted_at, submitted_at, Submission.id, last_id, descending=True))
+
+    rows = (await db.execute(
+        query.order_by(Submission.submitted_at.desc(), Submission.id.desc()).limit(limit + 1)
+    )).all()
+    rows, next_cursor = page_of(rows, limit, lambda row: (row.submitted_at, row.id))
+    return Page(items=[SubmissionSummary.model_validate(row) for row in rows], next_cursor=next_cursor)
+
+
+@router.get("/{submission_id}", response_model=SubmissionOut)
+async def get_submission(
+    submission_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    row = (await db.execute(
+        select(Submission, User.full_name)
+        .join(User, User.id == Submission.user_id)
+        .filter(Submission.id == submission_id, Submission.organization_id == current_user.organization_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Teslimat bulunamadı")
+
+    db_submission, student_name = row
+    if current_user.role != "teacher" and db_submission.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+
+    response = SubmissionOut.model_validate(db_submission)
+    response.student_name = student_name
+    return response
 
 
 @router.delete("/{submission_id}")
 async def delete_submission(
     submission_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_submission = db.query(Submission).join(User).filter(Submission.id == submission_id, User.organization_id == current_user.organization_id).first()
+    db_submission = (await db.execute(select(Submission).filter(Submission.id == submission_id, Submission.organization_id == current_user.organization_id))).scalars().first()
     if not db_submission:
         raise HTTPException(status_code=404, detail="Teslimat bulunamadı")
     
     if current_user.role != "teacher" and db_submission.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
-    db.delete(db_submission)
-    db.commit()
+    await db.delete(db_submission)
+    await db.run_sync(lambda session: refresh_standings(session, db_submission.user_id, [db_submission.assignment_id]))
+    await db.commit()
+    leaderboard_cache.invalidate(current_user.organization_id)
     return {"message": "Teslimat silindi"}
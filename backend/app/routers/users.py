@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
 from ..database import get_db
 from ..models import User
+from ..leaderboard_cache import leaderboard_cache
 from ..schemas import PasswordChange, UserUpdate
 from ..auth import verify_password, get_password_hash
 from ..jwt_auth import SECRET_KEY, ALGORITHM
@@ -12,36 +15,44 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    user = (await db.execute(_token_user_query(token))).scalars().first()
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+def user_from_token(token: str, db: Session) -> User:
+    """get_current_user for code running on the sync SessionLocal (threadpool dependencies)."""
+    user = db.execute(_token_user_query(token)).scalars().first()
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _token_user_query(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("user_id")
         student_number: str = payload.get("sub")
         
         if user_id is None and student_number is None:
-            raise credentials_exception
+            raise _credentials_exception()
             
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
         
     if user_id:
         # Preferred: Exact user lookup by Primary Key (handles multi-tenancy correctly)
-        user = db.query(User).filter(User.id == user_id).first()
-    elif student_number:
-        # Fallback: Lookup by student_number (Might be ambiguous in multi-tenant setup)
-        # Should ideally filter by org_id too if present in legacy token
-        user = db.query(User).filter(User.student_number == student_number).first()
-    else:
-        user = None
-
-    if user is None:
-        raise credentials_exception
-    return user
+        return select(User).filter(User.id == user_id)
+    # Fallback: Lookup by student_number (Might be ambiguous in multi-tenant setup)
+    # Should ideally filter by org_id too if present in legacy token
+    return select(User).filter(User.student_number == student_number)
 
 @router.get("/me")
 async def read_users_me(current_user: User = Depends(get_current_user)):
@@ -58,20 +69,20 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 async def change_password(
     data: PasswordChange, 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not verify_password(data.oldPassword, current_user.password_hash):
         raise HTTPException(status_code=400, detail="Mevcut şifre hatalı")
     
     current_user.password_hash = get_password_hash(data.newPassword)
-    db.commit()
+    await db.commit()
     return {"message": "Şifre başarıyla güncellendi"}
 
 @router.put("/update-profile")
 async def update_profile(
     data: UserUpdate, 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if data.avatarUrl is not None:
         current_user.avatar_url = data.avatarUrl
@@ -80,7 +91,8 @@ async def update_profile(
     if data.email is not None:
         current_user.email = data.email
     
-    db.commit()
+    await db.commit()
+    leaderboard_cache.invalidate(current_user.organization_id) # Names and avatars are on the board
     return {
         "message": "Profil güncellendi",
         "avatar_url": current_user.avatar_url,
@@ -92,7 +104,7 @@ async def update_profile(
 @router.get("/me/organizations")
 async def get_my_organizations(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Returns all organizations where the current user (identified by student_number) has an account.
@@ -105,18 +117,18 @@ async def get_my_organizations(
     # Import Organization here to avoid circular imports if any, or ensure it's imported at top
     from ..models import Organization
     
-    user_records = db.query(User).filter(User.student_number == current_user.student_number).all()
+    user_records = (await db.execute(select(User).filter(User.student_number == current_user.student_number))).scalars().all()
     
     org_list = []
     for u in user_records:
         if u.organization_id:
-            org = db.query(Organization).filter(Organization.id == u.organization_id).first()
+            org = await db.get(Organization, u.organization_id)
             if org:
                 # Fetch Teacher Name
-                teacher = db.query(User).filter(
+                teacher = (await db.execute(select(User).filter(
                     User.organization_id == org.id, 
                     User.role == 'teacher'
-                ).first()
+                ))).scalars().first()
                 teacher_name = teacher.full_name if teacher else "Eğitmen"
 
                 # Determine if this is the currently active session
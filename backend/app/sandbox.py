@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import queue
+import select
+import threading
+import subprocess
+from typing import List
+from .schemas import UnitTestResult
+
+SANDBOX_ENABLED = hasattr(os, "fork") and os.getenv("SANDBOX_ENABLED", "true").lower() not in ("0", "false", "no")
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(os.cpu_count() or 2)))
+SANDBOX_LIMITS = {
+    "cpu_seconds": int(os.getenv("SANDBOX_CPU_SECONDS", "2")),
+    "memory_mb": int(os.getenv("SANDBOX_MEMORY_MB", "256")),
+    "wall_seconds": float(os.getenv("SANDBOX_WALL_SECONDS", "5")),
+    # Test cases of one submission that run at the same time inside a worker
+    "parallelism": int(os.getenv("SANDBOX_TEST_PARALLELISM", "8")),
+}
+# How long a submission may wait for a free worker
+SANDBOX_CHECKOUT_TIMEOUT = float(os.getenv("SANDBOX_CHECKOUT_TIMEOUT", "30"))
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+
+class SandboxUnavailable(Exception):
+    pass
+
+
+class _Worker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            cwd="/",
+        )
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, job: dict, timeout: float) -> dict:
+        self.process.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError("Sandbox worker did not answer in time")
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Sandbox worker exited")
+        return json.loads(line)
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=1)
+        except Exception:
+            pass
+
+
+class SandboxPool:
+    """
+    Pool of warm sandbox worker processes (app/sandbox_worker.py). Each worker
+    forks a resource-limited child per test case, so a submission's test suite
+    runs in parallel without paying interpreter start-up per test.
+    """
+
+    def __init__(self, size: int = SANDBOX_WORKERS, limits: dict = None):
+        self.size = size
+        self.limits = dict(limits or SANDBOX_LIMITS)
+        self._idle = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self.counters = {"submissions": 0, "tests": 0, "passed": 0, "failures": 0, "worker_restarts": 0}
+
+    def _checkout(self) -> _Worker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._started < self.size:
+                self._started += 1
+                return _Worker()
+        try:
+            return self._idle.get(timeout=SANDBOX_CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise SandboxUnavailable("Tüm sandbox işçileri meşgul")
+
+    def _release(self, worker: _Worker, healthy: bool):
+        if healthy and worker.alive():
+            self._idle.put(worker)
+            return
+        worker.kill()
+        with self._lock:
+            self.counters["worker_restarts"] += 1
+        self._idle.put(_Worker())
+
+    def warm_up(self):
+        """Starts all workers ahead of the first submission (e.g. before a deadline)."""
+        workers = [self._checkout() for _ in range(self.size)]
+        for worker in workers:
+            self._release(worker, True)
+
+    def run_tests(self, code: str, tests: List[dict]) -> List[UnitTestResult]:
+        if not SANDBOX_ENABLED:
+            raise SandboxUnavailable("Bu sunucuda sandbox desteklenmiyor")
+
+        # Enough for every batch of parallel tests to hit its wall-clock limit
+        batches = -(-len(tests) // max(1, self.limits["parallelism"]))
+        timeout = self.limits["wall_seconds"] * batches + 5
+
+        worker = self._checkout()
+        healthy = False
+        try:
+            response = worker.run({"code": code, "tests": tests, "limits": self.limits}, timeout)
+            healthy = True
+        finally:
+            self._release(worker, healthy)
+
+        if "error" in response:
+            with self._lock:
+                self.counters["failures"] += 1
+            raise RuntimeError(response["error"])
+
+        results = [UnitTestResult(**r) for r in response["results"]]
+        with self._lock:
+            self.counters["submissions"] += 1
+            self.counters["tests"] += len(results)
+            self.counters["passed"] += sum(1 for r in results if r.passed)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            started = self._started
+        return {
+            **counters,
+            "enabled": SANDBOX_ENABLED,
+            "workers": self.size,
+            "started": started,
+            "idle": self._idle.qsize(),
+            "limits": self.limits,
+        }
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,480 @@
+"""
+Warm sandbox worker. Started once by app.sandbox.SandboxPool (python -I) and
+kept alive; it reads one JSON job per line from stdin and answers with one
+JSON line on stdout. Every test case runs in forked, isolated children, so
+the interpreter start-up and imports are paid only once.
+
+The student's program never decides its own verdict. It runs in one child
+that only produces stdout, stderr and an exit status. A teacher assertion runs
+in a second child (the judge) that calls the student's functions over a pipe,
+with values passed as repr()/literal_eval() literals. The comparison with the
+expected output and the verdict are made here, in the worker itself.
+
+This file must stay importable without the app package.
+"""
+import os
+import io
+import ast
+import sys
+import json
+import time
+import fcntl
+import ctypes
+import signal
+import shutil
+import builtins
+import resource
+import selectors
+import tempfile
+import traceback
+import unicodedata
+
+# Pre-imported so forked children get them for free (they cannot import from disk inside the chroot)
+import math, random, string, re, itertools, functools, collections, statistics, datetime  # noqa: E401,F401
+import heapq, bisect, copy, decimal, fractions, operator, typing, dataclasses, enum, textwrap  # noqa: E401,F401
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+PR_SET_DUMPABLE = 4
+PR_SET_NO_NEW_PRIVS = 38
+MAX_OUTPUT_CHARS = 64 * 1024
+MAX_MESSAGE_BYTES = 1024 * 1024
+EXCERPT_CHARS = 200
+NOBODY_ID = 65534
+SCRATCH_ROOT = "/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+# Exit status of a child that could not isolate itself (never reached by student code)
+ISOLATION_FAILED = 125
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _drop_capabilities():
+    header = _CapHeader(0x20080522, 0)
+    data = (_CapData * 2)()
+    if _libc.capset(ctypes.byref(header), data) != 0:
+        raise OSError(ctypes.get_errno(), "capset")
+
+
+def _isolate(root: str):
+    """
+    Confines the calling child: private network namespace, `root` as the whole
+    filesystem (chroot), no capabilities and an unprivileged user. Raises if
+    any step is impossible, the caller then exits instead of running code.
+    """
+    if os.getuid() == 0:
+        if _libc.unshare(CLONE_NEWNET) != 0:
+            raise OSError(ctypes.get_errno(), "unshare")
+        os.chmod(root, 0o777)
+        os.chroot(root)
+        os.chdir("/")
+        os.setgroups([])
+        os.setgid(NOBODY_ID)
+        os.setuid(NOBODY_ID)
+    else:
+        # A user namespace grants the chroot right without root; capabilities are dropped right after
+        if _libc.unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWNET) != 0:
+            raise OSError(ctypes.get_errno(), "unshare")
+        os.chroot(root)
+        os.chdir("/")
+        _drop_capabilities()
+    _libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+
+
+def _limit_resources(limits):
+    cpu = int(limits.get("cpu_seconds", 2))
+    memory = int(limits.get("memory_mb", 256)) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def _prepare_child(keep, scratch, limits):
+    """Maps `keep` {target fd: source fd}, closes everything else, then isolates."""
+    devnull = os.open(os.devnull, os.O_RDWR)
+    # Park the sources above every target first, so no dup2 overwrites a source still needed
+    staged = {target: fcntl.fcntl(source, fcntl.F_DUPFD, 256) for target, source in keep.items()}
+    for target in range(3 + len(staged)):
+        os.dup2(staged.get(target, devnull), target)
+    os.closerange(3 + len(staged), 65536)
+    _limit_resources(limits)
+    try:
+        _isolate(scratch)
+    except Exception:
+        os._exit(ISOLATION_FAILED)
+
+
+def _describe(error: BaseException, filename: str) -> str:
+    if isinstance(error, MemoryError):
+        return "Bellek sınırı aşıldı"
+    last = traceback.extract_tb(error.__traceback__)[-1:]
+    where = f" ({last[0].lineno}. satır)" if last and last[0].filename == filename else ""
+    return f"{type(error).__name__}: {error}{where}"
+
+
+def _excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    """A short, printable piece of program output for messages shown to the student."""
+    cleaned = "".join(
+        char if char == "\n" or unicodedata.category(char)[0] != "C" else "?" for char in text.strip()
+    )
+    return cleaned[:limit] + ("…" if len(cleaned) > limit else "")
+
+
+def _normalize(text):
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+# ---------------------------------------------------------------- student side
+
+def _serve(namespace, requests, replies):
+    """Answers the judge's lookups and calls of top-level names until it hangs up."""
+    for line in requests:
+        request = json.loads(line)
+        name = request.get("name")
+        if name not in namespace:
+            reply = {"kind": "missing"}
+        elif request["op"] == "get" and callable(namespace[name]):
+            reply = {"kind": "callable"}
+        else:
+            try:
+                value = namespace[name]
+                if request["op"] == "call":
+                    args = ast.literal_eval(request["args"])
+                    kwargs = ast.literal_eval(request["kwargs"])
+                    value = value(*args, **kwargs)
+                reply = {"kind": "value", "repr": repr(value)}
+            except BaseException as e:
+                reply = {"kind": "error", "message": _describe(e, "<öğrenci kodu>")}
+        sys.stdout.flush()
+        replies.write(json.dumps(reply, ensure_ascii=False) + "\n")
+        replies.flush()
+
+
+def _run_program(code, stdin_text, serve):
+    """Child body: runs the student's code; fd 1/2 go to the worker, fd 3/4 talk to the judge."""
+    sys.stdin = io.StringIO(stdin_text or "")
+    sys.stdout = open(1, "w", encoding="utf-8", errors="replace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="replace", closefd=False)
+    replies = open(4, "w", encoding="utf-8", closefd=False) if serve else None
+
+    namespace = {"__name__": "__main__"}
+    failure = None
+    try:
+        exec(compile(code, "<öğrenci kodu>", "exec"), namespace)
+    except SystemExit:
+        pass
+    except BaseException as e:
+        failure = _describe(e, "<öğrenci kodu>")
+    sys.stdout.flush()
+
+    if failure:
+        sys.stderr.write("\n" + failure + "\n")
+        sys.stderr.flush()
+    if replies is not None:
+        replies.write(json.dumps({"kind": "failed", "message": failure} if failure else {"kind": "ready"}) + "\n")
+        replies.flush()
+        if not failure:
+            _serve(namespace, open(3, "r", encoding="utf-8", closefd=False), replies)
+            sys.stdout.flush()
+    os._exit(1 if failure else 0)
+
+
+# ------------------------------------------------------------------ judge side
+
+class _RemoteError(Exception):
+    pass
+
+
+class _Remote:
+    def __init__(self):
+        self.requests = open(3, "w", encoding="utf-8", closefd=False)
+        self.replies = open(4, "rb", closefd=False)
+
+    def ask(self, **request) -> dict:
+        self.requests.write(json.dumps(request, ensure_ascii=False) + "\n")
+        self.requests.flush()
+        return self.receive()
+
+    def receive(self) -> dict:
+        line = self.replies.readline(MAX_MESSAGE_BYTES)
+        if not line.endswith(b"\n"):
+            raise _RemoteError("Program beklenmedik şekilde sonlandı")
+        return json.loads(line.decode("utf-8", errors="replace"))
+
+    def value(self, reply: dict):
+        if reply.get("kind") == "error":
+            raise _RemoteError(_excerpt(str(reply.get("message")), 500))
+        try:
+            return ast.literal_eval(reply.get("repr", ""))
+        except Exception:
+            raise _RemoteError("Dönen değer karşılaştırılamıyor (sayı, metin, liste, sözlük gibi bir değer olmalı)")
+
+
+class _RemoteFunction:
+    def __init__(self, remote: _Remote, name: str):
+        self._remote = remote
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._remote.value(self._remote.ask(op="call", name=self._name, args=repr(args), kwargs=repr(kwargs)))
+
+
+def _code_names(code) -> set:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= _code_names(const)
+    return names
+
+
+def _run_judge(assertion):
+    """Child body: evaluates the teacher's assertion against the student's program; exit 0 = passed."""
+    result = open(5, "w", encoding="utf-8", closefd=False)
+    try:
+        remote = _Remote()
+        started = remote.receive()
+        if started.get("kind") != "ready":
+            raise _RemoteError(_excerpt(str(started.get("message") or "Program çalıştırılamadı"), 500))
+
+        compiled = compile(assertion, "<test>", "exec")
+        namespace = {"__name__": "__test__"}
+        for name in _code_names(compiled):
+            if hasattr(builtins, name):
+                continue
+            reply = remote.ask(op="get", name=name)
+            if reply["kind"] == "callable":
+                namespace[name] = _RemoteFunction(remote, name)
+            elif reply["kind"] != "missing":
+                namespace[name] = remote.value(reply)
+        exec(compiled, namespace)
+    except AssertionError as e:
+        result.write(f"Doğrulama başarısız: {e}" if str(e) else "Doğrulama başarısız")
+    except _RemoteError as e:
+        result.write(str(e))
+    except BaseException as e:
+        result.write(_describe(e, "<test>"))
+    else:
+        os._exit(0)
+    result.flush()
+    os._exit(1)
+
+
+# ----------------------------------------------------------------- worker side
+
+class _Case:
+    """One test case: the student's program, plus the judge when there is an assertion."""
+
+    def __init__(self, index, test, code, limits, selector):
+        self.index = index
+        self.test = test
+        self.selector = selector
+        self.deadline = time.monotonic() + float(limits.get("wall_seconds", 5))
+        self.scratch = [tempfile.mkdtemp(prefix="sandbox_", dir=SCRATCH_ROOT)]
+        self.buffers = {"stdout": [], "stderr": [], "verdict": []}
+        self.sizes = {name: 0 for name in self.buffers}
+        self.streams = {}  # read fd -> buffer name
+        self.status = {}   # role -> wait status
+        self.pids = {}     # role -> pid
+
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        keep = {1: out_w, 2: err_w}
+        judge_fds = None
+        if test.get("assertion"):
+            request_r, request_w = os.pipe()
+            reply_r, reply_w = os.pipe()
+            verdict_r, verdict_w = os.pipe()
+            keep.update({3: request_r, 4: reply_w})
+            judge_fds = {3: request_w, 4: reply_r, 5: verdict_w}
+
+        self.pids["program"] = self._fork(keep, limits, lambda: _run_program(code, test.get("stdin"), judge_fds is not None))
+        self._watch(out_r, "stdout")
+        self._watch(err_r, "stderr")
+        if judge_fds is not None:
+            self.scratch.append(tempfile.mkdtemp(prefix="sandbox_", dir=SCRATCH_ROOT))
+            self.pids["judge"] = self._fork(dict(judge_fds), limits, lambda: _run_judge(test["assertion"]), self.scratch[1])
+            self._watch(verdict_r, "verdict")
+            for fd in (request_r, reply_w, request_w, reply_r, verdict_w):
+                os.close(fd)
+        for fd in (out_w, err_w):
+            os.close(fd)
+
+    def _fork(self, keep, limits, body, scratch=None) -> int:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _prepare_child(keep, scratch or self.scratch[0], limits)
+                body()
+            finally:
+                os._exit(1)
+        return pid
+
+    def _watch(self, fd, name):
+        self.streams[fd] = name
+        self.selector.register(fd, selectors.EVENT_READ, self)
+
+    def read(self, fd):
+        chunk = os.read(fd, 65536)
+        name = self.streams[fd]
+        if not chunk:
+            self.selector.unregister(fd)
+            os.close(fd)
+            del self.streams[fd]
+            return
+        # Keep draining so the child never blocks on a full pipe, but store only the start
+        if self.sizes[name] < MAX_OUTPUT_CHARS:
+            self.buffers[name].append(chunk)
+        self.sizes[name] += len(chunk)
+
+    def _reap(self, role) -> bool:
+        if role not in self.status:
+            pid, status = os.waitpid(self.pids[role], os.WNOHANG)
+            if pid:
+                self.status[role] = status
+        return role in self.status
+
+    def finished(self) -> bool:
+        if "judge" in self.pids:
+            if not self._reap("judge") or "verdict" in self.streams.values():
+                return False
+            # The judge is done: the program has nothing left to do
+            self._kill()
+            return True
+        return self._reap("program") and not self.streams
+
+    def _kill(self):
+        for role, pid in self.pids.items():
+            if role not in self.status:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, self.status[role] = os.waitpid(pid, 0)
+
+    def close(self, timed_out=False):
+        if timed_out:
+            self._kill()
+        # The children are gone, so the pipes end; collect what is left
+        for fd in list(self.streams):
+            while fd in self.streams:
+                self.read(fd)
+        for scratch in self.scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return self._verdict(timed_out)
+
+    def _text(self, name) -> str:
+        return b"".join(self.buffers[name])[:MAX_OUTPUT_CHARS].decode("utf-8", errors="replace")
+
+    def _verdict(self, timed_out) -> dict:
+        name = self.test.get("name") or f"Test {self.index + 1}"
+
+        def result(passed, message):
+            return {"testName": name, "passed": passed, "message": message}
+
+        statuses = self.status.values()
+        if timed_out or any(os.WIFSIGNALED(s) and os.WTERMSIG(s) == signal.SIGXCPU for s in statuses):
+            return result(False, "Zaman sınırı aşıldı")
+        if any(os.WIFEXITED(s) and os.WEXITSTATUS(s) == ISOLATION_FAILED for s in statuses):
+            return result(False, "Sandbox hatası: test güvenli ortamda çalıştırılamadı")
+
+        if "judge" in self.pids:
+            judge = self.status["judge"]
+            if not (os.WIFEXITED(judge) and os.WEXITSTATUS(judge) == 0):
+                message = _excerpt(self._text("verdict"), 500) if os.WIFEXITED(judge) else ""
+                return result(False, message or "Program beklenmedik şekilde sonlandı")
+        else:
+            program = self.status["program"]
+            if os.WIFSIGNALED(program):
+                return result(False, "Program beklenmedik şekilde sonlandı")
+            if os.WEXITSTATUS(program) != 0:
+                lines = [line for line in self._text("stderr").splitlines() if line.strip()]
+                return result(False, _excerpt(lines[-1] if lines else "Program hata ile sonlandı"))
+
+        output = self._text("stdout")
+        expected = self.test.get("expected_output")
+        if expected is not None and _normalize(output) != _normalize(expected):
+            return result(False, f"Beklenen çıktı: {_excerpt(expected)!r}, alınan: {_excerpt(output)!r}")
+        return result(True, "Geçti")
+
+
+def run_job(job):
+    code = job["code"]
+    tests = job["tests"]
+    limits = job.get("limits", {})
+    parallelism = max(1, int(limits.get("parallelism", 8)))
+
+    results = [None] * len(tests)
+    pending = list(enumerate(tests))
+    running = []
+    # Closed explicitly: a stale epoll fd closed by the GC inside a forked child would hit one of its pipes
+    with selectors.DefaultSelector() as selector:
+        while pending or running:
+            while pending and len(running) < parallelism:
+                index, test = pending.pop(0)
+                running.append(_Case(index, test, code, limits, selector))
+
+            now = time.monotonic()
+            # Short timeout: exits are noticed by polling waitpid
+            timeout = max(0.0, min(0.02, min(case.deadline for case in running) - now))
+            for key, _ in selector.select(timeout):
+                key.data.read(key.fd)
+
+            now = time.monotonic()
+            for case in list(running):
+                if case.finished():
+                    results[case.index] = case.close()
+                elif case.deadline <= now:
+                    results[case.index] = case.close(timed_out=True)
+                else:
+                    continue
+                running.remove(case)
+
+        return results
+
+
+def _check_isolation():
+    """Refuses to run anything when the children cannot be isolated on this host."""
+    scratch = tempfile.mkdtemp(prefix="sandbox_", dir=SCRATCH_ROOT)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _isolate(scratch)
+                os._exit(0 if not os.path.exists("/etc/passwd") else 1)
+            finally:
+                os._exit(1)
+        _, status = os.waitpid(pid, 0)
+        return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    # Children inherit this: they cannot ptrace or read /proc of the worker or of each other
+    _libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0)
+    isolated = _check_isolation()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            if not isolated:
+                raise RuntimeError("Bu sunucuda sandbox izolasyonu (chroot + kullanıcı/ağ ad alanı) kurulamıyor")
+            response = {"results": run_job(json.loads(line))}
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        protocol.write(json.dumps(response, ensure_ascii=False) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
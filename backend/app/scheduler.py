@@ -0,0 +1,193 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# Slots of the grading pool; every model call waits here for one
+SCHEDULER_CAPACITY = int(os.getenv("GRADING_MAX_CONCURRENCY", "8"))
+# Submissions due within this window jump ahead (earliest deadline first)
+DEADLINE_BOOST_SECONDS = float(os.getenv("GRADING_DEADLINE_BOOST_MINUTES", "60")) * 60
+# Slots one organization may hold at once (default: no cap beyond the pool)
+TENANT_MAX_CONCURRENCY = int(os.getenv("GRADING_TENANT_MAX_CONCURRENCY", "0")) or SCHEDULER_CAPACITY
+
+
+def parse_tenant_map(value: str, cast=float) -> Dict[int, Any]:
+    """'12:2,7:0.5' -> {12: 2.0, 7: 0.5}"""
+    parsed = {}
+    for item in (value or "").split(","):
+        if ":" in item:
+            tenant, setting = item.split(":", 1)
+            parsed[int(tenant.strip())] = cast(setting.strip())
+    return parsed
+
+
+def parse_due_date(value) -> Optional[datetime]:
+    """Assignment.due_date is an ISO string; returns a naive UTC datetime or None."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        due = value
+    else:
+        try:
+            due = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if due.tzinfo:
+        due = due.astimezone(timezone.utc).replace(tzinfo=None)
+    return due
+
+
+# Organization id -> relative share of the pool, and -> concurrency cap
+TENANT_WEIGHTS = parse_tenant_map(os.getenv("GRADING_TENANT_WEIGHTS", ""), float)
+TENANT_LIMITS = parse_tenant_map(os.getenv("GRADING_TENANT_LIMITS", ""), int)
+
+
+class _Waiter:
+    __slots__ = ("tenant", "due", "seq", "future", "enqueued")
+
+    def __init__(self, tenant, due: Optional[float], seq: int):
+        self.tenant = tenant
+        self.due = due
+        self.seq = seq
+        # A concurrent Future so callers on any event loop (requests, job loop) can wait
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.due, self.seq) < (other.due, other.seq)
+
+
+class FairShareScheduler:
+    """
+    Hands out the grading pool's slots across organizations by weighted fair
+    share (start-time fair queueing: each grant advances the tenant's virtual
+    time by 1/weight, the tenant furthest behind goes next). Within a tenant
+    requests are FIFO, except that submissions due within the boost window go
+    first, earliest deadline first; a tenant holding an imminent deadline is
+    also preferred over tenants that do not. Per-tenant caps keep one
+    organization from holding every slot even when the others are idle.
+    """
+
+    def __init__(self, capacity: int = SCHEDULER_CAPACITY, weights: Optional[Dict] = None,
+                 limits: Optional[Dict] = None, default_limit: Optional[int] = None,
+                 boost_seconds: float = DEADLINE_BOOST_SECONDS):
+        self.capacity = capacity
+        self.weights = TENANT_WEIGHTS if weights is None else weights
+        self.limits = TENANT_LIMITS if limits is None else limits
+        self.default_limit = default_limit or min(TENANT_MAX_CONCURRENCY, capacity)
+        self.boost_seconds = boost_seconds
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._free = capacity
+        self._clock = 0.0
+        self._fifo: Dict[Any, deque] = {}     # tenant -> waiters in arrival order
+        self._urgent: Dict[Any, list] = {}    # tenant -> heap of waiters with a due date
+        self._running: Dict[Any, int] = {}
+        self._vtime: Dict[Any, float] = {}
+        self._waits: Dict[Any, deque] = {}    # tenant -> recent wait times (seconds)
+        self.counters = {"granted": 0, "boosted": 0, "cancelled": 0}
+
+    async def acquire(self, tenant, due_at: Optional[datetime] = None):
+        """Waits for a slot; pair every successful acquire with `release(tenant)`."""
+        due = (due_at - datetime.utcnow()).total_seconds() + time.monotonic() if due_at else None
+        with self._lock:
+            waiter = _Waiter(tenant, due, next(self._seq))
+            self._fifo.setdefault(tenant, deque()).append(waiter)
+            if due is not None:
+                heapq.heappush(self._urgent.setdefault(tenant, []), waiter)
+            self._dispatch()
+        try:
+            await asyncio.wrap_future(waiter.future)
+        except asyncio.CancelledError:
+            # Granted in the same instant we were cancelled: give the slot back
+            if not waiter.future.cancelled():
+                self.release(tenant)
+            else:
+                with self._lock:
+                    self.counters["cancelled"] += 1
+            raise
+
+    def release(self, tenant):
+        with self._lock:
+            self._running[tenant] -= 1
+            self._free += 1
+            self._dispatch()
+
+    def _limit(self, tenant) -> int:
+        return self.limits.get(tenant, self.default_limit)
+
+    def _head(self, tenant, now: float):
+        """(waiter, is_urgent) that this tenant would run next, dropping stale entries."""
+        heap = self._urgent.get(tenant)
+        # Past due dates (e.g. bulk regrades of old assignments) get no boost; they
+        # only get older, so they leave the heap for good and wait in the FIFO
+        while heap and (heap[0].future.done() or heap[0].future.running() or heap[0].due < now):
+            heapq.heappop(heap)
+        if heap and heap[0].due <= now + self.boost_seconds:
+            return heap[0], True
+        fifo = self._fifo.get(tenant)
+        while fifo and (fifo[0].future.done() or fifo[0].future.running()):
+            fifo.popleft()
+        return (fifo[0], False) if fifo else (None, False)
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._free > 0:
+            best = None
+            for tenant in list(self._fifo):
+                waiter, urgent = self._head(tenant, now)
+                if waiter is None:
+                    del self._fifo[tenant]
+                    self._urgent.pop(tenant, None)
+                    continue
+                if self._running.get(tenant, 0) >= self._limit(tenant):
+                    continue
+                start = max(self._clock, self._vtime.get(tenant, 0.0))
+                key = (not urgent, start, waiter.seq)
+                if best is None or key < best[0]:
+                    best = (key, waiter, urgent, start)
+            if best is None:
+                return
+
+            _, waiter, urgent, start = best
+            # False when the waiter was cancelled meanwhile; it is skipped next round
+            if not waiter.future.set_running_or_notify_cancel():
+                continue
+            tenant = waiter.tenant
+            self._clock = start
+            self._vtime[tenant] = start + 1.0 / self.weights.get(tenant, 1.0)
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            self._free -= 1
+            self.counters["granted"] += 1
+            self.counters["boosted"] += int(urgent)
+            self._waits.setdefault(tenant, deque(maxlen=512)).append(now - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tenants = {}
+            for tenant in set(self._fifo) | set(self._running) | set(self._waits):
+                waits = sorted(self._waits.get(tenant, ()))
+                tenants[str(tenant)] = {
+                    "waiting": sum(1 for w in self._fifo.get(tenant, ()) if not (w.future.done() or w.future.running())),
+                    "running": self._running.get(tenant, 0),
+                    "limit": self._limit(tenant),
+                    "weight": self.weights.get(tenant, 1.0),
+                    "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                }
+            return {
+                **self.counters,
+                "capacity": self.capacity,
+                "free": self._free,
+                "deadline_boost_seconds": self.boost_seconds,
+                "tenants": tenants,
+            }
+
+
+grading_scheduler = FairShareScheduler()
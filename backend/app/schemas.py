@@ -1,9 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import Generic, List, Literal, TypeVar
 from datetime import datetime
 
+T = TypeVar("T")
 
 
+
+class Page(BaseModel, Generic[T]):
+    # One page of a list endpoint; pass next_cursor back as ?cursor= for the next one (None = last page)
+    items: List[T]
+    next_cursor: str | None = None
+
 class Badge(BaseModel):
     name: str
     icon: str
@@ -14,18 +21,38 @@ class UnitTestResult(BaseModel):
     passed: bool = Field(..., description="Testin geçip geçmediği")
     message: str = Field(..., description="Test sonucu veya hata mesajı")
 
-class GradingResult(BaseModel):
+class GradingAnswer(BaseModel):
+    # The part of the result the model writes (its response_schema)
     grade: int = Field(..., description="0-100 arası not")
     feedback: str = Field(..., description="Genel geri bildirim metni")
     codeQuality: str = Field(..., description="Kod kalitesi değerlendirmesi")
     suggestions: List[str] = Field(..., description="Geliştirme önerileri listesi")
     unitTests: List[UnitTestResult] = Field(..., description="Birim testi sonuçları")
 
+class TokenUsage(BaseModel):
+    estimatedInputTokens: int = Field(..., description="Yerel olarak tahmin edilen istem boyutu")
+    promptTokens: int | None = Field(None, description="Modelin bildirdiği girdi token sayısı")
+    outputTokens: int | None = Field(None, description="Modelin bildirdiği çıktı token sayısı")
+    totalTokens: int | None = None
+    maxOutputTokens: int = Field(..., description="Bu istek için seçilen çıktı sınırı")
+    codeTruncated: bool = False
+    descriptionTruncated: bool = False
+
+class GradingResult(GradingAnswer):
+    tokenUsage: TokenUsage | None = None
+
 class SubmissionRequest(BaseModel):
     assignmentDescription: str = Field(..., description="Ödevin ne istediği")
     assignmentLanguage: str = Field(..., description="Kodlama dili (örn: Python, Java)")
     studentCode: str = Field(..., description="Öğrencinin yazdığı kod")
     studentLevel: Literal["beginner", "intermediate", "advanced"] = Field("beginner", description="Öğrenci seviyesi")
+    assignmentId: int | None = Field(None, description="Gizli testleri çalıştırılacak ödev (opsiyonel)")
+
+class HiddenTestCase(BaseModel):
+    name: str = Field(..., description="Test senaryosunun adı")
+    stdin: str = Field("", description="Programa verilecek girdi")
+    expected_output: str | None = Field(None, description="Beklenen ekran çıktısı (satır sonu boşlukları önemsiz)")
+    assertion: str | None = Field(None, description="Öğrenci kodundan sonra çalıştırılan Python doğrulaması, örn: assert topla(2, 3) == 5")
 
 class PasswordChange(BaseModel):
     oldPassword: str
@@ -49,7 +76,8 @@ class AssignmentBase(BaseModel):
     target_students: str | None = None
 
 class AssignmentCreate(AssignmentBase):
-    pass
+    # Write-only: hidden tests are never part of AssignmentOut, students must not see them
+    hidden_tests: List[HiddenTestCase] | None = None
 
 class AssignmentOut(AssignmentBase):
     id: int
@@ -58,6 +86,21 @@ class AssignmentOut(AssignmentBase):
     class Config:
         from_attributes = True
 
+class AssignmentSummary(BaseModel):
+    # List entry: the description is cut to a preview, GET /assignments/{id} has the full text
+    id: int
+    title: str
+    description_preview: str | None = None
+    due_date: str | None = None
+    language: str | None = None
+    student_level: str | None = None
+    status: str | None = None
+    target_type: str | None = None
+    target_class: str | None = None
+    target_students: str | None = None
+    created_at: datetime | None = None
+    teacher_name: str | None = None
+
 class AnnouncementBase(BaseModel):
     title: str
     content: str
@@ -75,21 +118,42 @@ class AnnouncementOut(AnnouncementBase):
 class SubmissionCreate(BaseModel):
     assignment_id: int | None = None
     code_content: str
-    grading_result: str # JSON string
+    # The server grades the submission itself; a client supplied grading_result is ignored
 
-class SubmissionOut(BaseModel):
+class SubmissionSummary(BaseModel):
+    # List entry: scores only, GET /submissions/{id} has the code and the full grading result
     id: int
     user_id: int
     student_name: str | None = None
     assignment_id: int | None = None
+    submitted_at: datetime
+    grade: int | None = None
+    code_quality: str | None = None
+    tests_passed: int | None = None
+    tests_total: int | None = None
+
+    class Config:
+        from_attributes = True
+
+class SubmissionOut(SubmissionSummary):
     code_content: str
     grading_result: str
-    submitted_at: datetime
     new_badges: List[Badge] = []
 
     class Config:
         from_attributes = True
 
+class StudentOut(BaseModel):
+    id: int
+    student_number: str
+    full_name: str | None = None
+    email: str | None = None
+    class_code: str | None = None
+    avatar_url: str | None = None
+
+    class Config:
+        from_attributes = True
+
 class TenantCreate(BaseModel):
     org_name: str
     teacher_username: str
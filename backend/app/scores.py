@@ -0,0 +1,87 @@
+import json
+from typing import Optional
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from .models import Submission, SubmissionTestResult
+
+# Rows per transaction when the migration fills the typed columns of old submissions
+BACKFILL_BATCH_SIZE = 1000
+
+
+def parse_grading_result(value) -> dict:
+    """Submission.grading_result holds a JSON string (older rows may hold the object itself)."""
+    if isinstance(value, dict):
+        return value
+    try:
+        data = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def score_fields(data: dict) -> dict:
+    """Typed Submission columns of a grading result; a missing or broken grade counts as 0, as before."""
+    try:
+        grade = int(data.get("grade", 0))
+    except (TypeError, ValueError):
+        grade = 0
+    tests = _unit_tests(data)
+    quality = data.get("codeQuality")
+    return {
+        "grade": grade,
+        "code_quality": str(quality) if quality is not None else None,
+        "tests_passed": sum(1 for test in tests if test["passed"]),
+        "tests_total": len(tests),
+    }
+
+
+def _unit_tests(data: dict) -> list:
+    tests = data.get("unitTests")
+    if not isinstance(tests, list):
+        return []
+    return [
+        {
+            "position": position,
+            "test_name": str(test.get("testName", "")),
+            "passed": bool(test.get("passed")),
+            "message": test.get("message"),
+        }
+        for position, test in enumerate(tests) if isinstance(test, dict)
+    ]
+
+
+def set_grading_result(submission: Submission, result: dict):
+    """Stores a grading result on a submission: the JSON, the typed columns and the test rows."""
+    submission.grading_result = json.dumps(result, ensure_ascii=False)
+    for name, value in score_fields(result).items():
+        setattr(submission, name, value)
+    submission.test_results = [SubmissionTestResult(**test) for test in _unit_tests(result)]
+
+
+def backfill_submission_scores(db: Session, batch_size: int = BACKFILL_BATCH_SIZE, limit: Optional[int] = None) -> int:
+    """
+    Fills the typed columns and test rows of submissions stored before they
+    existed (grade IS NULL). Commits per batch, so it can be interrupted and rerun.
+    """
+    done = 0
+    while limit is None or done < limit:
+        rows = (
+            db.query(Submission.id, Submission.grading_result)
+            .filter(Submission.grade.is_(None))
+            .order_by(Submission.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        updates, tests = [], []
+        for submission_id, grading_result in rows:
+            data = parse_grading_result(grading_result)
+            updates.append({"id": submission_id, **score_fields(data)})
+            tests.extend({"submission_id": submission_id, **test} for test in _unit_tests(data))
+        db.execute(update(Submission), updates)
+        if tests:
+            db.execute(insert(SubmissionTestResult), tests)
+        db.commit()
+        done += len(rows)
+    return done
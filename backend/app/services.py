@@ -1,13 +1,28 @@
 import os
 import json
-import google.generativeai as genai
-from typing import Dict, Any
-from .schemas import GradingResult, SubmissionRequest
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from .schemas import GradingAnswer, GradingResult, SubmissionRequest, TokenUsage, UnitTestResult
 from dotenv import load_dotenv
 import pandas as pd
 from sqlalchemy.orm import Session
-from .models import User
+from .models import User, Assignment
 from .auth import get_password_hash
+from .grading_cache import grading_cache, make_cache_key
+from .streaming import PartialObjectParser
+from .precheck import precheck_submission, normalize_language
+from .sandbox import sandbox_pool, SANDBOX_ENABLED
+from .database import SessionLocal
+from .resilience import grading_breaker, call_with_retries, record_error, GradingUnavailable, RETRYABLE
+from .token_budget import budget_request, budget_signature, estimate_tokens, record_usage, MAX_OUTPUT_TOKENS
+from .providers import GradingProvider, ProviderResponse, create_provider
+from .telemetry import GradingTrace, grading_telemetry
+from .scheduler import grading_scheduler, parse_due_date
 
 load_dotenv()
 import io
@@ -107,18 +122,19 @@ def process_excel_upload(file_contents: bytes, db: Session, admin_user: User = N
 
 # ... (Existing Gemini functions) ...
 
-# Initialize Gemini
-# Check both GEMINI_API_KEY and GOOGLE_API_KEY for service compatibility
-API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-# Default to the most universal stable model if not specified
-MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-3-flash-preview")
-
-
-
-if not API_KEY:
-    print("WARNING: API Key (GEMINI_API_KEY or GOOGLE_API_KEY) is not set in environment variables.")
-else:
-    genai.configure(api_key=API_KEY)
+# Prints every raw model answer; per-call numbers are in /metrics (app/telemetry.py)
+GRADING_DEBUG = os.getenv("GRADING_DEBUG", "false").lower() in ("1", "true", "yes")
+# Grading model backend, chosen by GRADING_PROVIDER (see app/providers.py)
+provider: GradingProvider = create_provider()
+# Provider calls are blocking; it runs on this dedicated pool so the event loop
+# keeps serving other routes. Its size is the ceiling of concurrent model calls.
+GRADING_MAX_CONCURRENCY = int(os.getenv("GRADING_MAX_CONCURRENCY", "8"))
+_grading_executor = ThreadPoolExecutor(max_workers=GRADING_MAX_CONCURRENCY, thread_name_prefix="grading")
+_concurrency_lock = threading.Lock()
+_concurrency_counters = {"waiting": 0, "in_flight": 0, "completed": 0, "shared_calls": 0, "coalesced": 0}
+# cache key -> outcome of the grading currently running for it (single-flight);
+# a concurrent Future so waiters on any event loop (requests, job loop) can await it
+_inflight: Dict[str, Future] = {}
 
 
 def get_system_instruction(student_level: str) -> str:
@@ -203,64 +219,494 @@ def get_system_instruction(student_level: str) -> str:
     - Feedback'te öğrenci seviyesine uygun dil kullan
     """
 
-async def grade_submission(request: SubmissionRequest) -> GradingResult:
-    if not API_KEY:
-         return GradingResult(
-            grade=0,
-            feedback="API Key yapılandırılmamış. Lütfen sunucu ayarlarını kontrol edin.",
-            codeQuality="Bilinmiyor",
-            suggestions=["Server .env dosyasını kontrol et"],
-            unitTests=[]
-        )
+GRADING_LEVELS = ("beginner", "intermediate", "advanced")
 
-    user_prompt = f"""
+USER_PROMPT_TEMPLATE = """
     **Ödev Tanımı:**
-    {request.assignmentDescription}
+    {description}
 
     **Hedef Dil:**
-    {request.assignmentLanguage}
+    {language}
 
     **Öğrenci Kodu:**
-    {request.studentCode}
-    
-    **Öğrenci Seviyesi:** {request.studentLevel}
+    {code}
     
+    **Öğrenci Seviyesi:** {level}
+    {test_report}
     Lütfen kodu analiz et, zihinsel olarak çalıştır ve değerlendir.
     """
 
-    generation_config = {
-        "temperature": 0.4,
-        "top_p": 1,
-        "top_k": 32,
-        "max_output_tokens": 8192,
-        "response_mime_type": "application/json",
-        "response_schema": GradingResult,
-    }
-    
-    # Combined prompt with system instruction
-    system_text = get_system_instruction(request.studentLevel)
-    final_prompt = f"{system_text}\n\n---\n\n{user_prompt}"
+# The level prompts are static, so they are rendered once at import time
+SYSTEM_INSTRUCTIONS = {level: get_system_instruction(level) for level in GRADING_LEVELS}
+
+# Identifies the exact prompt text; part of the cache key and stored with cached results
+PROMPT_VERSION = hashlib.sha256(
+    "\n".join([USER_PROMPT_TEMPLATE, budget_signature()] + [SYSTEM_INSTRUCTIONS[level] for level in GRADING_LEVELS]).encode("utf-8")
+).hexdigest()[:12]
+SYSTEM_INSTRUCTION_TOKENS = {level: estimate_tokens(SYSTEM_INSTRUCTIONS[level]) for level in GRADING_LEVELS}
 
-    model = genai.GenerativeModel(
-        model_name=MODEL_NAME,
-        generation_config=generation_config
+def build_grading_request(assignment: Assignment, student_code: str) -> SubmissionRequest:
+    """Grading input for a submission of a stored assignment."""
+    level = (assignment.student_level or "").strip().lower()
+    return SubmissionRequest(
+        assignmentDescription=assignment.description or "",
+        assignmentLanguage=assignment.language or "",
+        studentCode=student_code,
+        studentLevel=level if level in GRADING_LEVELS else "beginner",
+        assignmentId=assignment.id,
     )
 
+class GradingFailed(Exception):
+    """Raised by `grade_submission(..., raise_on_error=True)` instead of returning a fallback result."""
+
+
+async def grade_submission(request: SubmissionRequest, raise_on_error: bool = False,
+                           organization_id: Optional[int] = None) -> GradingResult:
+    # Every grading is measured (app/telemetry.py), whatever path it takes
+    trace = GradingTrace(provider.model_name, request.studentLevel, organization_id, request.assignmentId)
     try:
-        response = model.generate_content(final_prompt)
-        text = response.text.strip()
-        print(f"DEBUG: AI Response: {text}")
-        
-        # Parse JSON response
-        result_json = json.loads(text)
-        return GradingResult(**result_json)
-        
+        return await _grade_submission(request, raise_on_error, trace)
+    finally:
+        grading_telemetry.record(trace)
+
+async def _grade_submission(request: SubmissionRequest, raise_on_error: bool, trace: GradingTrace) -> GradingResult:
+    # Code that does not even parse is answered locally, without a model call
+    # (off the event loop: compiling a large submission takes a while)
+    prechecked = await asyncio.to_thread(precheck_submission, request.assignmentLanguage, request.studentCode)
+    if prechecked is not None:
+        trace.outcome = "precheck"
+        return prechecked
+
+    # Identical submissions (templates, resubmits) are served from the cache
+    hidden_tests, due_at = await _load_assignment(request, trace.organization_id)
+    cache_key = make_cache_key(request, provider.model_name, PROMPT_VERSION, _tests_fingerprint(hidden_tests))
+    cached = await asyncio.to_thread(grading_cache.get, cache_key)
+    if cached is not None:
+        trace.outcome = "cache_hit"
+        return cached
+
+    if not provider.is_configured():
+        trace.outcome = "not_configured"
+        if raise_on_error:
+            raise GradingFailed("API Key yapılandırılmamış")
+        return _missing_key_result()
+
+    async def grade():
+        # Only runs for the first of identical concurrent requests
+        trace.outcome = "error"
+        test_results = await _run_hidden_tests(request, hidden_tests)
+        result = await _traced_model_call(trace, request, test_results, due_at=due_at)
+        # Only successful model answers are cached, fallbacks must be retried
+        await asyncio.to_thread(grading_cache.set, cache_key, result, provider.model_name, PROMPT_VERSION)
+        return result
+
+    trace.outcome = "coalesced"
+    try:
+        # Identical requests already in flight (double clicks, a class pasting the template) share one call
+        return await _single_flight(cache_key, grade)
+    except GradingUnavailable:
+        # Transient provider trouble: the caller retries later instead of keeping a fallback grade
+        trace.outcome = "unavailable"
+        raise
+    except Exception as e:
+        print(f"Error calling Gemini: {e}")
+        if raise_on_error:
+            raise GradingFailed(str(e)) from e
+        return _error_result(e)
+
+async def stream_grading(request: SubmissionRequest, organization_id: Optional[int] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of `grade_submission`. Yields ("field", (name, value)) as soon
+    as a top-level field of the JSON answer is complete, then ("done", GradingResult),
+    or ("unavailable", retry_after_seconds) while the provider is unhealthy.
+    """
+    trace = GradingTrace(provider.model_name, request.studentLevel, organization_id, request.assignmentId, streamed=True)
+    try:
+        async for event in _stream_grading(request, trace):
+            yield event
+    finally:
+        grading_telemetry.record(trace)
+
+async def _stream_grading(request: SubmissionRequest, trace: GradingTrace) -> AsyncIterator[Tuple[str, Any]]:
+    prechecked = await asyncio.to_thread(precheck_submission, request.assignmentLanguage, request.studentCode)
+    if prechecked is not None:
+        trace.outcome = "precheck"
+        for name, value in prechecked.model_dump().items():
+            yield "field", (name, value)
+        yield "done", prechecked
+        return
+
+    hidden_tests, due_at = await _load_assignment(request, trace.organization_id)
+    cache_key = make_cache_key(request, provider.model_name, PROMPT_VERSION, _tests_fingerprint(hidden_tests))
+    cached = await asyncio.to_thread(grading_cache.get, cache_key)
+    if cached is not None:
+        trace.outcome = "cache_hit"
+        for name, value in cached.model_dump().items():
+            yield "field", (name, value)
+        yield "done", cached
+        return
+
+    if not provider.is_configured():
+        trace.outcome = "not_configured"
+        yield "done", _missing_key_result()
+        return
+
+    # Identical gradings share one model call, streamed or not (see _single_flight)
+    with _concurrency_lock:
+        shared = _inflight.get(cache_key)
+        if shared is None:
+            flight = _inflight[cache_key] = Future()
+            _concurrency_counters["shared_calls"] += 1
+        else:
+            _concurrency_counters["coalesced"] += 1
+    if shared is not None:
+        # The same grading is already running for another request, replay its outcome
+        try:
+            result = await asyncio.wrap_future(shared)
+        except GradingUnavailable as e:
+            trace.outcome = "unavailable"
+            yield "unavailable", e.retry_after
+            return
+        except Exception as e:
+            yield "done", _error_result(e)
+            return
+        trace.outcome = "coalesced"
+        for name, value in result.model_dump(exclude={"tokenUsage"}).items():
+            yield "field", (name, value)
+        yield "done", result
+        return
+
+    try:
+        async for kind, payload in _lead_stream(request, trace, hidden_tests, cache_key, due_at):
+            if kind == "failed":
+                # Waiters get the error itself, the client the usual error result
+                flight.set_exception(payload)
+                yield "done", _error_result(payload)
+                return
+            if kind == "unavailable":
+                flight.set_exception(GradingUnavailable(payload))
+            elif kind == "done":
+                flight.set_result(payload)
+            yield kind, payload
+    finally:
+        if not flight.done():
+            # The client went away before the answer was complete
+            flight.set_exception(GradingFailed("Değerlendirme akışı yarıda kesildi"))
+        with _concurrency_lock:
+            _inflight.pop(cache_key, None)
+
+async def _lead_stream(request: SubmissionRequest, trace: GradingTrace, hidden_tests: List[dict], cache_key: str,
+                       due_at: Optional[datetime]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    The model call of a streamed grading. Yields "field", "unavailable" and
+    "done" events like stream_grading, and ("failed", exception) on errors.
+    """
+    if not grading_breaker.allow():
+        trace.outcome = "unavailable"
+        yield "unavailable", grading_breaker.retry_after()
+        return
+
+    test_results = await _run_hidden_tests(request, hidden_tests)
+    if test_results is not None:
+        # Real results are known before the model answers, send them first
+        yield "field", ("unitTests", [t.model_dump() for t in test_results])
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+
+    def produce():
+        # Runs on the grading pool; hands every chunk over to the event loop
+        try:
+            prompt, usage = _prepare_prompt(request, test_results)
+            last_chunk = None
+            for chunk in provider.stream(request.studentLevel, _system_instruction(request.studentLevel),
+                                         prompt, usage.maxOutputTokens):
+                last_chunk = chunk
+                loop.call_soon_threadsafe(chunks.put_nowait, ("chunk", chunk.text))
+            loop.call_soon_threadsafe(chunks.put_nowait, ("end", (usage, last_chunk)))
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, ("error", e))
+
+    # The pool thread keeps draining the model stream even if our consumer goes away
+    model_started = time.perf_counter()
+    producer = asyncio.ensure_future(_run_on_grading_pool(produce, tenant=trace.organization_id, due_at=due_at))
+    parser = PartialObjectParser()
+    emitted = False
+    while True:
+        kind, payload = await chunks.get()
+        if kind == "error":
+            print(f"Error streaming from Gemini: {payload}")
+            # Every failure counts for the breaker, even one after fields were shown
+            error_class = record_error(grading_breaker, payload)
+            if emitted or error_class not in RETRYABLE:
+                yield "failed", payload
+                return
+            # Nothing shown yet, so the retrying non-streaming call can take over
+            trace.retries += 1
+            async for event in _stream_fallback(trace, request, test_results, cache_key, due_at=due_at):
+                yield event
+            return
+        if kind == "end":
+            usage, last_chunk = payload
+            break
+        for name, value in parser.feed(payload):
+            if name == "unitTests" and test_results is not None:
+                continue
+            if name in GradingAnswer.model_fields:
+                emitted = True
+                yield "field", (name, value)
+    await producer
+    grading_breaker.record_success()
+    trace.model_seconds = time.perf_counter() - model_started
+
+    try:
+        result = GradingResult(**json.loads(parser.buffer.strip()))
+        if test_results is not None:
+            result.unitTests = test_results
+        result.tokenUsage = _finish_usage(usage, last_chunk)
+    except Exception as e:
+        if not (last_chunk and last_chunk.finish_reason == "MAX_TOKENS" and usage.maxOutputTokens < MAX_OUTPUT_TOKENS):
+            print(f"Error parsing streamed Gemini response: {e}")
+            yield "failed", e
+            return
+        # The adaptive limit cut the JSON off: grade again with the full limit
+        trace.retries += 1
+        async for event in _stream_fallback(trace, request, test_results, cache_key, MAX_OUTPUT_TOKENS, due_at):
+            yield event
+        return
+
+    trace.outcome = "graded"
+    trace.use_result(result)
+    await asyncio.to_thread(grading_cache.set, cache_key, result, provider.model_name, PROMPT_VERSION)
+    yield "done", result
+
+async def _stream_fallback(trace: GradingTrace, request: SubmissionRequest, test_results: Optional[List[UnitTestResult]],
+                           cache_key: str, max_output_tokens: Optional[int] = None, due_at: Optional[datetime] = None):
+    """Finishes a failed stream with a regular (retried) model call; errors end in ("failed", exception)."""
+    try:
+        result = await _traced_model_call(trace, request, test_results, max_output_tokens, due_at)
+    except GradingUnavailable as e:
+        trace.outcome = "unavailable"
+        yield "unavailable", e.retry_after
+        return
     except Exception as e:
         print(f"Error calling Gemini: {e}")
-        return GradingResult(
-            grade=0,
-            feedback=f"Yapay zeka yanıtı işlenirken bir hata oluştu: {str(e)}",
-            codeQuality="Hata",
-            suggestions=["Lütfen tekrar gönderin"],
-            unitTests=[]
+        yield "failed", e
+        return
+    for name, value in result.model_dump(exclude={"tokenUsage"}).items():
+        yield "field", (name, value)
+    await asyncio.to_thread(grading_cache.set, cache_key, result, provider.model_name, PROMPT_VERSION)
+    yield "done", result
+
+def _missing_key_result() -> GradingResult:
+    return GradingResult(
+        grade=0,
+        feedback="API Key yapılandırılmamış. Lütfen sunucu ayarlarını kontrol edin.",
+        codeQuality="Bilinmiyor",
+        suggestions=["Server .env dosyasını kontrol et"],
+        unitTests=[]
+    )
+
+def _error_result(error: Exception) -> GradingResult:
+    return GradingResult(
+        grade=0,
+        feedback=f"Yapay zeka yanıtı işlenirken bir hata oluştu: {str(error)}",
+        codeQuality="Hata",
+        suggestions=["Lütfen tekrar gönderin"],
+        unitTests=[]
+    )
+
+async def _call_model(request: SubmissionRequest, test_results: Optional[List[UnitTestResult]] = None,
+                      max_output_tokens: Optional[int] = None, failures: Optional[list] = None,
+                      tenant: Optional[int] = None, due_at: Optional[datetime] = None) -> GradingResult:
+    """One grading on the pool, retried with backoff behind the circuit breaker (app/resilience.py)."""
+    return await call_with_retries(
+        lambda: _run_on_grading_pool(_generate_grading, request, test_results, max_output_tokens,
+                                     tenant=tenant, due_at=due_at),
+        grading_breaker,
+        failures=failures,
+    )
+
+async def _traced_model_call(trace: GradingTrace, request: SubmissionRequest,
+                             test_results: Optional[List[UnitTestResult]] = None,
+                             max_output_tokens: Optional[int] = None, due_at: Optional[datetime] = None) -> GradingResult:
+    failures = []
+    started = time.perf_counter()
+    try:
+        result = await _call_model(request, test_results, max_output_tokens, failures, trace.organization_id, due_at)
+    finally:
+        trace.retries += len(failures)
+        trace.model_seconds += time.perf_counter() - started
+    trace.outcome = "graded"
+    trace.use_result(result)
+    return result
+
+async def _run_on_grading_pool(func, *args, tenant: Optional[int] = None, due_at: Optional[datetime] = None):
+    """
+    Runs a blocking model call on the bounded grading pool without blocking the
+    event loop. Slots are handed out per organization by the fair-share
+    scheduler (app/scheduler.py), so the pool itself never queues.
+    """
+    with _concurrency_lock:
+        _concurrency_counters["waiting"] += 1
+    try:
+        await grading_scheduler.acquire(tenant, due_at)
+    except BaseException:
+        with _concurrency_lock:
+            _concurrency_counters["waiting"] -= 1
+        raise
+
+    def tracked():
+        with _concurrency_lock:
+            _concurrency_counters["waiting"] -= 1
+            _concurrency_counters["in_flight"] += 1
+        try:
+            return func(*args)
+        finally:
+            with _concurrency_lock:
+                _concurrency_counters["in_flight"] -= 1
+                _concurrency_counters["completed"] += 1
+            grading_scheduler.release(tenant)
+
+    def dropped(future):
+        # Cancelled before a pool thread picked it up (e.g. client went away)
+        if future.cancelled():
+            with _concurrency_lock:
+                _concurrency_counters["waiting"] -= 1
+            grading_scheduler.release(tenant)
+
+    future = _grading_executor.submit(tracked)
+    future.add_done_callback(dropped)
+    return await asyncio.wrap_future(future)
+
+async def _single_flight(key: str, call):
+    """Runs `call()` once per key at a time; concurrent callers with the same key await its outcome."""
+    with _concurrency_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+            _concurrency_counters["shared_calls"] += 1
+        else:
+            _concurrency_counters["coalesced"] += 1
+    if not leader:
+        return await asyncio.wrap_future(future)
+
+    async def run():
+        try:
+            future.set_result(await call())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _concurrency_lock:
+                _inflight.pop(key, None)
+
+    # Shielded: the waiters still get their result if the leading client disconnects
+    await asyncio.shield(asyncio.ensure_future(run()))
+    return future.result()
+
+def get_concurrency_stats() -> dict:
+    with _concurrency_lock:
+        return {"limit": GRADING_MAX_CONCURRENCY, **_concurrency_counters}
+
+async def _load_assignment(request: SubmissionRequest, organization_id: Optional[int]) -> Tuple[List[dict], Optional[datetime]]:
+    """
+    Hidden tests and due date of the request's assignment, if it names one of the
+    caller's organization. Another tenant's assignment id counts as no assignment:
+    its hidden tests (and their expected outputs) must never run for this caller.
+    """
+    if request.assignmentId is None:
+        return [], None
+
+    def load():
+        db = SessionLocal()
+        try:
+            assignment = db.query(Assignment).filter(
+                Assignment.id == request.assignmentId, Assignment.organization_id == organization_id
+            ).first()
+            if assignment is None:
+                return [], None
+            return list(assignment.hidden_tests or []), parse_due_date(assignment.due_date)
+        finally:
+            db.close()
+
+    return await asyncio.to_thread(load)
+
+def _tests_fingerprint(hidden_tests: List[dict]) -> str:
+    if not hidden_tests:
+        return ""
+    return hashlib.sha256(json.dumps(hidden_tests, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def _run_hidden_tests(request: SubmissionRequest, hidden_tests: List[dict]) -> Optional[List[UnitTestResult]]:
+    """Executes the teacher's tests in the sandbox. None means no real results are available."""
+    if not hidden_tests or not SANDBOX_ENABLED or normalize_language(request.assignmentLanguage) not in ("python", "py"):
+        return None
+    try:
+        return await asyncio.to_thread(sandbox_pool.run_tests, request.studentCode, hidden_tests)
+    except Exception as e:
+        print(f"Sandbox warning, grading without real test results: {e}")
+        return None
+
+def _build_prompt(request: SubmissionRequest, test_results: Optional[List[UnitTestResult]] = None) -> str:
+    test_report = ""
+    if test_results is not None:
+        lines = "\n".join(
+            f"    - {t.testName}: {'GEÇTİ' if t.passed else 'KALDI'} ({t.message})" for t in test_results
+        )
+        test_report = (
+            "\n    **Gerçek Test Sonuçları (öğretmenin testleri sunucuda çalıştırıldı):**\n"
+            f"{lines}\n"
+            "    Puanlamada bu sonuçları esas al, kodu zihinsel olarak çalıştırarak tahmin etme.\n"
         )
+
+    return USER_PROMPT_TEMPLATE.format(
+        description=request.assignmentDescription,
+        language=request.assignmentLanguage,
+        code=request.studentCode,
+        level=request.studentLevel,
+        test_report=test_report,
+    )
+
+def _prepare_prompt(request: SubmissionRequest, test_results: Optional[List[UnitTestResult]] = None) -> Tuple[str, TokenUsage]:
+    """Renders the prompt from the budgeted inputs and estimates its size."""
+    prepared, usage = budget_request(request)
+    prompt = _build_prompt(prepared, test_results)
+    usage.estimatedInputTokens = estimate_tokens(prompt) + SYSTEM_INSTRUCTION_TOKENS.get(request.studentLevel, 0)
+    return prompt, usage
+
+def _system_instruction(level: str) -> str:
+    return SYSTEM_INSTRUCTIONS.get(level) or get_system_instruction(level)
+
+def _finish_usage(usage: TokenUsage, response: Optional[ProviderResponse]) -> TokenUsage:
+    """Adds the counts reported by the provider (when present) and records the request."""
+    if response is not None:
+        usage.promptTokens = response.prompt_tokens
+        usage.outputTokens = response.output_tokens
+        usage.totalTokens = response.total_tokens
+    record_usage(usage)
+    return usage
+
+def _generate_grading(request: SubmissionRequest, test_results: Optional[List[UnitTestResult]] = None,
+                      max_output_tokens: Optional[int] = None) -> GradingResult:
+    prompt, usage = _prepare_prompt(request, test_results)
+    if max_output_tokens:
+        usage.maxOutputTokens = max_output_tokens
+    system_instruction = _system_instruction(request.studentLevel)
+    response = provider.generate(request.studentLevel, system_instruction, prompt, usage.maxOutputTokens)
+    if response.finish_reason == "MAX_TOKENS" and usage.maxOutputTokens < MAX_OUTPUT_TOKENS:
+        # The adaptive limit was too tight and the JSON is cut off
+        print(f"Output limit of {usage.maxOutputTokens} tokens reached, retrying with {MAX_OUTPUT_TOKENS}")
+        usage.maxOutputTokens = MAX_OUTPUT_TOKENS
+        response = provider.generate(request.studentLevel, system_instruction, prompt, usage.maxOutputTokens)
+    text = response.text.strip()
+    if GRADING_DEBUG:
+        print(f"DEBUG: AI Response: {text}")
+    
+    # Parse JSON response
+    result_json = json.loads(text)
+    result = GradingResult(**result_json)
+    if test_results is not None:
+        # Executed results replace the model's guesses
+        result.unitTests = test_results
+    result.tokenUsage = _finish_usage(usage, response)
+    return result
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+from sqlalchemy import Date, String, and_, case, delete, func, insert, select
+from sqlalchemy.orm import Session
+from .models import User, Submission, Assignment, StudentAssignmentStanding, StudentStanding
+
+# Leaderboard standings are materialized per student and assignment (best attempt) and
+# per student (totals, streak). Writes that change a student's submissions or grades call
+# refresh_standings in their own transaction; rebuild_standings / diff_standings recompute
+# everything from the raw submissions (migration, check_standings.py).
+
+# (total_xp, score_sum, assignments, completed_tasks, last_submission_date, streak_days) of a student without submissions
+EMPTY_TOTALS = (0, 0, 0, 0, None, 0)
+
+
+def early_bird_deadline(created_at, dialect_name: str):
+    """created_at + 24 hours in SQL (the Early Bird bonus limit)."""
+    if dialect_name == "sqlite":
+        # SQLite stores DateTime as 'YYYY-MM-DD HH:MM:SS.ffffff' text: move the date, keep the fraction
+        return func.strftime("%Y-%m-%d %H:%M:%S", created_at, "+1 day", type_=String).concat(func.substr(created_at, 20))
+    return created_at + timedelta(hours=24)
+
+
+def best_attempts(dialect_name: str, *filters):
+    """
+    Best attempt per (student, assignment) among the submissions matching `filters`:
+    the highest score, and the most XP among the attempts with that score.
+    """
+    # Every attempt: score (NULL grade = 0) + Clean Code (> 95: +5) + Early Bird (within 24h of the assignment: +10)
+    score = func.coalesce(Submission.grade, 0)
+    early_bird = and_(
+        Assignment.created_at.isnot(None),
+        Submission.submitted_at <= early_bird_deadline(Assignment.created_at, dialect_name),
+    )
+    attempts = select(
+        Submission.user_id,
+        Submission.organization_id,
+        Submission.assignment_id,
+        score.label("score"),
+        (score + case((score > 95, 5), else_=0) + case((early_bird, 10), else_=0)).label("xp"),
+        func.max(score).over(partition_by=(Submission.user_id, Submission.assignment_id)).label("best_score"),
+    ).outerjoin(Assignment, Assignment.id == Submission.assignment_id).filter(
+        *filters, Submission.assignment_id.isnot(None)
+    ).subquery()
+
+    return select(
+        attempts.c.user_id,
+        attempts.c.organization_id,
+        attempts.c.assignment_id,
+        attempts.c.best_score,
+        func.max(attempts.c.xp).label("xp"),
+    ).filter(attempts.c.score == attempts.c.best_score).group_by(
+        attempts.c.user_id, attempts.c.organization_id, attempts.c.assignment_id, attempts.c.best_score
+    )
+
+
+def streak_state(days) -> tuple:
+    """(last day, consecutive days ending on it) of a student's submission days."""
+    days = sorted(set(days))
+    if not days:
+        return None, 0
+    streak = 1
+    for i in range(len(days) - 1, 0, -1):
+        if (days[i] - days[i - 1]).days != 1:
+            break
+        streak += 1
+    return days[-1], streak
+
+
+def has_streak(last_day, streak_days: int, today) -> bool:
+    """3+ consecutive submission days ending today or yesterday."""
+    return last_day is not None and (today - last_day).days <= 1 and streak_days >= 3
+
+
+def _submission_day():
+    return func.date(Submission.submitted_at, type_=Date)
+
+
+def refresh_standings(db: Session, user_id: int, assignment_ids: Iterable[Optional[int]] = ()) -> StudentStanding:
+    """
+    Brings a student's standings up to date after their submissions changed, in the
+    caller's transaction: the best attempt of each assignment in `assignment_ids`,
+    then the totals and the streak. Only this student's rows are read.
+    """
+    db.flush() # The sessions do not autoflush: the caller's pending changes must be visible below
+    # The totals row is locked first (PostgreSQL) so concurrent writes for one student queue up
+    standing = db.query(StudentStanding).filter(StudentStanding.user_id == user_id).with_for_update().first()
+    if standing is None:
+        organization_id = db.query(User.organization_id).filter(User.id == user_id).scalar()
+        standing = StudentStanding(user_id=user_id, organization_id=organization_id)
+        db.add(standing)
+
+    assignment_ids = sorted({assignment_id for assignment_id in assignment_ids if assignment_id is not None})
+    if assignment_ids:
+        db.execute(delete(StudentAssignmentStanding).where(
+            StudentAssignmentStanding.user_id == user_id, StudentAssignmentStanding.assignment_id.in_(assignment_ids)
+        ))
+        best = db.execute(best_attempts(
+            db.get_bind().dialect.name, Submission.user_id == user_id, Submission.assignment_id.in_(assignment_ids)
+        )).all()
+        if best:
+            db.execute(insert(StudentAssignmentStanding), [row._asdict() for row in best])
+
+    totals = db.execute(select(
+        func.coalesce(func.sum(StudentAssignmentStanding.xp), 0),
+        func.coalesce(func.sum(StudentAssignmentStanding.best_score), 0),
+        func.count(),
+        func.coalesce(func.sum(case((StudentAssignmentStanding.best_score >= 1, 1), else_=0)), 0),
+    ).filter(StudentAssignmentStanding.user_id == user_id)).one()
+    standing.total_xp, standing.score_sum, standing.assignments, standing.completed_tasks = totals
+    days = db.execute(select(_submission_day()).filter(Submission.user_id == user_id).distinct()).scalars().all()
+    standing.last_submission_date, standing.streak_days = streak_state(days)
+    standing.updated_at = datetime.utcnow()
+    db.flush()
+    return standing
+
+
+def computed_standings(db: Session, organization_id: Optional[int] = None) -> tuple:
+    """
+    Standings recomputed from the raw submissions (of one organization):
+    ({(user_id, assignment_id): (organization_id, best_score, xp)}, {user_id: (organization_id, totals)}).
+    """
+    scope = [Submission.organization_id == organization_id] if organization_id is not None else []
+    best = {}
+    for row in db.execute(best_attempts(db.get_bind().dialect.name, *scope)):
+        best[(row.user_id, row.assignment_id)] = (row.organization_id, row.best_score, row.xp)
+
+    days_by_user, organization_of = {}, {}
+    for user_id, user_organization_id, day in db.execute(
+        select(Submission.user_id, Submission.organization_id, _submission_day()).filter(*scope).distinct()
+    ):
+        days_by_user.setdefault(user_id, []).append(day)
+        organization_of[user_id] = user_organization_id
+
+    sums = {}
+    for (user_id, _), (_, best_score, xp) in best.items():
+        total_xp, score_sum, assignments, completed = sums.get(user_id, (0, 0, 0, 0))
+        sums[user_id] = (total_xp + xp, score_sum + best_score, assignments + 1, completed + (best_score >= 1))
+    totals = {
+        user_id: (organization_of[user_id], sums.get(user_id, (0, 0, 0, 0)) + streak_state(days))
+        for user_id, days in days_by_user.items()
+    }
+    return best, totals
+
+
+def _stored_standings(db: Session, organization_id: Optional[int] = None) -> tuple:
+    best_scope = [StudentAssignmentStanding.organization_id == organization_id] if organization_id is not None else []
+    totals_scope = [StudentStanding.organization_id == organization_id] if organization_id is not None else []
+    best = {
+        (row.user_id, row.assignment_id): (row.organization_id, row.best_score, row.xp)
+        for row in db.execute(select(
+            StudentAssignmentStanding.user_id, StudentAssignmentStanding.assignment_id,
+            StudentAssignmentStanding.organization_id, StudentAssignmentStanding.best_score, StudentAssignmentStanding.xp,
+        ).filter(*best_scope))
+    }
+    totals = {
+        row.user_id: (row.organization_id, (row.total_xp, row.score_sum, row.assignments, row.completed_tasks,
+                                            row.last_submission_date, row.streak_days))
+        for row in db.execute(select(StudentStanding).filter(*totals_scope)).scalars()
+    }
+    return best, totals
+
+
+def diff_standings(db: Session, organization_id: Optional[int] = None) -> list:
+    """
+    Differences between the stored standings and the ones recomputed from the raw
+    submissions: (user_id, assignment_id or None for the totals, stored, computed).
+    """
+    stored_best, stored_totals = _stored_standings(db, organization_id)
+    computed_best, computed_totals = computed_standings(db, organization_id)
+    differences = []
+    for key in sorted(stored_best.keys() | computed_best.keys()):
+        stored, computed = stored_best.get(key), computed_best.get(key)
+        if stored != computed:
+            differences.append((key[0], key[1], stored, computed))
+    for user_id in sorted(stored_totals.keys() | computed_totals.keys()):
+        # A student whose submissions were all deleted keeps an all-zero row
+        stored = stored_totals.get(user_id, (None, EMPTY_TOTALS))[1]
+        computed = computed_totals.get(user_id, (None, EMPTY_TOTALS))[1]
+        if stored != computed:
+            differences.append((user_id, None, stored, computed))
+    return differences
+
+
+def rebuild_standings(db: Session, organization_id: Optional[int] = None) -> int:
+    """Replaces the standings (of one organization) with ones recomputed from the raw submissions; returns the student count."""
+    best, totals = computed_standings(db, organization_id)
+    best_scope = [StudentAssignmentStanding.organization_id == organization_id] if organization_id is not None else []
+    totals_scope = [StudentStanding.organization_id == organization_id] if organization_id is not None else []
+    db.execute(delete(StudentAssignmentStanding).where(*best_scope))
+    db.execute(delete(StudentStanding).where(*totals_scope))
+    if best:
+        db.execute(insert(StudentAssignmentStanding), [
+            {"user_id": user_id, "assignment_id": assignment_id, "organization_id": row_organization_id,
+             "best_score": best_score, "xp": xp}
+            for (user_id, assignment_id), (row_organization_id, best_score, xp) in best.items()
+        ])
+    now = datetime.utcnow()
+    if totals:
+        db.execute(insert(StudentStanding), [
+            {"user_id": user_id, "organization_id": user_organization_id, "total_xp": total_xp, "score_sum": score_sum,
+             "assignments": assignments, "completed_tasks": completed, "last_submission_date": last_day,
+             "streak_days": streak_days, "updated_at": now}
+            for user_id, (user_organization_id, (total_xp, score_sum, assignments, completed, last_day, streak_days))
+            in totals.items()
+        ])
+    db.commit()
+    return len(totals)
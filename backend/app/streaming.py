@@ -0,0 +1,60 @@
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class PartialObjectParser:
+    """
+    Incremental parser for a streamed JSON object. `feed` accepts the next
+    chunk of text and returns the top-level (key, value) pairs that became
+    complete with it, so fields can be forwarded before the object is closed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = None  # index right after the last consumed field
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, index: int, chars: str) -> int:
+        while index < len(self.buffer) and self.buffer[index] in chars:
+            index += 1
+        return index
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self.buffer += text
+        fields = []
+
+        if self._pos is None:
+            start = self.buffer.find("{")
+            if start < 0:
+                return fields
+            self._pos = start + 1
+
+        while True:
+            index = self._skip(self._pos, _WHITESPACE + ",")
+            if index >= len(self.buffer) or self.buffer[index] != '"':
+                break
+            try:
+                key, index = self._decoder.raw_decode(self.buffer, index)
+            except json.JSONDecodeError:
+                break
+
+            index = self._skip(index, _WHITESPACE)
+            if index >= len(self.buffer) or self.buffer[index] != ":":
+                break
+            index = self._skip(index + 1, _WHITESPACE)
+            if index >= len(self.buffer):
+                break
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, index)
+            except json.JSONDecodeError:
+                break
+            # A number (or literal) at the very end of the buffer may still grow
+            if end >= len(self.buffer):
+                break
+
+            fields.append((key, value))
+            self._pos = end
+
+        return fields
@@ -0,0 +1,245 @@
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from .database import SessionLocal
+from .models import GradingUsageRollup
+
+TELEMETRY_ENABLED = os.getenv("GRADING_TELEMETRY_ENABLED", "true").lower() not in ("0", "false", "no")
+# Pending rollups are written to the database at most this often
+FLUSH_SECONDS = float(os.getenv("GRADING_TELEMETRY_FLUSH_SECONDS", "60"))
+# USD per million tokens; defaults follow the public Gemini Flash price list, override per contract
+PRICE_INPUT_PER_MTOK = float(os.getenv("GRADING_PRICE_INPUT_PER_MTOK", "0.50"))
+PRICE_OUTPUT_PER_MTOK = float(os.getenv("GRADING_PRICE_OUTPUT_PER_MTOK", "3.00"))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# Outcomes that did not call the model
+LOCAL_OUTCOMES = ("cache_hit", "precheck", "coalesced", "not_configured", "unavailable")
+
+
+class GradingTrace:
+    """What one grading did; filled in along the pipeline and recorded at the end."""
+
+    def __init__(self, model: str, level: str, organization_id: Optional[int] = None,
+                 assignment_id: Optional[int] = None, streamed: bool = False):
+        self.model = model
+        self.level = level
+        self.organization_id = organization_id
+        self.assignment_id = assignment_id
+        self.streamed = streamed
+        self.outcome = "error"
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.model_seconds = 0.0
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    def use_result(self, result):
+        """Takes the token counts of a fresh model answer."""
+        usage = getattr(result, "tokenUsage", None)
+        if usage is not None:
+            self.prompt_tokens = usage.promptTokens or usage.estimatedInputTokens or 0
+            self.output_tokens = usage.outputTokens or 0
+
+    def finish(self):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self._started
+
+    @property
+    def cost_usd(self) -> float:
+        return (self.prompt_tokens * PRICE_INPUT_PER_MTOK + self.output_tokens * PRICE_OUTPUT_PER_MTOK) / 1_000_000
+
+
+class _Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class GradingTelemetry:
+    """
+    In-process counters and latency histograms of every grading (rendered for
+    /metrics in the Prometheus text format) plus hourly rollups that are
+    persisted to the `grading_usage_rollups` table.
+    """
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, flush_seconds: float = FLUSH_SECONDS):
+        self.enabled = enabled
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple, int] = {}        # (model, outcome, organization) -> count
+        self._tokens: Dict[Tuple, int] = {}          # (model, organization, direction) -> tokens
+        self._cost: Dict[Tuple, float] = {}          # (model, organization) -> USD
+        self._retries: Dict[str, int] = {}           # model -> retries
+        self._latency: Dict[str, _Histogram] = {}    # outcome -> end-to-end latency
+        self._model_latency: Dict[str, _Histogram] = {}  # model -> time spent in provider calls
+        self._pending: Dict[Tuple, dict] = {}        # rollup key -> increments not yet written
+        self._flusher = None
+        self.flush_errors = 0
+        self.flushes = 0
+
+    def record(self, trace: GradingTrace):
+        if not self.enabled:
+            return
+        trace.finish()
+        organization = trace.organization_id if trace.organization_id is not None else "none"
+        called_model = trace.outcome not in LOCAL_OUTCOMES
+        with self._lock:
+            key = (trace.model, trace.outcome, organization)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for direction, tokens in (("prompt", trace.prompt_tokens), ("output", trace.output_tokens)):
+                if tokens:
+                    token_key = (trace.model, organization, direction)
+                    self._tokens[token_key] = self._tokens.get(token_key, 0) + tokens
+            if trace.cost_usd:
+                cost_key = (trace.model, organization)
+                self._cost[cost_key] = self._cost.get(cost_key, 0.0) + trace.cost_usd
+            if trace.retries:
+                self._retries[trace.model] = self._retries.get(trace.model, 0) + trace.retries
+            self._latency.setdefault(trace.outcome, _Histogram()).observe(trace.seconds)
+            if called_model and trace.model_seconds:
+                self._model_latency.setdefault(trace.model, _Histogram()).observe(trace.model_seconds)
+
+            bucket = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+            rollup = self._pending.setdefault((bucket, trace.organization_id, trace.assignment_id, trace.model), {
+                "requests": 0, "model_calls": 0, "cache_hits": 0, "errors": 0, "retries": 0,
+                "prompt_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "latency_ms_sum": 0.0, "latency_ms_max": 0.0,
+            })
+            latency_ms = trace.seconds * 1000
+            rollup["requests"] += 1
+            rollup["model_calls"] += int(called_model)
+            rollup["cache_hits"] += int(trace.outcome == "cache_hit")
+            rollup["errors"] += int(trace.outcome in ("error", "unavailable"))
+            rollup["retries"] += trace.retries
+            rollup["prompt_tokens"] += trace.prompt_tokens
+            rollup["output_tokens"] += trace.output_tokens
+            rollup["cost_usd"] += trace.cost_usd
+            rollup["latency_ms_sum"] += latency_ms
+            rollup["latency_ms_max"] = max(rollup["latency_ms_max"], latency_ms)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or self.flush_seconds <= 0:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="grading-telemetry", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self) -> int:
+        """Adds the pending rollups to the database; returns the number of rows touched."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        db = SessionLocal()
+        try:
+            for (bucket, organization_id, assignment_id, model), values in pending.items():
+                row = db.query(GradingUsageRollup).filter(
+                    GradingUsageRollup.bucket_start == bucket,
+                    GradingUsageRollup.organization_id == organization_id,
+                    GradingUsageRollup.assignment_id == assignment_id,
+                    GradingUsageRollup.model_name == model,
+                ).first()
+                if row is None:
+                    row = GradingUsageRollup(bucket_start=bucket, organization_id=organization_id,
+                                             assignment_id=assignment_id, model_name=model)
+                    db.add(row)
+                for name, value in values.items():
+                    if name == "latency_ms_max":
+                        row.latency_ms_max = max(row.latency_ms_max or 0.0, value)
+                    else:
+                        setattr(row, name, (getattr(row, name) or 0) + value)
+                row.updated_at = datetime.utcnow()
+            db.commit()
+            with self._lock:
+                self.flushes += 1
+            return len(pending)
+        except Exception as e:
+            print(f"Grading telemetry flush warning: {e}")
+            db.rollback()
+            self.flush_errors += 1
+            # Keep the numbers for the next attempt
+            with self._lock:
+                for key, values in pending.items():
+                    current = self._pending.setdefault(key, dict.fromkeys(values, 0))
+                    for name, value in values.items():
+                        current[name] = max(current[name], value) if name == "latency_ms_max" else current[name] + value
+            return 0
+        finally:
+            db.close()
+
+    def pending_tokens(self, organization_id: Optional[int], since: datetime) -> int:
+        """Model tokens of an organization recorded since `since` but not flushed yet."""
+        with self._lock:
+            return sum(values["prompt_tokens"] + values["output_tokens"]
+                       for (bucket, organization, _, _), values in self._pending.items()
+                       if organization == organization_id and bucket >= since.replace(minute=0, second=0, microsecond=0))
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP codegrade_grading_requests_total Gradings by model, outcome and organization.",
+                      "# TYPE codegrade_grading_requests_total counter"]
+            for (model, outcome, organization), count in sorted(self._requests.items(), key=str):
+                lines.append(f"codegrade_grading_requests_total{_labels(model=model, outcome=outcome, organization=organization)} {count}")
+
+            lines += ["# HELP codegrade_grading_tokens_total Model tokens by direction (prompt/output).",
+                      "# TYPE codegrade_grading_tokens_total counter"]
+            for (model, organization, direction), tokens in sorted(self._tokens.items(), key=str):
+                lines.append(f"codegrade_grading_tokens_total{_labels(model=model, organization=organization, direction=direction)} {tokens}")
+
+            lines += ["# HELP codegrade_grading_cost_usd_total Estimated model cost in USD.",
+                      "# TYPE codegrade_grading_cost_usd_total counter"]
+            for (model, organization), cost in sorted(self._cost.items(), key=str):
+                lines.append(f"codegrade_grading_cost_usd_total{_labels(model=model, organization=organization)} {cost:.6f}")
+
+            lines += ["# HELP codegrade_grading_retries_total Retried provider calls.",
+                      "# TYPE codegrade_grading_retries_total counter"]
+            for model, retries in sorted(self._retries.items()):
+                lines.append(f"codegrade_grading_retries_total{_labels(model=model)} {retries}")
+
+            for name, help_text, histograms, label in (
+                ("codegrade_grading_latency_seconds", "End-to-end grading latency.", self._latency, "outcome"),
+                ("codegrade_model_latency_seconds", "Time spent in provider calls, retries included.", self._model_latency, "model"),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for value, histogram in sorted(histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{_labels(**{label: value, 'le': bound})} {count}")
+                    lines.append(f"{name}_bucket{_labels(**{label: value, 'le': '+Inf'})} {histogram.total}")
+                    lines.append(f"{name}_sum{_labels(**{label: value})} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(**{label: value})} {histogram.total}")
+
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+grading_telemetry = GradingTelemetry()
@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+from typing import List, Tuple
+from .schemas import SubmissionRequest, TokenUsage
+
+# Input budgets in (estimated) tokens; everything above is cut with a visible marker
+CODE_TOKEN_BUDGET = int(os.getenv("PROMPT_CODE_TOKEN_BUDGET", "8000"))
+DESCRIPTION_TOKEN_BUDGET = int(os.getenv("PROMPT_DESCRIPTION_TOKEN_BUDGET", "2000"))
+# Lines longer than this (minified files, log dumps) are clipped first
+MAX_LINE_CHARS = int(os.getenv("PROMPT_MAX_LINE_CHARS", "400"))
+
+MAX_OUTPUT_TOKENS = int(os.getenv("GRADING_MAX_OUTPUT_TOKENS", "8192"))
+ADAPTIVE_OUTPUT_TOKENS = os.getenv("GRADING_ADAPTIVE_OUTPUT_TOKENS", "true").lower() not in ("0", "false", "no")
+# Advanced feedback covers Big-O, security and alternatives, beginners get 1-2 short suggestions
+OUTPUT_TOKENS_BY_LEVEL = {"beginner": 2048, "intermediate": 3072, "advanced": 4096}
+
+# Word pieces of up to 4 characters and single punctuation marks: close enough to
+# SentencePiece counts for source code and Turkish prose, and free (no API call)
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+_DEFINITION_PATTERN = re.compile(r"^\s*(?:async\s+)?(?:def|class|function|func|fn)\s+(\w+)")
+
+_counters = {
+    "requests": 0,
+    "estimated_input_tokens": 0,
+    "prompt_tokens": 0,
+    "output_tokens": 0,
+    "truncated_code": 0,
+    "truncated_description": 0,
+}
+_counters_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_PATTERN.findall(text or ""))
+
+
+def budget_signature() -> str:
+    """Settings that change the rendered prompt; part of the prompt version."""
+    return f"code={CODE_TOKEN_BUDGET};description={DESCRIPTION_TOKEN_BUDGET};line={MAX_LINE_CHARS}"
+
+
+def _clip_long_lines(lines: List[str]) -> List[str]:
+    clipped = []
+    for line in lines:
+        if len(line) > MAX_LINE_CHARS:
+            line = f"{line[:MAX_LINE_CHARS]} … [satır kısaltıldı, toplam {len(line)} karakter]"
+        clipped.append(line)
+    return clipped
+
+
+def _collapse_repeats(lines: List[str]) -> List[str]:
+    collapsed = []
+    index = 0
+    while index < len(lines):
+        end = index
+        while end + 1 < len(lines) and lines[end + 1] == lines[index]:
+            end += 1
+        collapsed.append(lines[index])
+        if end - index >= 2:
+            collapsed.append(f"[… önceki satır {end - index} kez daha tekrarlanıyor]")
+        elif end > index:
+            collapsed.append(lines[index])
+        index = end + 1
+    return collapsed
+
+
+def _omission_marker(omitted: List[str]) -> str:
+    names = [m.group(1) for m in (_DEFINITION_PATTERN.match(line) for line in omitted) if m]
+    summary = ""
+    if names:
+        shown = ", ".join(names[:20]) + (" …" if len(names) > 20 else "")
+        summary = f" Çıkarılan bölümde tanımlananlar: {shown}."
+    return (
+        f"[… SİSTEM NOTU: uzunluk sınırı nedeniyle {len(omitted)} satır "
+        f"(~{sum(estimate_tokens(line) for line in omitted)} token) çıkarıldı.{summary} "
+        "Görmediğin kısmı eksik sayma, değerlendirmeyi görünen kısma göre yap. …]"
+    )
+
+
+def fit_to_budget(text: str, budget: int) -> Tuple[str, bool]:
+    """
+    Shrinks `text` to about `budget` tokens. Cheap lossless-ish steps first (long
+    lines, repeated lines), then keeps the head and the tail around a marker.
+    """
+    if estimate_tokens(text) <= budget:
+        return text, False
+
+    lines = _collapse_repeats(_clip_long_lines(text.splitlines()))
+    if estimate_tokens("\n".join(lines)) <= budget:
+        return "\n".join(lines), True
+
+    # Two thirds of the budget for the beginning (imports, main logic), the rest for the end
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    head_budget = budget * 2 // 3
+    head_count, used = 0, 0
+    while head_count < len(lines) and used + costs[head_count] <= head_budget:
+        used += costs[head_count]
+        head_count += 1
+    tail_start = len(lines)
+    while tail_start > head_count and used + costs[tail_start - 1] <= budget:
+        used += costs[tail_start - 1]
+        tail_start -= 1
+
+    omitted = lines[head_count:tail_start]
+    return "\n".join(lines[:head_count] + [_omission_marker(omitted)] + lines[tail_start:]), True
+
+
+def choose_max_output_tokens(student_level: str, code_tokens: int) -> int:
+    if not ADAPTIVE_OUTPUT_TOKENS:
+        return MAX_OUTPUT_TOKENS
+    # Longer code gets more line specific feedback
+    wanted = OUTPUT_TOKENS_BY_LEVEL.get(student_level, OUTPUT_TOKENS_BY_LEVEL["intermediate"]) + code_tokens // 4
+    return min(MAX_OUTPUT_TOKENS, wanted)
+
+
+def budget_request(request: SubmissionRequest) -> Tuple[SubmissionRequest, TokenUsage]:
+    """
+    Returns the request as it should be put into the prompt (oversized inputs cut
+    down) and the token accounting for it. `estimatedInputTokens` covers the
+    code and description only; the caller adds the rest of the prompt.
+    """
+    code, code_truncated = fit_to_budget(request.studentCode, CODE_TOKEN_BUDGET)
+    description, description_truncated = fit_to_budget(request.assignmentDescription, DESCRIPTION_TOKEN_BUDGET)
+    code_tokens = estimate_tokens(code)
+
+    prepared = request.model_copy(update={"studentCode": code, "assignmentDescription": description})
+    usage = TokenUsage(
+        estimatedInputTokens=code_tokens + estimate_tokens(description),
+        maxOutputTokens=choose_max_output_tokens(request.studentLevel, code_tokens),
+        codeTruncated=code_truncated,
+        descriptionTruncated=description_truncated,
+    )
+    return prepared, usage
+
+
+def record_usage(usage: TokenUsage):
+    with _counters_lock:
+        _counters["requests"] += 1
+        _counters["estimated_input_tokens"] += usage.estimatedInputTokens
+        _counters["prompt_tokens"] += usage.promptTokens or 0
+        _counters["output_tokens"] += usage.outputTokens or 0
+        _counters["truncated_code"] += int(usage.codeTruncated)
+        _counters["truncated_description"] += int(usage.descriptionTruncated)
+
+
+def get_token_stats() -> dict:
+    with _counters_lock:
+        return {
+            **_counters,
+            "code_token_budget": CODE_TOKEN_BUDGET,
+            "description_token_budget": DESCRIPTION_TOKEN_BUDGET,
+            "max_output_tokens": MAX_OUTPUT_TOKENS,
+            "adaptive_output_tokens": ADAPTIVE_OUTPUT_TOKENS,
+        }
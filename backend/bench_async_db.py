@@ -0,0 +1,168 @@
+"""
+Throughput of mixed API traffic on one worker (one event loop): the routers on
+AsyncSession (app/database.get_db, aiosqlite) against the same handlers
+written the old way, a sync Session queried inside `async def`, which
+blocks the event loop for every query.
+
+Traffic mix per client loop: 70% GET /users/me, 20% GET /assignments/,
+10% GET /submissions/ (first page) as the teacher of an organization with
+many submissions. Prints requests/s and latency per endpoint.
+
+A local SQLite file answers in microseconds, where aiosqlite's thread hop
+costs more than it saves. To model a database server, every statement
+waits `latency_ms` inside the driver (the sqlite3 trace callback runs in the
+thread executing the statement): on the event loop for the sync Session, in
+aiosqlite's thread for the AsyncSession. Use latency_ms=0 for plain SQLite.
+Keep `clients` below the pool size (5 + 10): past it the sync variant blocks
+the loop in a pool checkout that only the loop itself could satisfy.
+
+    python bench_async_db.py [seconds] [clients] [latency_ms] [submissions]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_async_'), 'bench.db')}")
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import event, func  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import Base, SessionLocal, engine, async_engine  # noqa: E402
+from app.models import Organization, User, Assignment, Submission  # noqa: E402
+from app.jwt_auth import create_access_token  # noqa: E402
+from app.pagination import LIST_PAGE_SIZE  # noqa: E402
+from app.routers.users import oauth2_scheme, user_from_token  # noqa: E402
+
+MIX = [("/users/me", 0.7), ("/assignments/", 0.2), ("/submissions/", 0.1)]
+
+
+def add_statement_latency(latency_ms: float):
+    def slow(statement):
+        time.sleep(latency_ms / 1000)
+
+    @event.listens_for(engine, "connect")
+    def _sync_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(slow)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _async_connect(dbapi_connection, connection_record):
+        # The sqlite3 connection owned by aiosqlite's worker thread
+        dbapi_connection.driver_connection._conn.set_trace_callback(slow)
+
+
+def seed(submissions: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Bench Org {random.random()}")
+        db.add(org)
+        db.flush()
+        teacher = User(organization_id=org.id, student_number="bench-teacher", full_name="Öğretmen", role="teacher")
+        students = [User(organization_id=org.id, student_number=f"bench-{i}", full_name=f"Öğrenci {i}", role="student")
+                    for i in range(200)]
+        db.add_all([teacher, *students])
+        db.flush()
+        assignments = [Assignment(organization_id=org.id, title=f"Ödev {i}", description="...", language="Python",
+                                  due_date="2030-01-01", student_level="beginner") for i in range(20)]
+        db.add_all(assignments)
+        db.flush()
+        rng = random.Random(1)
+        db.bulk_save_objects([
+            Submission(user_id=rng.choice(students).id, organization_id=org.id, assignment_id=rng.choice(assignments).id,
+                       code_content="print('merhaba')\n" * 10, grading_result='{"grade": 80}')
+            for _ in range(submissions)
+        ])
+        db.commit()
+        token = create_access_token({"sub": teacher.student_number, "user_id": teacher.id})
+        return {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+def legacy_app() -> FastAPI:
+    """The pre-async pattern: `async def` endpoints on the sync SessionLocal."""
+    legacy = FastAPI()
+
+    def get_sync_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_sync_db)):
+        return user_from_token(token, db)
+
+    @legacy.get("/users/me")
+    async def me(user: User = Depends(current_user)):
+        return {"full_name": user.full_name, "student_number": user.student_number, "role": user.role}
+
+    # Same queries and page size as the routers (first page of each list)
+    @legacy.get("/assignments/")
+    async def assignments(db: Session = Depends(get_sync_db), user: User = Depends(current_user)):
+        rows = db.query(Assignment.id, Assignment.title, func.substr(Assignment.description, 1, 200)) \
+            .filter(Assignment.organization_id == user.organization_id) \
+            .order_by(Assignment.id.desc()).limit(LIST_PAGE_SIZE + 1).all()
+        return {"items": [{"id": a[0], "title": a[1], "description_preview": a[2]} for a in rows[:LIST_PAGE_SIZE]]}
+
+    @legacy.get("/submissions/")
+    async def submissions(db: Session = Depends(get_sync_db), user: User = Depends(current_user)):
+        rows = db.query(Submission.id, Submission.user_id, User.full_name, Submission.grade, Submission.submitted_at) \
+            .join(User, User.id == Submission.user_id).filter(Submission.organization_id == user.organization_id) \
+            .order_by(Submission.submitted_at.desc(), Submission.id.desc()).limit(LIST_PAGE_SIZE + 1).all()
+        return {"items": [{"id": s[0], "user_id": s[1], "student_name": s[2], "grade": s[3], "submitted_at": s[4]}
+                          for s in rows[:LIST_PAGE_SIZE]]}
+
+    return legacy
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def drive(target: FastAPI, headers: dict, seconds: float, clients: int):
+    latencies = {path: [] for path, _ in MIX}
+    paths, weights = zip(*MIX)
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        stop = time.perf_counter() + seconds
+
+        async def loop(seed_value):
+            rng = random.Random(seed_value)
+            while time.perf_counter() < stop:
+                path = rng.choices(paths, weights)[0]
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies[path].append(time.perf_counter() - started)
+
+        await asyncio.gather(*(loop(i) for i in range(clients)))
+    return latencies
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    submissions = int(sys.argv[4]) if len(sys.argv) > 4 else 500
+    headers = seed(submissions)
+    engine.dispose()
+    if latency_ms:
+        add_statement_latency(latency_ms)
+
+    print(f"{seconds:.0f} s, {clients} concurrent clients, {latency_ms:g} ms per statement, "
+          f"{submissions} submissions in the organization")
+    print(f"{'sessions':9} {'endpoint':14} {'req':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, target in (("sync", legacy_app()), ("async", app)):
+        latencies = asyncio.run(drive(target, headers, seconds, clients))
+        total = sum(len(values) for values in latencies.values())
+        for path, values in latencies.items():
+            print(f"{name:9} {path:14} {len(values):>6} {len(values) / seconds:7.1f} "
+                  f"{percentile(values, 0.5) * 1000:8.1f} {percentile(values, 0.95) * 1000:8.1f}")
+        print(f"{name:9} {'total':14} {total:>6} {total / seconds:7.1f}")
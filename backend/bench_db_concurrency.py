@@ -0,0 +1,126 @@
+"""
+Concurrency benchmark of the SQLite engine profile (app/database.py).
+
+Writer threads insert submissions in small transactions (like POST
+/submissions) while reader threads run a leaderboard-style aggregate. Both
+run once against a bare engine (rollback journal, the old database.py) and
+once against make_engine() (WAL, busy_timeout, synchronous=NORMAL, cache/mmap).
+Prints the read latency, the write throughput and "database is locked" errors.
+
+    python bench_db_concurrency.py [seconds] [readers] [writers]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'unused.db')}")
+
+from app.database import Base, make_engine  # noqa: E402
+from app.models import Organization, User, Submission  # noqa: E402
+
+STUDENTS = 500
+SEED_SUBMISSIONS = 20000
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    org = Organization(name="Bench Org")
+    session.add(org)
+    session.flush()
+    users = [User(organization_id=org.id, student_number=f"b{i}", role="student") for i in range(STUDENTS)]
+    session.add_all(users)
+    session.flush()
+    rng = random.Random(1)
+    session.bulk_save_objects([
+        Submission(user_id=rng.choice(users).id, code_content="print(1)\n" * 20, grading_result='{"grade": 80}')
+        for _ in range(SEED_SUBMISSIONS)
+    ])
+    user_ids = [u.id for u in users]
+    session.commit()
+    session.close()
+    return user_ids
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def run(engine, user_ids, seconds, readers, writers):
+    Session = sessionmaker(bind=engine)
+    stop = time.monotonic() + seconds
+    reads, writes, errors = [], [], {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def reader():
+        while time.monotonic() < stop:
+            session = Session()
+            started = time.perf_counter()
+            try:
+                session.query(Submission.user_id, func.count(Submission.id)).group_by(Submission.user_id).all()
+                with lock:
+                    reads.append(time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+            finally:
+                session.close()
+
+    def writer(seed_value):
+        rng = random.Random(seed_value)
+        while time.monotonic() < stop:
+            session = Session()
+            try:
+                for _ in range(5):
+                    session.add(Submission(user_id=rng.choice(user_ids), code_content="print(2)\n" * 20,
+                                           grading_result='{"grade": 90}', submitted_at=datetime.utcnow()))
+                session.commit()
+                with lock:
+                    writes.append(1)
+            except OperationalError:
+                session.rollback()
+                with lock:
+                    errors["write"] += 1
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return reads, len(writes), errors
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    profiles = [
+        # What app/database.py used to build: default journal, the driver's 5 s lock timeout
+        ("bare", lambda url: create_engine(url, connect_args={"check_same_thread": False})),
+        ("tuned", make_engine),
+    ]
+    print(f"{seconds:.0f} s, {readers} readers, {writers} writers, {SEED_SUBMISSIONS} seeded submissions")
+    print(f"{'profile':8} {'journal':8} {'reads':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'commits':>8} {'locked r/w':>11}")
+    for name, factory in profiles:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "bench.db")
+        engine = factory(f"sqlite:///{path}")
+        user_ids = seed(engine)
+        with engine.connect() as connection:
+            journal = connection.execute(text("PRAGMA journal_mode")).scalar()
+        reads, commits, errors = run(engine, user_ids, seconds, readers, writers)
+        print(f"{name:8} {journal:8} {len(reads):>7} {percentile(reads, 0.5) * 1000:8.1f} "
+              f"{percentile(reads, 0.95) * 1000:8.1f} {max(reads, default=0) * 1000:8.1f} "
+              f"{commits:>8} {errors['read']:>5}/{errors['write']:<5}")
+        engine.dispose()
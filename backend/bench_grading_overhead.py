@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the per-call overhead of grade_submission's model call.
+
+A fake transport replaces the Gemini client, so only local work is measured:
+prompt rendering, GenerativeModel construction (schema conversion) and request
+building. Compares the old per-call construction with GeminiProvider's pooled models.
+
+    python bench_grading_overhead.py [iterations]
+"""
+import sys
+import json
+import time
+import google.generativeai as genai
+from google.generativeai import client as genai_client, protos
+from app import services
+from app.providers import GeminiProvider
+from app.schemas import SubmissionRequest
+
+CANNED = json.dumps({"grade": 90, "feedback": "Tamam", "codeQuality": "İyi", "suggestions": [], "unitTests": []})
+
+
+class FakeTransport:
+    def generate_content(self, request, **kwargs):
+        return protos.GenerateContentResponse(
+            candidates=[{"content": {"parts": [{"text": CANNED}], "role": "model"}, "finish_reason": 1}]
+        )
+
+
+def old_call(request):
+    # What grade_submission did before: rebuild the prompt and the model every time
+    generation_config = {
+        "temperature": 0.4,
+        "top_p": 1,
+        "top_k": 32,
+        "max_output_tokens": 8192,
+        "response_mime_type": "application/json",
+        "response_schema": services.GradingAnswer,
+    }
+    system_text = services.get_system_instruction(request.studentLevel)
+    final_prompt = f"{system_text}\n\n---\n\n{services._build_prompt(request)}"
+    model = genai.GenerativeModel(model_name=provider.model_name, generation_config=generation_config)
+    return model.generate_content(final_prompt).text
+
+
+def new_call(request):
+    prompt = services._build_prompt(request)
+    return provider.generate(request.studentLevel, services._system_instruction(request.studentLevel), prompt, 8192).text
+
+
+def measure(func, request, iterations):
+    func(request)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(request)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    genai_client.get_default_generative_client = lambda: FakeTransport()
+    provider = GeminiProvider(api_key="bench")
+
+    request = SubmissionRequest(
+        assignmentDescription="Kullanıcıdan alınan n için Fibonacci dizisini yazdır.",
+        assignmentLanguage="Python",
+        studentCode="def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n" * 20,
+        studentLevel="intermediate",
+    )
+
+    before = measure(old_call, request, iterations)
+    after = measure(new_call, request, iterations)
+    print(f"prompt version: {services.PROMPT_VERSION}")
+    print(f"per-call overhead before: {before:8.1f} µs")
+    print(f"per-call overhead after:  {after:8.1f} µs  ({before / after:.1f}x faster)")
@@ -0,0 +1,79 @@
+"""
+Simulation of the grading pool under skewed multi-tenant load.
+
+One organization submits a 300-student lab in a burst while three smaller ones
+submit steadily; organization 4's assignment is due in 10 minutes. Model calls
+are simulated with lognormal sleeps, so only the scheduling policy differs:
+
+- fifo: every request in one queue (the pool before app/scheduler.py)
+- fair: weighted fair share + deadline boost
+- fair+cap: same, with at most half of the pool per organization
+
+Prints the p50/p95/max wait for a slot per tenant.
+
+    python bench_grading_scheduler.py [service_ms] [capacity]
+"""
+import sys
+import random
+import asyncio
+import time
+from datetime import datetime, timedelta
+from app.scheduler import FairShareScheduler
+
+# tenant -> (submissions, arrival window in seconds, minutes until due or None)
+LOAD = {
+    1: (300, 1.0, None),
+    2: (20, 6.0, None),
+    3: (20, 6.0, 24 * 60),
+    4: (20, 6.0, 10),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def simulate(scheduler: FairShareScheduler, service_seconds: float, single_queue: bool = False, seed: int = 1):
+    rng = random.Random(seed)
+    waits = {tenant: [] for tenant in LOAD}
+
+    async def submission(tenant, delay, due_at):
+        await asyncio.sleep(delay)
+        queue_key = 0 if single_queue else tenant
+        started = time.perf_counter()
+        await scheduler.acquire(queue_key, None if single_queue else due_at)
+        waits[tenant].append(time.perf_counter() - started)
+        try:
+            await asyncio.sleep(rng.lognormvariate(0, 0.4) * service_seconds)
+        finally:
+            scheduler.release(queue_key)
+
+    tasks = []
+    for tenant, (count, window, due_minutes) in LOAD.items():
+        due_at = datetime.utcnow() + timedelta(minutes=due_minutes) if due_minutes else None
+        for _ in range(count):
+            tasks.append(submission(tenant, rng.uniform(0, window), due_at))
+    await asyncio.gather(*tasks)
+    return waits
+
+
+if __name__ == "__main__":
+    service_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 80
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    service_seconds = service_ms / 1000
+
+    policies = [
+        ("fifo", FairShareScheduler(capacity, weights={}, limits={}), True),
+        ("fair", FairShareScheduler(capacity, weights={}, limits={}), False),
+        ("fair+cap", FairShareScheduler(capacity, weights={}, limits={}, default_limit=max(1, capacity // 2)), False),
+    ]
+    print(f"capacity {capacity}, median model call {service_ms:.0f} ms, "
+          + ", ".join(f"org {t}: {n} subs/{w:.0f}s" for t, (n, w, _) in LOAD.items()))
+    print(f"{'policy':10} {'org':>4} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, scheduler, single_queue in policies:
+        waits = asyncio.run(simulate(scheduler, service_seconds, single_queue))
+        for tenant, values in waits.items():
+            print(f"{name:10} {tenant:>4} {len(values):>4} {percentile(values, 0.5) * 1000:9.0f} "
+                  f"{percentile(values, 0.95) * 1000:9.0f} {max(values) * 1000:9.0f}")
+        print(f"{'':10} boosted: {scheduler.stats()['boosted']}")
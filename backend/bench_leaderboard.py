@@ -0,0 +1,236 @@
+"""
+Leaderboard benchmark: GET /leaderboard/ (served from the materialized
+standings, app/standings.py) against the previous implementation, which loaded
+every submission row and grouped them per student in Python, on one
+organization with `students` x `assignments` x `attempts` submissions.
+
+The seeded submissions are inserted directly, so their standings are first
+built from the raw submissions (the SQL aggregation, timed as "rebuild").
+Checks that both versions return the same entries (XP, averages, completed
+tasks, streaks, badges; ties in XP may be ordered differently), then prints
+the time of each, of a board from the response cache (app/leaderboard_cache.py),
+of a 304 revalidation, and of one student's GET /leaderboard/me.
+
+    python bench_leaderboard.py [students] [assignments] [attempts] [runs] [org,class]
+
+The last argument picks the scopes the previous version runs on (default: class).
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_leaderboard_'), 'bench.db')}")
+
+import httpx  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import Organization, User, Assignment, Submission, UserBadge  # noqa: E402
+from app.jwt_auth import create_access_token  # noqa: E402
+from app.badges import BADGE_DEFINITIONS  # noqa: E402
+from app.standings import rebuild_standings  # noqa: E402
+from app.leaderboard_cache import leaderboard_cache  # noqa: E402
+
+
+def seed(students: int, assignments: int, attempts: int):
+    rng = random.Random(23)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        org_id = conn.execute(insert(Organization).values(name=f"Bench Org {rng.random()}").returning(Organization.id)).scalar()
+        conn.execute(insert(User), [{"organization_id": org_id, "student_number": "bench-teacher", "full_name": "Öğretmen",
+                                     "role": "teacher", "class_code": None}] + [
+            {"organization_id": org_id, "student_number": f"bench-{i:05d}", "full_name": f"Öğrenci {i}",
+             "role": "student", "class_code": f"10-{i % 4}"}
+            for i in range(students)
+        ])
+        user_ids = conn.execute(select(User.id).filter(User.organization_id == org_id, User.role == "student")).scalars().all()
+        teacher_id = conn.execute(select(User.id).filter(User.organization_id == org_id, User.role == "teacher")).scalar()
+        created = [now - timedelta(days=rng.randint(0, 60), minutes=rng.randint(0, 1440)) for _ in range(assignments)]
+        # A few assignments predate the created_at column (NULL: no Early Bird bonus)
+        conn.execute(insert(Assignment), [
+            {"organization_id": org_id, "title": f"Ödev {i}", "description": "...", "language": "Python",
+             "student_level": "beginner", "due_date": "2030-01-01", "created_at": None if i % 17 == 16 else created[i]}
+            for i in range(assignments)
+        ])
+        assignment_rows = conn.execute(
+            select(Assignment.id, Assignment.created_at).filter(Assignment.organization_id == org_id)
+        ).all()
+
+        batch = []
+        for user_id in user_ids:
+            for assignment_id, created_at in assignment_rows:
+                for _ in range(rng.randint(0, attempts * 2) if rng.random() < 0.1 else attempts):
+                    base = created_at or now - timedelta(days=30)
+                    # Around the 24 hour Early Bird limit, some exactly on it
+                    offset = rng.choice([timedelta(hours=24), timedelta(hours=rng.randint(1, 23)),
+                                         timedelta(hours=rng.randint(25, 200))])
+                    batch.append({
+                        "user_id": user_id, "organization_id": org_id, "assignment_id": assignment_id,
+                        "code_content": "print(1)", "grading_result": "{}",
+                        "grade": None if rng.random() < 0.02 else rng.choice([0, rng.randint(1, 100), 96, 100]),
+                        "submitted_at": min(base + offset, now),
+                    })
+            # Practice runs without an assignment, some on the last days (streaks)
+            for days_ago in rng.sample(range(0, 6), rng.randint(0, 4)):
+                batch.append({"user_id": user_id, "organization_id": org_id, "assignment_id": None,
+                              "code_content": "print(1)", "grading_result": "{}", "grade": 50,
+                              "submitted_at": now - timedelta(days=days_ago)})
+            if len(batch) > 20000:
+                conn.execute(insert(Submission), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Submission), batch)
+        conn.execute(insert(UserBadge), [
+            {"user_id": user_id, "organization_id": org_id, "badge_name": name}
+            for user_id in user_ids for name in rng.sample(sorted(BADGE_DEFINITIONS), rng.randint(0, 2))
+        ])
+    token = create_access_token({"sub": "bench-teacher", "user_id": teacher_id})
+    # bench-00001 is in class 10-1, so GET /leaderboard/me answers for both scopes
+    with engine.connect() as conn:
+        student_id = conn.execute(select(User.id).filter(User.organization_id == org_id, User.student_number == "bench-00001")).scalar()
+    student_token = create_access_token({"sub": "bench-00001", "user_id": student_id})
+    return org_id, {"Authorization": f"Bearer {token}"}, {"Authorization": f"Bearer {student_token}"}
+
+
+def previous_leaderboard(organization_id: int, class_code=None):
+    """The leaderboard before the SQL aggregation, unchanged apart from the sync session."""
+    db = SessionLocal()
+    try:
+        users_query = db.query(User).filter(User.role == "student", User.organization_id == organization_id)
+        if class_code:
+            users_query = users_query.filter(User.class_code == class_code)
+        students = users_query.all()
+        student_ids = [s.id for s in students]
+        submissions = db.query(
+            Submission.user_id, Submission.assignment_id, Submission.grade, Submission.submitted_at,
+            Assignment.created_at.label("assignment_created_at"),
+        ).outerjoin(Assignment, Assignment.id == Submission.assignment_id).filter(Submission.user_id.in_(student_ids)).all()
+        user_badges_map = {}
+        for b in db.query(UserBadge).filter(UserBadge.user_id.in_(student_ids)).all():
+            user_badges_map.setdefault(b.user_id, [])
+            if b.badge_name in BADGE_DEFINITIONS:
+                user_badges_map[b.user_id].append(b.badge_name)
+
+        leaderboard_data = []
+        for student in students:
+            student_subs = [s for s in submissions if s.user_id == student.id]
+            best_attempts = {}
+            for sub in student_subs:
+                score = sub.grade or 0
+                bonus_xp = 0
+                if score > 95:
+                    bonus_xp += 5
+                if sub.assignment_created_at:
+                    if sub.submitted_at <= sub.assignment_created_at + timedelta(hours=24):
+                        bonus_xp += 10
+                total_attempt_xp = score + bonus_xp
+                aid = sub.assignment_id
+                if aid is not None:
+                    if aid not in best_attempts:
+                        best_attempts[aid] = {"score": score, "xp": total_attempt_xp}
+                    elif score > best_attempts[aid]["score"]:
+                        best_attempts[aid] = {"score": score, "xp": total_attempt_xp}
+                    elif score == best_attempts[aid]["score"] and total_attempt_xp > best_attempts[aid]["xp"]:
+                        best_attempts[aid]["xp"] = total_attempt_xp
+            submission_dates = sorted({s.submitted_at.date() for s in student_subs})
+            current_streak = 0
+            if submission_dates:
+                today = datetime.utcnow().date()
+                if (today - submission_dates[-1]).days <= 1:
+                    current_streak = 1
+                    for i in range(len(submission_dates) - 1, 0, -1):
+                        if (submission_dates[i] - submission_dates[i - 1]).days == 1:
+                            current_streak += 1
+                        else:
+                            break
+            avg_score = 0
+            if best_attempts:
+                avg_score = sum(item["score"] for item in best_attempts.values()) / len(best_attempts)
+            leaderboard_data.append({
+                "username": student.student_number,
+                "total_xp": sum(item["xp"] for item in best_attempts.values()),
+                "average_score": round(avg_score),
+                "completed_tasks": sum(1 for item in best_attempts.values() if item["score"] >= 1),
+                "streak": current_streak >= 3,
+                "badges": sorted(user_badges_map.get(student.id, [])),
+            })
+        leaderboard_data.sort(key=lambda x: x["total_xp"], reverse=True)
+        return leaderboard_data
+    finally:
+        db.close()
+
+
+async def fetch(headers: dict, class_code=None, path="/leaderboard/"):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        response = await client.get(path, params={"class_code": class_code} if class_code else None)
+        assert response.status_code in (200, 304), response.text
+        return response
+
+
+def uncached(headers: dict, class_code=None):
+    leaderboard_cache.clear()
+    return asyncio.run(fetch(headers, class_code)).json()
+
+
+def timed(function, runs: int):
+    durations, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return result, min(durations), sum(durations) / len(durations)
+
+
+def same_entries(previous: list, current: list) -> bool:
+    fields = ("total_xp", "average_score", "completed_tasks", "streak")
+    current_by_user = {
+        entry["username"]: {**{name: entry[name] for name in fields}, "badges": sorted(b["name"] for b in entry["badges"])}
+        for entry in current
+    }
+    previous_by_user = {entry["username"]: {name: value for name, value in entry.items() if name != "username"}
+                        for entry in previous}
+    ranked = [entry["total_xp"] for entry in sorted(current, key=lambda entry: entry["rank"])]
+    return current_by_user == previous_by_user and ranked == [entry["total_xp"] for entry in previous]
+
+
+if __name__ == "__main__":
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    assignments = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    attempts = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    runs = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    # The previous version is O(students x submissions): org-wide at the default size it runs for ~25 minutes
+    previous_scopes = sys.argv[5].split(",") if len(sys.argv) > 5 else ["class"]
+
+    started = time.perf_counter()
+    org_id, headers, student_headers = seed(students, assignments, attempts)
+    with engine.connect() as connection:
+        total = connection.execute(select(func.count()).filter(Submission.organization_id == org_id)).scalar()
+    print(f"{students} students x {assignments} assignments x {attempts} attempts: {total} submissions, "
+          f"seeded in {time.perf_counter() - started:.1f} s")
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rebuild_standings(db, org_id)
+    finally:
+        db.close()
+    print(f"rebuild of the standings from the submissions: {time.perf_counter() - started:.2f} s")
+
+    print(f"{'scope':6} {'version':8} {'best s':>8} {'mean s':>8} {'entries':>8}  identical")
+    for scope, class_code in (("org", None), ("class", "10-1")):
+        current, best, mean = timed(lambda: uncached(headers, class_code), runs)
+        print(f"{scope:6} {'table':8} {best:8.2f} {mean:8.2f} {len(current):>8}")
+        response, best, mean = timed(lambda: asyncio.run(fetch(headers, class_code)), runs)
+        print(f"{scope:6} {'cached':8} {best:8.3f} {mean:8.3f} {len(response.json()):>8}")
+        revalidate = {**headers, "If-None-Match": response.headers["etag"]}
+        response, best, mean = timed(lambda: asyncio.run(fetch(revalidate, class_code)), runs)
+        print(f"{scope:6} {'304':8} {best:8.3f} {mean:8.3f} {response.status_code:>8}")
+        mine, best, mean = timed(lambda: asyncio.run(fetch(student_headers, class_code, "/leaderboard/me")).json(), runs)
+        print(f"{scope:6} {'me':8} {best:8.3f} {mean:8.3f} {'#' + str(mine['rank']):>8}")
+        if scope in previous_scopes:
+            previous, best, mean = timed(lambda: previous_leaderboard(org_id, class_code), 1)
+            print(f"{scope:6} {'python':8} {best:8.2f} {mean:8.2f} {len(previous):>8}  {same_entries(previous, current)}")
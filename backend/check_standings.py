@@ -0,0 +1,47 @@
+import sys
+import argparse
+from app.database import SessionLocal, engine
+from app.models import Base
+from app.standings import diff_standings, rebuild_standings
+
+
+def describe(difference):
+    user_id, assignment_id, stored, computed = difference
+    target = f"ödev #{assignment_id}" if assignment_id is not None else "toplam"
+    return f"  öğrenci #{user_id}, {target}: kayıtlı {stored} / hesaplanan {computed}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Liderlik tablosu sıralamalarını ham teslimlerden yeniden hesaplar ve kayıtlı olanlarla karşılaştırır."
+    )
+    parser.add_argument("organization_id", type=int, nargs="?", help="Sadece bu kurum (varsayılan: hepsi)")
+    parser.add_argument("--fix", action="store_true", help="Farklar varsa sıralamaları yeniden oluştur")
+    args = parser.parse_args()
+
+    # The standings tables may not exist yet if the API has not been restarted since the upgrade
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        differences = diff_standings(db, args.organization_id)
+        if not differences:
+            print("✅ Sıralamalar teslimlerle tutarlı.")
+            return 0
+        print(f"❌ {len(differences)} fark bulundu (kayıtlı / hesaplanan):")
+        for difference in differences[:50]:
+            print(describe(difference))
+        if len(differences) > 50:
+            print(f"  ... ve {len(differences) - 50} fark daha")
+        if args.fix:
+            students = rebuild_standings(db, args.organization_id)
+            print(f"🔧 {students} öğrencinin sıralaması yeniden oluşturuldu.")
+            return 0
+        scope = f" {args.organization_id}" if args.organization_id is not None else ""
+        print(f"Düzeltmek için: python check_standings.py{scope} --fix")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
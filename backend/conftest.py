@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Tests must never touch the development database (sql_app.db), so point the
+# app at a throwaway SQLite file before anything imports app.database.
+_test_db_dir = tempfile.mkdtemp(prefix="codegrade_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}"
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+from app.database import SessionLocal, engine
+from app.models import Base, Assignment, RegradeRun
+from app.regrade import create_regrade_run, run_regrade, REGRADE_RATE_PER_MINUTE, REGRADE_CONCURRENCY
+
+
+def print_progress(progress):
+    print(f"[{progress['percent']:5.1f}%] {progress['processed']}/{progress['total']} işlendi, "
+          f"{progress['failed']} hatalı (checkpoint: #{progress['last_submission_id']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bir ödevin tüm teslimlerini yeniden değerlendirir.")
+    parser.add_argument("assignment_id", type=int, nargs="?", help="Ödev ID")
+    parser.add_argument("--latest", action="store_true", help="Sadece her öğrencinin son teslimini değerlendir")
+    parser.add_argument("--resume", type=int, metavar="RUN_ID", help="Yarıda kalan bir çalışmayı kaldığı yerden sürdür")
+    args = parser.parse_args()
+
+    # regrade_runs may not exist yet if the API has not been restarted since the upgrade
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.resume:
+            run = db.query(RegradeRun).filter(RegradeRun.id == args.resume).first()
+            if not run:
+                print(f"❌ Hata: #{args.resume} numaralı çalışma bulunamadı.")
+                return
+        else:
+            if args.assignment_id is None:
+                parser.error("assignment_id veya --resume gerekli")
+            assignment = db.query(Assignment).filter(Assignment.id == args.assignment_id).first()
+            if not assignment:
+                print(f"❌ Hata: #{args.assignment_id} numaralı ödev bulunamadı.")
+                return
+            run = create_regrade_run(db, assignment, mode="latest" if args.latest else "all")
+        run_id = run.id
+    finally:
+        db.close()
+
+    print(f"--- 🔁 Yeniden değerlendirme #{run_id} "
+          f"({REGRADE_RATE_PER_MINUTE:g} istek/dk, {REGRADE_CONCURRENCY} paralel) ---")
+    print(f"Yarıda kalırsa: python regrade_assignment.py --resume {run_id}")
+    result = asyncio.run(run_regrade(run_id, on_progress=print_progress))
+    print(f"✅ Tamamlandı: {result['processed'] - result['failed']} başarılı, {result['failed']} hatalı.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,29 @@
+import uuid
+from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
 from app.main import app
 from app.schemas import GradingResult
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app.models import Organization, User, Assignment, Submission
+from app.jwt_auth import create_access_token
+from app.standings import diff_standings, rebuild_standings
+from app.leaderboard_cache import leaderboard_cache
 
 client = TestClient(app)
 
+def auth_headers():
+    # Grading needs a logged-in user
+    db = SessionLocal()
+    try:
+        user = User(student_number=f"api-{uuid.uuid4().hex[:8]}", role="student")
+        db.add(user)
+        db.commit()
+        token = create_access_token({"sub": user.student_number, "user_id": user.id})
+        return {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -14,7 +34,7 @@ def test_grade_submission_schema_validation():
     response = client.post("/api/grade", json={
         "assignmentDescription": "Test assignment"
         # missing other fields
-    })
+    }, headers=auth_headers())
     assert response.status_code == 422
 
 def test_grade_submission_mock():
@@ -29,7 +49,7 @@ def test_grade_submission_mock():
         "studentLevel": "beginner"
     }
     
-    response = client.post("/api/grade", json=payload)
+    response = client.post("/api/grade", json=payload, headers=auth_headers())
     
     # If API KEY is missing, it returns a valid GradingResult with grade=0 and error message
     # If API KEY is present, it returns real result.
@@ -41,6 +61,115 @@ def test_grade_submission_mock():
     assert "feedback" in data
     assert "unitTests" in data
 
+def test_sqlite_connections_use_wal_profile():
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() > 0
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+
+def test_submission_list_pages_with_cursor():
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Page Org {uuid.uuid4()}")
+        db.add(org)
+        db.flush()
+        teacher = User(organization_id=org.id, student_number=f"t-{uuid.uuid4().hex[:8]}", role="teacher")
+        student = User(organization_id=org.id, student_number=f"s-{uuid.uuid4().hex[:8]}", role="student",
+                       full_name="Ada", password_hash="secret-hash")
+        db.add_all([teacher, student])
+        db.flush()
+        # Two submissions share a timestamp, so the id tie-break is exercised
+        same_time = datetime(2030, 1, 1, 12, 0)
+        for minutes in (0, 0, 5, 10, 15):
+            db.add(Submission(user_id=student.id, organization_id=org.id, code_content="print(1)",
+                              grading_result='{"grade": 50}', grade=50,
+                              submitted_at=same_time + timedelta(minutes=minutes)))
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': teacher.student_number, 'user_id': teacher.id})}"}
+    finally:
+        db.close()
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/submissions/", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 2
+        assert all("code_content" not in item for item in page["items"])
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    keys = [(item["submitted_at"], item["id"]) for item in seen]
+    assert len(seen) == 5 and keys == sorted(keys, reverse=True)
+    detail = client.get(f"/submissions/{seen[0]['id']}", headers=headers).json()
+    assert detail["code_content"] == "print(1)" and detail["student_name"] == "Ada"
+
+    students = client.get("/admin/students", headers=headers).json()["items"]
+    assert [s["full_name"] for s in students] == ["Ada"] and "password_hash" not in students[0]
+    assert client.get("/submissions/", params={"cursor": "bozuk"}, headers=headers).status_code == 400
+
+
+def test_leaderboard_keeps_best_attempt_rules():
+    now = datetime.utcnow()
+    created = now - timedelta(days=10)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Leaderboard Org {uuid.uuid4()}")
+        db.add(org)
+        db.flush()
+        teacher = User(organization_id=org.id, student_number=f"t-{uuid.uuid4().hex[:8]}", role="teacher")
+        ada, bob, cem = (User(organization_id=org.id, student_number=f"{name}-{uuid.uuid4().hex[:8]}", role="student",
+                              full_name=name) for name in ("ada", "bob", "cem"))
+        x, z = (Assignment(organization_id=org.id, title=t, created_at=created) for t in ("X", "Z"))
+        y = Assignment(organization_id=org.id, title="Y")  # Predates created_at (NULL below): no Early Bird
+        db.add_all([teacher, ada, bob, cem, x, y, z])
+        db.flush()
+        db.execute(text("UPDATE assignments SET created_at = NULL WHERE id = :id"), {"id": y.id})
+
+        def submit(user, assignment, grade, submitted_at):
+            db.add(Submission(user_id=user.id, organization_id=org.id, assignment_id=assignment.id if assignment else None,
+                              code_content="", grading_result="{}", grade=grade, submitted_at=submitted_at))
+
+        submit(ada, x, 80, created + timedelta(hours=2))    # best score, Early Bird: 90 XP
+        submit(ada, x, 80, created + timedelta(hours=30))   # same score, 80 XP
+        submit(ada, x, None, created + timedelta(hours=1))  # no grade counts as 0
+        submit(ada, y, 97, now - timedelta(days=5))         # Clean Code: 102 XP
+        submit(ada, z, 50, created + timedelta(hours=24))   # exactly on the Early Bird limit: 60 XP
+        submit(bob, x, 0, created + timedelta(hours=1))     # 10 XP, not completed
+        for days_ago in (0, 1, 2):
+            submit(bob, None, 100, now - timedelta(days=days_ago))  # practice: streak, no XP
+        db.commit()
+        # Inserted directly, not through the API: build their standings from the submissions
+        assert diff_standings(db, org.id)
+        rebuild_standings(db, org.id)
+        assert diff_standings(db, org.id) == []
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': teacher.student_number, 'user_id': teacher.id})}"}
+        bob_headers = {"Authorization": f"Bearer {create_access_token({'sub': bob.student_number, 'user_id': bob.id})}"}
+    finally:
+        db.close()
+
+    entries = client.get("/leaderboard/", headers=headers).json()
+
+    assert [(e["rank"], e["full_name"], e["total_xp"], e["average_score"], e["completed_tasks"], e["streak"])
+            for e in entries] == [
+        (1, "ada", 252, 76, 3, False),
+        (2, "bob", 10, 0, 0, True),
+        (3, "cem", 0, 0, 0, False),
+    ]
+    # Unchanged boards come from the cache, and as 304 to a client that already has them
+    hits = leaderboard_cache.stats()["hits"]
+    etag = client.get("/leaderboard/", headers=headers).headers["etag"]
+    assert client.get("/leaderboard/", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert leaderboard_cache.stats()["hits"] == hits + 2
+
+    # "My rank" counts the students ahead without fetching the list
+    mine = client.get("/leaderboard/me", headers=bob_headers).json()
+    assert (mine["rank"], mine["total_xp"], mine["streak"]) == (2, 10, True)
+    assert client.get("/leaderboard/me", headers=headers).status_code == 404
+
 if __name__ == "__main__":
     # verification script to run directly
     try:
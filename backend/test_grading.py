@@ -0,0 +1,674 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from google.api_core import exceptions as google_exceptions
+from app.main import app
+from app import services, regrade, resilience
+from app.database import SessionLocal
+from app.models import Organization, Assignment, User, Submission, GradingUsageRollup
+from app.rate_limit import TokenBucket
+from app.grading_cache import grading_cache
+from app.schemas import SubmissionRequest
+from app.streaming import PartialObjectParser
+from app.precheck import precheck_submission
+from app.sandbox import SandboxPool, SANDBOX_ENABLED
+from app.token_budget import CODE_TOKEN_BUDGET, estimate_tokens
+from app.providers import FakeProvider, RecordingProvider, ReplayProvider
+from app.telemetry import grading_telemetry
+from app.jwt_auth import create_access_token
+from app.scheduler import FairShareScheduler
+from app.scores import backfill_submission_scores
+from app.standings import diff_standings
+from app import grading_limits
+
+CANNED_RESULT = {
+    "grade": 87,
+    "feedback": "Güzel iş!",
+    "codeQuality": "İyi",
+    "suggestions": ["Değişken isimlerini netleştir"],
+    "unitTests": [{"testName": "hello", "passed": True, "message": "OK"}],
+}
+
+
+class CannedProvider(FakeProvider):
+    """Local provider answering CANNED_RESULT (or `text`) that remembers its calls."""
+    calls = 0
+    last_prompt = None
+    last_max_output_tokens = None
+
+    def __init__(self, text=None, **kwargs):
+        super().__init__(responses=[text or json.dumps(CANNED_RESULT)], **kwargs)
+
+    def generate(self, level, system_instruction, prompt, max_output_tokens):
+        CannedProvider.calls += 1
+        CannedProvider.last_prompt, CannedProvider.last_max_output_tokens = prompt, max_output_tokens
+        return super().generate(level, system_instruction, prompt, max_output_tokens)
+
+
+def make_request(code=None):
+    return SubmissionRequest(
+        assignmentDescription="Hello world yazdır",
+        assignmentLanguage="Python",
+        studentCode=code or f"print('hello')  # {uuid.uuid4()}",
+        studentLevel="beginner",
+    )
+
+
+def student_headers(organization_id=None, role="student"):
+    db = SessionLocal()
+    try:
+        if organization_id is None:
+            org = Organization(name=f"Grading Org {uuid.uuid4()}")
+            db.add(org)
+            db.commit()
+            organization_id = org.id
+        student = User(organization_id=organization_id, student_number=f"s-{uuid.uuid4().hex[:8]}", role=role)
+        db.add(student)
+        db.commit()
+        token = create_access_token({"sub": student.student_number, "user_id": student.id})
+        return {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+def use_fake_provider(monkeypatch, provider=None):
+    CannedProvider.calls = 0
+    monkeypatch.setattr(services, "provider", provider or CannedProvider())
+    monkeypatch.setattr(resilience, "RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(services, "grading_breaker", resilience.CircuitBreaker())
+
+
+def test_cache_hit_skips_model(monkeypatch):
+    use_fake_provider(monkeypatch)
+    request = make_request()
+
+    first = asyncio.run(services.grade_submission(request))
+    second = asyncio.run(services.grade_submission(request))
+
+    assert CannedProvider.calls == 1
+    assert first == second
+    assert second.grade == 87
+
+
+def test_cache_persistent_tier_survives_memory_loss(monkeypatch):
+    use_fake_provider(monkeypatch)
+    request = make_request()
+
+    asyncio.run(services.grade_submission(request))
+    grading_cache.clear_memory()
+    db_hits_before = grading_cache.stats()["db_hits"]
+
+    result = asyncio.run(services.grade_submission(request))
+
+    assert CannedProvider.calls == 1
+    assert result.grade == 87
+    assert grading_cache.stats()["db_hits"] == db_hits_before + 1
+
+
+def test_cache_key_depends_on_prompt_version(monkeypatch):
+    use_fake_provider(monkeypatch)
+    request = make_request()
+
+    asyncio.run(services.grade_submission(request))
+    monkeypatch.setattr(services, "PROMPT_VERSION", "test-bumped")
+    asyncio.run(services.grade_submission(request))
+
+    assert CannedProvider.calls == 2
+
+
+def test_failed_gradings_are_not_cached(monkeypatch):
+    use_fake_provider(monkeypatch, CannedProvider("not json"))
+    request = make_request()
+
+    first = asyncio.run(services.grade_submission(request))
+    asyncio.run(services.grade_submission(request))
+
+    assert first.grade == 0
+    # Unparseable answers are retried, but the fallback is never cached
+    assert CannedProvider.calls == 2 * resilience.RETRY_ATTEMPTS
+
+
+def test_grading_job_poll_and_events(monkeypatch):
+    use_fake_provider(monkeypatch)
+    client = TestClient(app)
+    payload = make_request().model_dump()
+    headers = student_headers()
+
+    created = client.post("/api/grade/jobs", json=payload, headers=headers)
+    assert created.status_code == 202
+    job_id = created.json()["job_id"]
+
+    with client.stream("GET", f"/api/grade/jobs/{job_id}/events", headers=headers) as stream:
+        events = [line[len("event: "):] for line in stream.iter_lines() if line.startswith("event: ")]
+    assert events[-1] == "done"
+
+    status = client.get(f"/api/grade/jobs/{job_id}", headers=headers).json()
+    assert status["status"] == "done"
+    assert status["result"]["grade"] == 87
+
+
+def test_grading_job_is_private_to_its_owner(monkeypatch):
+    use_fake_provider(monkeypatch)
+    client = TestClient(app)
+    job_id = client.post("/api/grade/jobs", json=make_request().model_dump(), headers=student_headers()).json()["job_id"]
+
+    assert client.get(f"/api/grade/jobs/{job_id}").status_code == 401
+    assert client.get(f"/api/grade/jobs/{job_id}/events").status_code == 401
+    # Another student (of another organization) cannot tell the job exists
+    other = student_headers()
+    assert client.get(f"/api/grade/jobs/{job_id}", headers=other).status_code == 404
+    assert client.get(f"/api/grade/jobs/{job_id}/events", headers=other).status_code == 404
+    assert client.get("/api/grade/jobs/does-not-exist", headers=other).status_code == 404
+
+
+def test_partial_object_parser_emits_completed_fields():
+    parser = PartialObjectParser()
+    text = json.dumps(CANNED_RESULT)
+
+    assert parser.feed(text[:12]) == []  # '{"grade": 87' - number may still grow
+    fields = parser.feed(text[12:40])
+    assert fields[0] == ("grade", 87)
+    rest = parser.feed(text[40:])
+
+    assert dict(fields + rest) == CANNED_RESULT
+
+
+def test_stream_grade_sends_fields_then_done(monkeypatch):
+    use_fake_provider(monkeypatch, CannedProvider(stream_chunk_chars=10))
+    client = TestClient(app)
+
+    with client.stream("POST", "/api/grade/stream", json=make_request().model_dump(), headers=student_headers()) as stream:
+        events = [line[len("event: "):] for line in stream.iter_lines() if line.startswith("event: ")]
+
+    assert events == ["field"] * len(CANNED_RESULT) + ["done"]
+    assert CannedProvider.calls == 1
+
+
+def seed_assignment_with_submissions(count):
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Regrade Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        assignment = Assignment(organization_id=org.id, title="Toplama", description="İki sayıyı topla",
+                                language="Python", student_level="beginner")
+        db.add(assignment)
+        db.commit()
+        for i in range(count):
+            student = User(organization_id=org.id, student_number=f"s{i}", role="student")
+            db.add(student)
+            db.commit()
+            db.add(Submission(user_id=student.id, assignment_id=assignment.id,
+                              code_content=f"print({i} + {i})", grading_result=json.dumps({"grade": 10})))
+        db.commit()
+        return assignment.id
+    finally:
+        db.close()
+
+
+def test_regrade_resumes_from_checkpoint(monkeypatch):
+    use_fake_provider(monkeypatch)
+    monkeypatch.setattr(regrade, "regrade_limiter", TokenBucket(rate=1000, capacity=1000))
+    monkeypatch.setattr(regrade, "REGRADE_BATCH_SIZE", 2)
+    assignment_id = seed_assignment_with_submissions(5)
+
+    db = SessionLocal()
+    try:
+        assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+        run = regrade.create_regrade_run(db, assignment)
+        submission_ids = [s.id for s in db.query(Submission).filter(Submission.assignment_id == assignment_id).order_by(Submission.id)]
+        # Pretend an earlier run was interrupted after the first batch
+        run.last_submission_id = submission_ids[1]
+        run.processed = 2
+        db.commit()
+        run_id = run.id
+    finally:
+        db.close()
+
+    progress = []
+    result = asyncio.run(regrade.run_regrade(run_id, on_progress=progress.append))
+
+    assert result["status"] == "completed"
+    assert result["processed"] == result["total"] == 5
+    assert CannedProvider.calls == 3
+    assert [p["processed"] for p in progress] == [4, 5]
+
+    db = SessionLocal()
+    try:
+        grades = [json.loads(s.grading_result)["grade"] for s in
+                  db.query(Submission).filter(Submission.assignment_id == assignment_id).order_by(Submission.id)]
+    finally:
+        db.close()
+    assert grades == [10, 10, 87, 87, 87]
+
+
+def test_syntax_error_skips_model(monkeypatch):
+    use_fake_provider(monkeypatch)
+    request = make_request("def add(a, b)\n    return a + b\n")
+
+    result = asyncio.run(services.grade_submission(request))
+
+    assert CannedProvider.calls == 0
+    assert result.grade == 0
+    assert result.codeQuality == "Sözdizimi Hatası"
+    assert result.unitTests[0].message.startswith("1. satır")
+
+
+def test_precheck_only_for_known_languages():
+    assert precheck_submission("Python 3", "print('ok')") is None
+    assert precheck_submission("python3", "print 'eski sözdizimi'") is not None
+    assert precheck_submission("Java", "public class {") is None
+    # Nesting the compiler cannot handle is left to the model instead of failing the request
+    assert precheck_submission("Python", "1+" * 200000 + "1") is None
+    assert precheck_submission("Python", "-" * 1000000 + "1") is None
+
+
+HIDDEN_TESTS = [
+    {"name": "toplama", "stdin": "1\n", "expected_output": None, "assertion": "assert topla(2, 3) == 5"},
+    {"name": "çıktı", "stdin": "4\n", "expected_output": "8", "assertion": None},
+    {"name": "sonsuz döngü", "stdin": "1\n", "expected_output": None, "assertion": "while True: pass"},
+]
+
+
+@pytest.mark.skipif(not SANDBOX_ENABLED, reason="sandbox needs os.fork")
+def test_hidden_tests_run_in_sandbox(monkeypatch):
+    use_fake_provider(monkeypatch)
+    pool = SandboxPool(size=1, limits={"cpu_seconds": 1, "memory_mb": 256, "wall_seconds": 2, "parallelism": 4})
+    monkeypatch.setattr(services, "sandbox_pool", pool)
+
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Sandbox Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        assignment = Assignment(title="Topla", description="İki sayıyı topla", language="Python",
+                                organization_id=org.id, hidden_tests=HIDDEN_TESTS)
+        db.add(assignment)
+        db.commit()
+        request = services.build_grading_request(assignment, "def topla(a, b):\n    return a + b\nn = int(input())\nprint(n * 2)\n")
+        organization_id = org.id
+    finally:
+        db.close()
+
+    result = asyncio.run(services.grade_submission(request, organization_id=organization_id))
+
+    assert CannedProvider.calls == 1
+    assert [(t.testName, t.passed) for t in result.unitTests] == [("toplama", True), ("çıktı", True), ("sonsuz döngü", False)]
+    assert result.unitTests[2].message == "Zaman sınırı aşıldı"
+    assert pool.stats()["tests"] == 3
+
+
+def test_hidden_tests_stay_in_their_organization(monkeypatch):
+    use_fake_provider(monkeypatch)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Hidden Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        assignment = Assignment(title="Topla", description="İki sayıyı topla", language="Python",
+                                organization_id=org.id, hidden_tests=HIDDEN_TESTS)
+        db.add(assignment)
+        db.commit()
+        assignment_id, organization_id = assignment.id, org.id
+    finally:
+        db.close()
+
+    # A student of another organization names the assignment: graded as if it named none
+    request = make_request().model_dump()
+    request["assignmentId"] = assignment_id
+    response = TestClient(app).post("/api/grade", json=request, headers=student_headers())
+
+    assert response.status_code == 200
+    assert [t["testName"] for t in response.json()["unitTests"]] == ["hello"]
+    assert "Beklenen" not in json.dumps(response.json(), ensure_ascii=False)
+    assert "toplama" not in CannedProvider.last_prompt
+    assert asyncio.run(services._load_assignment(SubmissionRequest(**request), organization_id + 1000)) == ([], None)
+    assert asyncio.run(services._load_assignment(SubmissionRequest(**request), organization_id))[0] == HIDDEN_TESTS
+
+
+@pytest.mark.skipif(not SANDBOX_ENABLED, reason="sandbox needs os.fork")
+def test_sandbox_verdicts_cannot_be_forged():
+    pool = SandboxPool(size=1, limits={"cpu_seconds": 1, "memory_mb": 256, "wall_seconds": 2, "parallelism": 4})
+    tests = HIDDEN_TESTS[:2]
+    forgeries = [
+        # Overwrites the worker's helpers in its own interpreter
+        "import __main__\n__main__._normalize = lambda s: ''\ndef topla(a, b):\n    return 0\n",
+        # Reaches for the caller's frame and exits before the assertion
+        "import os, sys\ntry:\n    os.write(sys._getframe(1).f_locals['result_fd'], b'{\"passed\": true}')\n"
+        "except Exception:\n    pass\nos._exit(0)\n",
+        "def topla(a, b):\n    import os\n    os._exit(0)\nprint(open('/etc/passwd').read())\n",
+    ]
+    for code in forgeries:
+        results = pool.run_tests(code, tests)
+        assert [t.passed for t in results] == [False, False]
+        assert all("root:" not in t.message for t in results)
+
+
+def test_oversized_code_is_budgeted(monkeypatch):
+    use_fake_provider(monkeypatch)
+    minified = "veri = [" + ",".join(str(i) for i in range(20000)) + "]\n"
+    code = minified + "".join(f"def adim_{i}():\n    return {i}\n" for i in range(4000))
+    request = make_request(code)
+
+    result = asyncio.run(services.grade_submission(request))
+
+    assert "SİSTEM NOTU" in CannedProvider.last_prompt
+    assert "satır kısaltıldı" in CannedProvider.last_prompt
+    assert estimate_tokens(CannedProvider.last_prompt) < CODE_TOKEN_BUDGET + 1000
+    usage = result.tokenUsage
+    assert usage.codeTruncated and not usage.descriptionTruncated
+    assert CannedProvider.last_max_output_tokens == usage.maxOutputTokens
+    assert usage.maxOutputTokens <= services.MAX_OUTPUT_TOKENS
+
+
+def test_transient_errors_retry_then_open_breaker(monkeypatch):
+    failures = {"left": 2}
+
+    class FlakyProvider(CannedProvider):
+        def generate(self, level, system_instruction, prompt, max_output_tokens):
+            if failures["left"] > 0:
+                CannedProvider.calls += 1
+                failures["left"] -= 1
+                raise google_exceptions.ServiceUnavailable("overloaded")
+            return super().generate(level, system_instruction, prompt, max_output_tokens)
+
+    use_fake_provider(monkeypatch, FlakyProvider())
+    monkeypatch.setattr(services, "grading_breaker", resilience.CircuitBreaker(failure_threshold=3, reset_seconds=60))
+
+    result = asyncio.run(services.grade_submission(make_request()))
+    assert result.grade == 87
+    assert CannedProvider.calls == 3
+
+    # A provider that keeps failing opens the breaker; later calls fail fast with 503
+    failures["left"] = 100
+    client = TestClient(app)
+    headers = student_headers()
+    response = client.post("/api/grade", json=make_request().model_dump(), headers=headers)
+    assert response.status_code == 503
+    assert services.grading_breaker.state == "open"
+
+    calls_before = CannedProvider.calls
+    response = client.post("/api/grade", json=make_request().model_dump(), headers=headers)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 0
+    assert CannedProvider.calls == calls_before
+
+
+def test_stream_failure_after_fields_reaches_breaker(monkeypatch):
+    class BrokenStreamProvider(CannedProvider):
+        def stream(self, level, system_instruction, prompt, max_output_tokens):
+            chunks = super().stream(level, system_instruction, prompt, max_output_tokens)
+            yield next(chunks)
+            yield next(chunks)
+            raise google_exceptions.ServiceUnavailable("overloaded")
+
+    use_fake_provider(monkeypatch, BrokenStreamProvider(stream_chunk_chars=20))
+    monkeypatch.setattr(services, "grading_breaker", resilience.CircuitBreaker(failure_threshold=1, reset_seconds=60))
+
+    async def collect():
+        return [event async for event in services.stream_grading(make_request())]
+
+    events = asyncio.run(collect())
+
+    # The grade was already shown, so the stream is not retried, but the breaker saw the failure
+    assert ("field", ("grade", 87)) in events
+    assert events[-1][0] == "done" and events[-1][1].grade == 0
+    assert CannedProvider.calls == 1
+    assert services.grading_breaker.state == "open"
+
+
+def test_identical_inflight_requests_share_one_call(monkeypatch):
+    use_fake_provider(monkeypatch, CannedProvider(latency_ms=200, latency_sigma=0))
+    request = make_request()
+    coalesced_before = services.get_concurrency_stats()["coalesced"]
+
+    async def burst():
+        return await asyncio.gather(*[services.grade_submission(request) for _ in range(5)])
+
+    results = asyncio.run(burst())
+
+    assert CannedProvider.calls == 1
+    assert all(r.grade == 87 for r in results)
+    assert services.get_concurrency_stats()["coalesced"] == coalesced_before + 4
+
+
+def test_requests_join_a_running_stream(monkeypatch):
+    use_fake_provider(monkeypatch, CannedProvider(latency_ms=300, latency_sigma=0, stream_chunk_chars=10))
+    request = make_request()
+
+    async def collect():
+        return [event async for event in services.stream_grading(request)]
+
+    async def burst():
+        stream = asyncio.ensure_future(collect())
+        while not services._inflight:
+            await asyncio.sleep(0.01)
+        graded = await asyncio.gather(*[services.grade_submission(request) for _ in range(2)])
+        streams = await asyncio.gather(stream, collect())
+        return graded, streams
+
+    graded, streams = asyncio.run(burst())
+
+    assert CannedProvider.calls == 1
+    assert all(r.grade == 87 for r in graded)
+    assert all(events[-1][0] == "done" and events[-1][1].grade == 87 for events in streams)
+    assert not services._inflight
+
+
+def test_cassette_record_and_replay(monkeypatch, tmp_path):
+    cassette = str(tmp_path / "grading.jsonl")
+    recorder = RecordingProvider(FakeProvider(seed=7), cassette)
+    request = make_request()
+    use_fake_provider(monkeypatch, recorder)
+    recorded = asyncio.run(services.grade_submission(request))
+
+    grading_cache.clear_memory()
+    replay = ReplayProvider(cassette, on_miss="error", replay_latency=False)
+    use_fake_provider(monkeypatch, replay)
+    # Replay uses its own model name, so this is a cache miss served from the cassette
+    replayed = asyncio.run(services.grade_submission(request))
+    other = asyncio.run(services.grade_submission(make_request()))
+
+    assert replayed.grade == recorded.grade and replayed.feedback == recorded.feedback
+    assert replay.stats()["hits"] == 1
+    assert other.grade == 0  # unknown prompt with on_miss="error"
+
+
+def test_grading_telemetry_per_organization(monkeypatch):
+    use_fake_provider(monkeypatch)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Telemetry Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        assignment = Assignment(title="Merhaba", description="Hello world yazdır", language="Python", organization_id=org.id)
+        db.add(assignment)
+        db.commit()
+        org_id, assignment_id = org.id, assignment.id
+        request = services.build_grading_request(assignment, f"print('hello')  # {uuid.uuid4()}")
+    finally:
+        db.close()
+
+    asyncio.run(services.grade_submission(request, organization_id=org_id))
+    asyncio.run(services.grade_submission(request, organization_id=org_id))
+
+    client = TestClient(app)
+    # Usage and cost per organization are not public
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=student_headers()).status_code == 403
+    metrics = client.get("/metrics", headers=student_headers(role="superadmin")).text
+    assert f'codegrade_grading_requests_total{{model="fake",outcome="graded",organization="{org_id}"}} 1' in metrics
+    assert f'codegrade_grading_requests_total{{model="fake",outcome="cache_hit",organization="{org_id}"}} 1' in metrics
+    assert "codegrade_grading_latency_seconds_bucket" in metrics
+
+    grading_telemetry.flush()
+    db = SessionLocal()
+    try:
+        rollup = db.query(GradingUsageRollup).filter(GradingUsageRollup.assignment_id == assignment_id).one()
+        assert (rollup.organization_id, rollup.requests, rollup.model_calls, rollup.cache_hits) == (org_id, 2, 1, 1)
+        assert rollup.prompt_tokens > 0 and rollup.cost_usd > 0
+    finally:
+        db.close()
+
+
+def test_submission_is_graded_on_the_server(monkeypatch):
+    use_fake_provider(monkeypatch)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Submission Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        assignment = Assignment(title="Merhaba", description="Hello world yazdır", language="Python",
+                                student_level="beginner", organization_id=org.id)
+        student = User(organization_id=org.id, student_number="s1", role="student", full_name="Ada")
+        db.add_all([assignment, student])
+        db.commit()
+        assignment_id = assignment.id
+        token = create_access_token({"sub": student.student_number, "user_id": student.id})
+    finally:
+        db.close()
+
+    board = TestClient(app).get("/leaderboard/", headers={"Authorization": f"Bearer {token}"})
+    response = TestClient(app).post(
+        "/submissions/",
+        json={"assignment_id": assignment_id, "code_content": "print('hello')",
+              "grading_result": json.dumps({"grade": 100})},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 200
+    assert CannedProvider.calls == 1
+    assert "Hello world yazdır" in CannedProvider.last_prompt
+    assert json.loads(response.json()["grading_result"])["grade"] == 87
+    assert response.json()["grade"] == 87
+    assert (response.json()["tests_passed"], response.json()["tests_total"]) == (1, 1)
+    db = SessionLocal()
+    try:
+        organization_id = db.get(Assignment, assignment_id).organization_id
+        assert db.get(Submission, response.json()["id"]).organization_id == organization_id
+    finally:
+        db.close()
+
+    # The standings follow the submission in the same transaction: 87 + Early Bird
+    headers = {"Authorization": f"Bearer {token}"}
+    # ... and the submission invalidated the cached board
+    board = TestClient(app).get("/leaderboard/", headers={**headers, "If-None-Match": board.headers["etag"]})
+    assert board.status_code == 200 and board.json()[0]["total_xp"] == 97
+    mine = TestClient(app).get("/leaderboard/me", headers=headers).json()
+    assert (mine["rank"], mine["total_xp"], mine["completed_tasks"]) == (1, 97, 1)
+    assert TestClient(app).delete(f"/submissions/{response.json()['id']}", headers=headers).status_code == 200
+    assert TestClient(app).get("/leaderboard/me", headers=headers).json()["total_xp"] == 0
+    db = SessionLocal()
+    try:
+        assert diff_standings(db, organization_id) == []
+    finally:
+        db.close()
+
+
+def test_backfill_fills_typed_score_columns():
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Backfill Org {uuid.uuid4()}")
+        db.add(org)
+        db.flush()
+        student = User(organization_id=org.id, student_number=f"bf-{uuid.uuid4()}", role="student")
+        db.add(student)
+        db.flush()
+        old = Submission(user_id=student.id, code_content="print(1)", grading_result=json.dumps(CANNED_RESULT))
+        broken = Submission(user_id=student.id, code_content="print(2)", grading_result="not json")
+        db.add_all([old, broken])
+        db.commit()
+
+        backfill_submission_scores(db, batch_size=1)
+        db.expire_all()
+
+        assert (old.grade, old.code_quality, old.tests_passed, old.tests_total) == (87, "İyi", 1, 1)
+        assert [(t.test_name, t.passed) for t in old.test_results] == [("hello", True)]
+        assert (broken.grade, broken.tests_total) == (0, 0)
+    finally:
+        db.close()
+
+
+def test_scheduler_shares_slots_and_boosts_deadlines():
+    scheduler = FairShareScheduler(capacity=1, weights={}, limits={})
+    order = []
+
+    async def job(tenant, due_at=None):
+        await scheduler.acquire(tenant, due_at)
+        order.append(tenant)
+        await asyncio.sleep(0.01)
+        scheduler.release(tenant)
+
+    async def run():
+        # A big lab queues first, then two other organizations show up
+        tasks = [asyncio.create_task(job(1)) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job(2)))
+        tasks.append(asyncio.create_task(job(3, datetime.utcnow() + timedelta(minutes=5))))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == [1, 3, 2, 1, 1, 1]
+    assert scheduler.stats()["boosted"] == 1
+
+    # A regrade of a long-closed assignment must not hide a deadline behind it
+    order.clear()
+
+    async def labelled(label, due_at=None):
+        await scheduler.acquire(4, due_at)
+        order.append(label)
+        await asyncio.sleep(0.01)
+        scheduler.release(4)
+
+    async def regrade():
+        tasks = [asyncio.create_task(labelled("running"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(labelled("regrade_old", datetime.utcnow() - timedelta(days=30))))
+        tasks.append(asyncio.create_task(labelled("plain")))
+        tasks.append(asyncio.create_task(labelled("due_in_10min", datetime.utcnow() + timedelta(minutes=10))))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(regrade())
+
+    assert order == ["running", "due_in_10min", "regrade_old", "plain"]
+    assert scheduler.stats()["boosted"] == 2
+
+
+def test_grading_rate_limits_and_daily_quota(monkeypatch):
+    use_fake_provider(monkeypatch)
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        org = Organization(name=f"Quota Org {uuid.uuid4()}")
+        db.add(org)
+        db.commit()
+        organization_id = org.id
+    finally:
+        db.close()
+    headers = student_headers(organization_id)
+
+    # Unauthenticated grading is no longer possible
+    assert client.post("/api/grade", json=make_request().model_dump()).status_code == 401
+
+    statuses = [client.post("/api/grade", json=make_request().model_dump(), headers=headers).status_code
+                for _ in range(int(grading_limits.USER_BURST) + 1)]
+    assert statuses[:-1] == [200] * int(grading_limits.USER_BURST)
+    assert statuses[-1] == 429
+
+    # The organization has used up today's tokens, so its other students are stopped too
+    db = SessionLocal()
+    try:
+        db.query(Organization).filter(Organization.id == organization_id).update({"daily_token_quota": 1})
+        db.commit()
+    finally:
+        db.close()
+    grading_limits.grading_limiter.forget(organization_id)
+
+    response = client.post("/api/grade", json=make_request().model_dump(), headers=student_headers(organization_id))
+    assert response.status_code == 429
+    assert "kota" in response.json()["detail"]
+    assert int(response.headers["Retry-After"]) > 0
@@ -0,0 +1,89 @@
+import asyncio
+import gc
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from app.main import app
+from app import services, grading_limits
+from app.providers import FakeProvider
+from app.database import SessionLocal
+from app.models import User
+from app.jwt_auth import create_access_token
+
+MODEL_LATENCY = 0.5  # seconds per fake provider call
+CONCURRENT_GRADINGS = 50
+
+
+CANNED_ANSWER = json.dumps({
+    "grade": 90,
+    "feedback": "Tamam",
+    "codeQuality": "İyi",
+    "suggestions": [],
+    "unitTests": [],
+})
+
+
+def admin_token():
+    db = SessionLocal()
+    try:
+        admin = db.query(User).filter(User.student_number == "admin").first()
+        return create_access_token({"sub": admin.student_number, "role": admin.role, "user_id": admin.id})
+    finally:
+        db.close()
+
+
+async def timed_get(client, url, headers=None):
+    start = time.perf_counter()
+    response = await client.get(url, headers=headers)
+    assert response.status_code == 200
+    return time.perf_counter() - start
+
+
+async def run_load(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        baseline = [await timed_get(client, url, headers) for url in ["/", "/users/me"] * 10]
+
+        gradings = [
+            asyncio.create_task(client.post("/api/grade", headers=headers, json={
+                "assignmentDescription": "Toplama fonksiyonu yaz",
+                "assignmentLanguage": "Python",
+                "studentCode": f"def add(a, b): return a + b  # {uuid.uuid4()}",
+                "studentLevel": "beginner",
+            }))
+            for _ in range(CONCURRENT_GRADINGS)
+        ]
+
+        during = []
+        while not all(task.done() for task in gradings):
+            during.append(await timed_get(client, "/"))
+            during.append(await timed_get(client, "/users/me", headers))
+            await asyncio.sleep(0.02)
+
+        responses = await asyncio.gather(*gradings)
+        return baseline, during, responses
+
+
+def test_routes_stay_responsive_during_grading_burst(monkeypatch):
+    slow_provider = FakeProvider(latency_ms=MODEL_LATENCY * 1000, latency_sigma=0, responses=[CANNED_ANSWER])
+    monkeypatch.setattr(services, "provider", slow_provider)
+    monkeypatch.setattr(services, "_grading_executor", ThreadPoolExecutor(max_workers=10))
+    monkeypatch.setattr(grading_limits, "USER_BURST", CONCURRENT_GRADINGS)
+
+    # Full collections over the heap the earlier tests left behind are pauses of their own,
+    # not blocking calls; keep them out of the measurement
+    gc.collect()
+    gc.freeze()
+    try:
+        baseline, during, responses = asyncio.run(run_load(admin_token()))
+    finally:
+        gc.unfreeze()
+
+    assert all(r.status_code == 200 and r.json()["grade"] == 90 for r in responses)
+    # 50 calls on 10 threads keep the pool busy for several model latencies
+    assert len(during) >= 10
+    # A blocked event loop would stall these for a full model latency
+    assert max(during) < MODEL_LATENCY / 2, (max(baseline), max(during))
@@ -0,0 +1,202 @@
+"""
+Query plan harness: seeds a synthetic multi-tenant dataset, records every
+SELECT the routers (and the badge/regrade helpers) send while serving
+teachers and students, and runs EXPLAIN QUERY PLAN on each. A query that
+reads a whole table (SCAN <table>) fails the test with its plan.
+
+Platform-wide superadmin views (tenant list, global counters) read whole
+tables by design and are listed in PLATFORM_WIDE_SCANS.
+"""
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, text
+from app.main import app
+from app.database import Base, SessionLocal, engine, async_engine
+from app.models import Organization, User, Assignment, Submission, Announcement, UserBadge, RegradeRun
+from app.jwt_auth import create_access_token
+from app.badges import check_badges
+from app.regrade import _target_query
+from app.standings import rebuild_standings, refresh_standings
+
+ORGANIZATIONS = 30
+STUDENTS_PER_ORG = 60
+ASSIGNMENTS_PER_ORG = 10
+SUBMISSIONS_PER_STUDENT = 20
+
+# (endpoint, table) pairs allowed to scan: they answer for every tenant at once
+PLATFORM_WIDE_SCANS = {
+    ("/admin/stats", "organizations"),
+    ("/admin/stats", "users"),
+    ("/admin/tenants", "organizations"),
+    ("/announcements/", "announcements"),  # superadmin sees every announcement
+}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def _seed():
+    rng = random.Random(20)
+    now = datetime.utcnow()
+    tag = uuid.uuid4().hex[:8]
+    with engine.begin() as conn:
+        org_ids = [
+            conn.execute(insert(Organization).values(name=f"Plan Org {tag} {i}").returning(Organization.id)).scalar()
+            for i in range(ORGANIZATIONS)
+        ]
+        users = []
+        for org_id in org_ids:
+            users.append({"organization_id": org_id, "student_number": f"plan-{tag}-{org_id}-t",
+                          "full_name": "Öğretmen", "role": "teacher", "class_code": None})
+            users += [{"organization_id": org_id, "student_number": f"plan-{tag}-{org_id}-{i}",
+                       "full_name": f"Öğrenci {i}", "role": "student", "class_code": f"10-{i % 3}"}
+                      for i in range(STUDENTS_PER_ORG)]
+        conn.execute(insert(User), users)
+        conn.execute(insert(Assignment), [
+            {"organization_id": org_id, "title": f"Ödev {i}", "description": "...", "language": "Python",
+             "student_level": "beginner", "due_date": "2030-01-01", "created_at": now - timedelta(days=i)}
+            for org_id in org_ids for i in range(ASSIGNMENTS_PER_ORG)
+        ])
+        conn.execute(insert(Announcement), [
+            {"organization_id": org_id, "title": "Duyuru", "content": "...", "date": "2030-01-01"}
+            for org_id in org_ids + [None] for _ in range(3)
+        ])
+        students = conn.execute(text(
+            "SELECT id, organization_id, role FROM users WHERE student_number LIKE :prefix"
+        ), {"prefix": f"plan-{tag}-%"}).all()
+        assignments = {}
+        for assignment_id, org_id in conn.execute(text(
+            "SELECT id, organization_id FROM assignments WHERE organization_id IN (%s)" % ",".join(map(str, org_ids))
+        )):
+            assignments.setdefault(org_id, []).append(assignment_id)
+        conn.execute(insert(Submission), [
+            {"user_id": user_id, "organization_id": org_id, "assignment_id": rng.choice(assignments[org_id]), "code_content": "print(1)",
+             "grading_result": '{"grade": 70}', "grade": rng.randint(0, 100), "tests_passed": 1, "tests_total": 2,
+             "submitted_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))}
+            for user_id, org_id, role in students if role == "student" for _ in range(SUBMISSIONS_PER_STUDENT)
+        ])
+        conn.execute(insert(UserBadge), [
+            {"user_id": user_id, "organization_id": org_id, "badge_name": "İlk Adım"}
+            for user_id, org_id, role in students if role == "student"
+        ])
+    db = SessionLocal()
+    try:
+        for org_id in org_ids:
+            rebuild_standings(db, org_id)
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    teacher = next(row for row in students if row.role == "teacher")
+    student = next(row for row in students if row.role == "student" and row.organization_id == teacher.organization_id)
+    return teacher, student, assignments[teacher.organization_id][0]
+
+
+def _headers(db, user_id):
+    user = db.get(User, user_id)
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.student_number, 'user_id': user.id})}"}
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    return _seed()
+
+
+def _record_selects():
+    """Collects (label, statement, parameters) of every SELECT on both engines."""
+    recorded = []
+    current = {"label": None}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and current["label"]:
+            recorded.append((current["label"], statement, parameters))
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+
+    def stop():
+        for target in (engine, async_engine.sync_engine):
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+    return recorded, current, stop
+
+
+def _full_scans(statement, parameters):
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters or ())).all()
+    details = [row[3] for row in plan]
+    scanned = [match.group(1) for match in map(SCAN.match, details) if match]
+    return [name for name in scanned if name in Base.metadata.tables], details
+
+
+def test_router_queries_use_indexes(seeded):
+    teacher, student, assignment_id = seeded
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        superadmin = db.query(User).filter(User.role == "superadmin").first()
+        submission_id = db.query(Submission.id).filter(Submission.user_id == student.id).first()[0]
+        headers = {
+            "teacher": _headers(db, teacher.id),
+            "student": _headers(db, student.id),
+            "superadmin": _headers(db, superadmin.id),
+        }
+    finally:
+        db.close()
+
+    requests = [
+        ("teacher", "/users/me"), ("teacher", "/users/me/organizations"),
+        ("teacher", "/assignments/"), ("teacher", f"/assignments/{assignment_id}/tests"),
+        ("teacher", "/announcements/"), ("teacher", "/submissions/"),
+        ("teacher", "/leaderboard/"), ("teacher", "/leaderboard/?class_code=10-1"),
+        ("teacher", "/admin/students"), ("teacher", "/admin/students?class_code=10-1"),
+        ("teacher", f"/assignments/{assignment_id}"), ("teacher", f"/submissions/{submission_id}"),
+        ("teacher", f"/submissions/?assignment_id={assignment_id}"), ("teacher", f"/submissions/?student_id={student.id}"),
+        ("teacher", "/submissions/?class_code=10-1"),
+        ("teacher", f"/submissions/?submitted_from={(datetime.utcnow() - timedelta(days=7)).isoformat()}"),
+        ("student", "/users/me"), ("student", "/assignments/"), ("student", "/announcements/"),
+        ("student", "/submissions/"), ("student", f"/submissions/{submission_id}"), ("student", "/leaderboard/"),
+        ("student", "/leaderboard/me"), ("student", "/leaderboard/me?class_code=10-0"),
+        ("superadmin", "/admin/stats"), ("superadmin", "/admin/tenants"), ("superadmin", "/announcements/"),
+    ]
+    recorded, current, stop = _record_selects()
+    try:
+        for role, path in requests:
+            current["label"] = path if role == "superadmin" else f"{role} {path}"
+            response = client.get(path, headers=headers[role])
+            assert response.status_code == 200, (role, path, response.text)
+            body = response.json()
+            if isinstance(body, dict) and body.get("next_cursor"):
+                # The second page runs the keyset condition
+                separator = "&" if "?" in path else "?"
+                response = client.get(f"{path}{separator}cursor={body['next_cursor']}", headers=headers[role])
+                assert response.status_code == 200, (role, path, response.text)
+
+        db = SessionLocal()
+        try:
+            current["label"] = "check_badges"
+            check_badges(student.id, db)
+            db.rollback()
+            current["label"] = "refresh_standings"
+            refresh_standings(db, student.id, [assignment_id])
+            db.rollback()
+            current["label"] = "regrade"
+            for mode in ("all", "latest"):
+                _target_query(db, RegradeRun(assignment_id=assignment_id, mode=mode)).filter(
+                    Submission.id > 0).order_by(Submission.id).limit(20).all()
+        finally:
+            db.close()
+    finally:
+        stop()
+
+    assert recorded
+    failures = []
+    for label, statement, parameters in recorded:
+        scanned, plan = _full_scans(statement, parameters)
+        scanned = [table for table in scanned if (label, table) not in PLATFORM_WIDE_SCANS]
+        if scanned:
+            failures.append(f"{label}: full scan of {scanned}\n  {statement}\n  " + "\n  ".join(plan))
+    assert not failures, "\n\n".join(failures)
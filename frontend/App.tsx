@@ -2,7 +2,6 @@
 import React, { useState, useEffect } from 'react';
 import { UserRole, Assignment, Announcement, Submission, GradingResult } from './types';
 import { Layout } from './components/Layout';
-import { gradeSubmission } from './services/geminiService';
 import { db } from './services/persistence';
 import { AuthProvider, useAuth } from './contexts/AuthContext';
 import { Login } from './components/Login';
@@ -25,6 +24,7 @@ import 'prismjs/components/prism-javascript';
 import 'prismjs/components/prism-python';
 import 'prismjs/themes/prism-tomorrow.css';
 import { API_BASE_URL } from './config';
+import { fetchAllPages } from './services/pagination';
 
 // --- Helpers ---
 const calculateTimeRemaining = (dueDateString: string): string => {
@@ -108,20 +108,20 @@ const AppContent = () => {
     try {
       const headers = { 'Authorization': `Bearer ${token}` };
 
-      const [assRes, subRes, annRes] = await Promise.all([
-        fetch(`${API_BASE_URL}/assignments/`, { headers }),
-        fetch(`${API_BASE_URL}/submissions/`, { headers }),
-        fetch(`${API_BASE_URL}/announcements/`, { headers })
+      const [assData, subData, annData] = await Promise.all([
+        fetchAllPages('/assignments/', headers),
+        fetchAllPages('/submissions/', headers),
+        fetchAllPages('/announcements/', headers)
       ]);
 
 
-      if (assRes.ok) {
-        const data = await assRes.json();
-        // Map backend snake_case to frontend camelCase
+      if (assData) {
+        const data = assData;
+        // Map backend snake_case to frontend camelCase (the list only has a description preview, see loadAssignment)
         setAssignments(data.map((a: any) => ({
           id: a.id.toString(),
           title: a.title,
-          description: a.description,
+          description: a.description_preview || '',
           dueDate: a.due_date,
           language: a.language,
           studentLevel: a.student_level,
@@ -133,25 +133,25 @@ const AppContent = () => {
         })));
       }
 
-      if (subRes.ok) {
-        const data = await subRes.json();
-        // Map backend snake_case to frontend camelCase
+      if (subData) {
+        const data = subData;
+        // Map backend snake_case to frontend camelCase (scores only: code and feedback come from openSubmission)
         setSubmissions(data.map((s: any) => ({
           id: s.id.toString(),
           assignmentId: s.assignment_id?.toString(),
           studentId: s.user_id?.toString(),
           studentName: s.student_name || "Öğrenci",
-          code: s.code_content,
+          code: '',
           submittedAt: s.submitted_at,
           status: 'graded',
-          gradingResult: JSON.parse(s.grading_result)
+          gradingResult: { grade: s.grade || 0, codeQuality: s.code_quality || '', feedback: '', suggestions: [], unitTests: [] }
 
         })));
       }
 
 
-      if (annRes.ok) {
-        const data = await annRes.json();
+      if (annData) {
+        const data = annData;
         setAnnouncements(data.map((a: any) => ({
           id: a.id.toString(),
           title: a.title,
@@ -173,11 +173,9 @@ const AppContent = () => {
     const fetchStudents = async () => {
       if ((role === 'teacher' || role === 'superadmin') && token) {
         try {
-          const res = await fetch(`${API_BASE_URL}/admin/students`, {
-            headers: { 'Authorization': `Bearer ${token}` }
-          });
+          const students = await fetchAllPages('/admin/students', { 'Authorization': `Bearer ${token}` });
 
-          if (res.ok) setBackendStudents(await res.json());
+          if (students) setBackendStudents(students);
         } catch (e) { console.error(e); }
       }
     };
@@ -348,28 +346,13 @@ const AppContent = () => {
     if (!user || !selectedAssignment) return;
     setIsGrading(true);
     try {
-      const gradingResult = await gradeSubmission(
-        selectedAssignment.description,
-        selectedAssignment.language,
-        codeDraft,
-        selectedAssignment.studentLevel
-      );
-
-      if (gradingResult.grade === 0) {
-        alert(gradingResult.feedback || "Değerlendirme sırasında bir hata oluştu.");
-        return;
-      }
-
+      // The backend grades the code itself and stores the result with the submission
       const payload = {
         assignment_id: parseInt(selectedAssignment.id),
-        code_content: codeDraft,
-        grading_result: JSON.stringify(gradingResult)
+        code_content: codeDraft
       };
 
-
-
       const res = await fetch(`${API_BASE_URL}/submissions/`, {
-
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -380,6 +363,10 @@ const AppContent = () => {
 
       if (res.ok) {
         const responseData = await res.json();
+        const gradingResult = JSON.parse(responseData.grading_result);
+        if (gradingResult.grade === 0) {
+          alert(gradingResult.feedback || "Değerlendirme sırasında bir hata oluştu.");
+        }
 
         // Check new badges
         if (responseData.new_badges && responseData.new_badges.length > 0) {
@@ -396,7 +383,8 @@ const AppContent = () => {
         setCurrentView('home');
         setCodeDraft('');
       } else {
-        alert("Gönderim kaydedilemedi.");
+        const errorData = await res.json().catch(() => ({}));
+        alert(errorData.detail || "Gönderim kaydedilemedi.");
       }
     } catch (error) {
       alert("Hata oluştu! Lütfen internet bağlantınızı ve API anahtarınızı kontrol edin.");
@@ -406,6 +394,32 @@ const AppContent = () => {
   };
 
 
+  // List entries carry scores only; the code and the full grading result come from the detail endpoint
+  const openSubmission = async (sub: Submission) => {
+    try {
+      const res = await fetch(`${API_BASE_URL}/submissions/${sub.id}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      setSelectedSubmission({ ...sub, code: data.code_content, gradingResult: JSON.parse(data.grading_result) });
+    } catch (e) { console.error(e); }
+  };
+
+  // List entries carry a description preview; the full text comes from the detail endpoint
+  const loadAssignment = async (assignment: Assignment): Promise<Assignment> => {
+    try {
+      const res = await fetch(`${API_BASE_URL}/assignments/${assignment.id}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (res.ok) {
+        const data = await res.json();
+        return { ...assignment, description: data.description };
+      }
+    } catch (e) { console.error(e); }
+    return assignment;
+  };
+
   const handleDeleteSubmission = async (submissionId: string) => {
     if (window.confirm('Bu teslimi silmek istediğinize emin misiniz? Öğrenci tekrar ödev yükleyebilecek.')) {
       try {
@@ -510,7 +524,7 @@ const AppContent = () => {
                         {sub.gradingResult?.grade || 0} Puan
                       </span>
                       <button
-                        onClick={() => setSelectedSubmission(sub)}
+                        onClick={() => openSubmission(sub)}
                         className="p-2 hover:bg-dark-700 rounded-lg text-slate-400 hover:text-white transition-all">
                         <ChevronRight size={18} />
                       </button>
@@ -640,11 +654,12 @@ const AppContent = () => {
                         </div>
                         <div className="flex items-center gap-2">
                           <button
-                            onClick={() => {
-                              setEditingAssignment(assignment);
+                            onClick={async () => {
+                              const fullAssignment = await loadAssignment(assignment);
+                              setEditingAssignment(fullAssignment);
                               setNewAssignmentData({
                                 title: assignment.title,
-                                description: assignment.description,
+                                description: fullAssignment.description,
                                 language: assignment.language,
                                 dueDate: assignment.dueDate,
                                 studentLevel: assignment.studentLevel,
@@ -673,7 +688,7 @@ const AppContent = () => {
                             <Trash2 size={16} />
                           </button>
                           <button
-                            onClick={() => { setSelectedAssignment(assignment); setCurrentView('assignment_detail'); }}
+                            onClick={async () => { setSelectedAssignment(await loadAssignment(assignment)); setCurrentView('assignment_detail'); }}
                             className="p-2 sm:p-2.5 bg-primary hover:bg-primary/90 text-white rounded-lg transition-all shadow-lg shadow-primary/20">
                             <ChevronRight size={18} />
                           </button>
@@ -687,14 +702,14 @@ const AppContent = () => {
                               <CheckCircle2 size={14} /> TAMAMLANDI
                             </span>
                             <button
-                              onClick={() => setSelectedSubmission(studentSubmission)}
+                              onClick={() => openSubmission(studentSubmission)}
                               className="bg-dark-700 hover:bg-dark-600 text-white px-4 py-2 rounded-lg text-xs sm:text-sm font-bold transition-all border border-dark-600 whitespace-nowrap">
                               Sonucu İncele
                             </button>
                           </>
                         ) : (
                           <button
-                            onClick={() => { setSelectedAssignment(assignment); setIsModalOpen(true); }}
+                            onClick={async () => { setSelectedAssignment(await loadAssignment(assignment)); setIsModalOpen(true); }}
                             className="w-full sm:w-auto px-6 py-2.5 bg-primary hover:bg-primary/90 text-white rounded-xl text-sm font-bold transition-all shadow-lg shadow-primary/20 active:scale-95 whitespace-nowrap">
                             Ödev Yükle
                           </button>
@@ -1012,7 +1027,7 @@ const AppContent = () => {
                   <td className="px-8 py-6 text-right">
                     <div className="flex items-center justify-end gap-4 opacity-0 group-hover:opacity-100 transition-opacity">
                       <button
-                        onClick={() => setSelectedSubmission(sub)}
+                        onClick={() => openSubmission(sub)}
                         className="text-primary hover:text-white text-sm font-black tracking-widest uppercase flex items-center gap-1 transition-all">
                         İNCELE <ChevronRight size={14} />
                       </button>
@@ -1290,7 +1305,7 @@ const AppContent = () => {
                     {sub.gradingResult?.grade || 0}
                   </div>
                   <button
-                    onClick={() => setSelectedSubmission(sub)}
+                    onClick={() => openSubmission(sub)}
                     className="bg-dark-700 hover:bg-dark-600 text-white px-5 py-2 rounded-lg text-xs font-black tracking-widest uppercase transition-all shadow-sm active:scale-95 border border-dark-600">
                     DETAYI GÖR
                   </button>
@@ -3,6 +3,7 @@ import { useAuth } from '../contexts/AuthContext';
 import { Upload, CheckCircle2, AlertCircle, Loader2, RefreshCw } from 'lucide-react';
 
 import { API_BASE_URL } from '../config';
+import { fetchAllPages } from '../services/pagination';
 
 
 export const TeacherDashboard = () => {
@@ -17,12 +18,8 @@ export const TeacherDashboard = () => {
         if (!token) return;
         setIsLoading(true);
         try {
-            const response = await fetch(`${API_BASE_URL}/admin/students`, {
-
-                headers: { 'Authorization': `Bearer ${token}` }
-            });
-            if (response.ok) {
-                const data = await response.json();
+            const data = await fetchAllPages('/admin/students', { 'Authorization': `Bearer ${token}` });
+            if (data) {
                 setStudents(data);
             }
         } catch (error) {
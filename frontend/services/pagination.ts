@@ -0,0 +1,18 @@
+import { API_BASE_URL } from '../config';
+
+// List endpoints answer one page ({ items, next_cursor }); this follows the cursors
+// and returns every item, or null when a request fails.
+export const fetchAllPages = async (path: string, headers: Record<string, string>): Promise<any[] | null> => {
+  const items: any[] = [];
+  let cursor: string | null = null;
+  do {
+    const separator = path.includes('?') ? '&' : '?';
+    const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    const res = await fetch(`${API_BASE_URL}${path}${separator}limit=200${cursorParam}`, { headers });
+    if (!res.ok) return null;
+    const page = await res.json();
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+};
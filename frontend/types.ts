@@ -44,6 +44,17 @@ export interface GradingResult {
   codeQuality: string;
   suggestions: string[];
   unitTests: UnitTestResult[];
+  tokenUsage?: TokenUsage;
+}
+
+export interface TokenUsage {
+  estimatedInputTokens: number;
+  promptTokens?: number | null;
+  outputTokens?: number | null;
+  totalTokens?: number | null;
+  maxOutputTokens: number;
+  codeTruncated: boolean;
+  descriptionTruncated: boolean;
 }
 
 export interface Submission {